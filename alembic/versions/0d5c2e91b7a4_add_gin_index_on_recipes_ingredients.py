@@ -0,0 +1,26 @@
+"""add gin index on recipes ingredients
+
+Revision ID: 0d5c2e91b7a4
+Revises: 73d6a6688e9d
+Create Date: 2025-10-03 14:27:05.903117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0d5c2e91b7a4'
+down_revision: Union[str, None] = '73d6a6688e9d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_recipes_ingredients ON recipes USING gin (ingredients);")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_recipes_ingredients;")
@@ -0,0 +1,29 @@
+"""add keyset pagination indexes
+
+Revision ID: 4b8e1f03c6d2
+Revises: 0d5c2e91b7a4
+Create Date: 2025-10-06 09:48:12.660371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e1f03c6d2'
+down_revision: Union[str, None] = '0d5c2e91b7a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (sort key, id) row comparisons of cursor pagination are range scans on these
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_recipes_title_id ON recipes (title, id);")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_recipes_cooking_time_id ON recipes (cooking_time, id);")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_recipes_cooking_time_id;")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_recipes_title_id;")
@@ -0,0 +1,32 @@
+"""add ann index on recipes embedding
+
+Revision ID: 73d6a6688e9d
+Revises: f18aab544368
+Create Date: 2025-10-02 10:12:31.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '73d6a6688e9d'
+down_revision: Union[str, None] = 'f18aab544368'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # fixed DDL, the schema does not depend on the environment running the migration. other index settings
+    # (and IVFFlat, which needs the data loaded first) are applied by `python -m app.cli.embeddings reindex`
+    # CONCURRENTLY keeps the table writable while the index builds
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_recipes_embedding_ann ON recipes"
+            " USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_recipes_embedding_ann;")
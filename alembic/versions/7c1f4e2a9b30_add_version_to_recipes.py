@@ -0,0 +1,52 @@
+"""add version to recipes
+
+Revision ID: 7c1f4e2a9b30
+Revises: 4b8e1f03c6d2
+Create Date: 2025-10-12 14:21:37.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1f4e2a9b30'
+down_revision: Union[str, None] = '4b8e1f03c6d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a constant default is stored in the catalog, existing rows are not rewritten
+    op.add_column('recipes', sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+    # bumped only when a column of the API representation changes, so ETags survive embedding rewrites
+    op.execute("""
+    CREATE FUNCTION recipes_version_update() RETURNS trigger AS $$
+    BEGIN
+      IF ROW(NEW.title, NEW.ingredients, NEW.instructions, NEW.cooking_time, NEW.difficulty, NEW.cuisine, NEW.tags)
+         IS DISTINCT FROM
+         ROW(OLD.title, OLD.ingredients, OLD.instructions, OLD.cooking_time, OLD.difficulty, OLD.cuisine, OLD.tags)
+      THEN
+        NEW.version := OLD.version + 1;
+      ELSE
+        NEW.version := OLD.version;
+      END IF;
+      RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """)
+
+    op.execute("""
+    CREATE TRIGGER trg_recipes_version_update
+    BEFORE UPDATE ON recipes
+    FOR EACH ROW
+    EXECUTE FUNCTION recipes_version_update();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_recipes_version_update ON recipes;")
+    op.execute("DROP FUNCTION IF EXISTS recipes_version_update;")
+    op.drop_column('recipes', 'version')
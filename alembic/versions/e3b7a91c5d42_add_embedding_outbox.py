@@ -0,0 +1,48 @@
+"""add embedding outbox
+
+Revision ID: e3b7a91c5d42
+Revises: 7c1f4e2a9b30
+Create Date: 2025-10-14 10:03:51.226914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b7a91c5d42'
+down_revision: Union[str, None] = '7c1f4e2a9b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+embedding_status = postgresql.ENUM('pending', 'ready', 'failed', name='embedding_status_enum', create_type=False)
+
+
+def upgrade() -> None:
+    embedding_status.create(op.get_bind(), checkfirst=True)
+    # existing rows mostly have an embedding: add the column as 'ready' (catalog only) and update the rest
+    op.add_column('recipes', sa.Column('embedding_status', embedding_status, server_default='ready', nullable=False))
+    op.execute("UPDATE recipes SET embedding_status = 'pending' WHERE embedding IS NULL")
+    op.alter_column('recipes', 'embedding_status', server_default='pending')
+    # sha256 of model + embedded text, the worker skips rows whose content did not change
+    op.add_column('recipes', sa.Column('embedding_hash', sa.String(64), nullable=True))
+
+    op.create_table(
+        'embedding_jobs',
+        sa.Column('recipe_id', sa.Integer(), sa.ForeignKey('recipes.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('requested_at', sa.DateTime(timezone=True), server_default=sa.text('clock_timestamp()'), nullable=False),
+        sa.Column('run_after', sa.DateTime(timezone=True), server_default=sa.text('clock_timestamp()'), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+    )
+    op.create_index('ix_embedding_jobs_run_after', 'embedding_jobs', ['run_after'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_embedding_jobs_run_after', table_name='embedding_jobs')
+    op.drop_table('embedding_jobs')
+    op.drop_column('recipes', 'embedding_hash')
+    op.drop_column('recipes', 'embedding_status')
+    embedding_status.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,12 @@
+from fastapi import Request
+
+from app.core.resources import Resources
+from app.utils.profiling import Profiler
+
+
+def get_resources(request: Request) -> Resources:
+    return request.app.state.resources
+
+
+def get_profiler(request: Request) -> Profiler:
+    return request.app.state.profiler
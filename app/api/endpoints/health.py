@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from app.api.dependencies import get_resources
+from app.core.resources import Resources
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/ready")
+async def ready(resources: Resources = Depends(get_resources)):
+    checks = resources.readiness()
+    if resources.task_errors:
+        # retrying will not help, the error says what to fix before restarting
+        name, error = next(iter(resources.task_errors.items()))
+        content = {"status": f"{name}_failed", "error": error, **checks}
+        return JSONResponse(status_code=503, content=content)
+    if all(checks.values()):
+        return {"status": "ready", **checks}
+    return JSONResponse(status_code=503, content={"status": "warming_up", **checks})
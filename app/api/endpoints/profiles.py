@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from app.api.dependencies import get_profiler
+from app.utils.profiling import Profiler
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+def require_token(
+        profiler: Profiler = Depends(get_profiler),
+        x_profile_token: str | None = Header(default=None),
+) -> Profiler:
+    if not profiler.token:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiler.authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+    return profiler
+
+
+@router.get("/")
+async def list_profiles(profiler: Profiler = Depends(require_token)):
+    return {**profiler.stats(), "profiles": profiler.profiles()}
+
+
+@router.get("/{profile_id}")
+async def download_profile(profile_id: str, profiler: Profiler = Depends(require_token)):
+    path = profiler.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
@@ -1,15 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-
-from app.api.schemas.recipe import RecipeCreate, RecipeUpdate, RecipeOut
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+
+from app.api.dependencies import get_resources
+from app.api.etags import body_etag, etag_matches, list_etag, not_modified
+from app.api.responses import json_response, recipe_response, recipes_response
+from app.api.schemas.enums import ImportFormat, RecipeSort
+from app.api.schemas.recipe import ImportReport, RecipeCreate, RecipeUpdate, RecipeOut, RecipePage
+from app.api.streaming import NDJSON, PAGE_MAX_ROWS, check_limit, ndjson_response, wants_stream
 from app.core.config import settings
+from app.core.resources import Resources
+from app.services.recipe_import import RecipeImporter
 from app.services.recipe_service import RecipeService
 from app.utils.unitofwork import UnitOfWork
 
 router = APIRouter(prefix="/recipes", tags=["recipes"])
 
+LIMIT_DESCRIPTION = f"At most {PAGE_MAX_ROWS}, or up to {settings.STREAM_MAX_ROWS} with Accept: {NDJSON}"
+
+
+def get_service(resources: Resources = Depends(get_resources)) -> RecipeService:
+    # cheap per request, the clients behind it live for the whole app
+    uow = UnitOfWork(vector_index=resources.vector_index)
+    return RecipeService(uow, parser=resources.parser, embedder=resources.embedder, recipe_cache=resources.recipe_cache)
+
 
-def get_service() -> RecipeService:
-    return RecipeService(UnitOfWork())
+def _paginate(request: Request, page: RecipePage) -> Response:
+    # the body stays a plain list, the cursor for the next page travels in a header
+    headers = {}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    if page.parser:
+        headers["X-Query-Parser"] = page.parser
+    etag = list_etag(page.items, page.next_cursor, page.parser)
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+    return recipes_response(page.items, headers={**headers, "ETag": etag})
 
 
 @router.post("/", response_model=RecipeOut)
@@ -17,27 +41,56 @@ async def create_recipe(
         recipe_in: RecipeCreate,
         service: RecipeService = Depends(get_service),
 ):
-    return await service.create_recipe(recipe_in)
+    return recipe_response(await service.create_recipe(recipe_in))
+
+
+@router.post("/import/", response_model=ImportReport)
+async def import_recipes(
+        request: Request,
+        fmt: ImportFormat = Query(ImportFormat.ndjson, alias="format"),
+        embed: bool = True,
+        resources: Resources = Depends(get_resources),
+):
+    # the body is consumed as a stream, so memory use does not depend on the upload size
+    importer = RecipeImporter(UnitOfWork(vector_index=resources.vector_index), embedder=resources.embedder, embed=embed)
+    return await importer.run(request.stream(), fmt)
 
 
 @router.get("/{recipe_id}", response_model=RecipeOut)
 async def get_recipe(
         recipe_id: int,
+        request: Request,
         service: RecipeService = Depends(get_service),
 ):
-    recipe = await service.get_recipe(recipe_id)
-    if not recipe:
+    body = await service.get_recipe_json(recipe_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Recipe not found")
-    return recipe
+    etag = body_etag(body)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return json_response(body, headers={"ETag": etag})
 
 
 @router.get("/", response_model=list[RecipeOut])
 async def list_recipes(
-        skip: int = 0,
-        limit: int = 20,
+        request: Request,
+        skip: int = Query(0, ge=0, description="Offset paging, kept for backward compatibility; prefer cursor"),
+        limit: int = Query(20, ge=1, le=settings.STREAM_MAX_ROWS, description=LIMIT_DESCRIPTION),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
+        order_by: RecipeSort = RecipeSort.id,
+        stream: bool = Depends(wants_stream),
         service: RecipeService = Depends(get_service),
 ):
-    return await service.list_recipes(skip=skip, limit=limit)
+    check_limit(limit, stream)
+    if stream:
+        return ndjson_response(await service.list_recipes_stream(
+            limit=limit, cursor=cursor, order_by=order_by, skip=skip if cursor is None else 0,
+        ))
+    if skip and cursor is None:
+        page = RecipePage(items=await service.list_recipes(skip=skip, limit=limit, order_by=order_by))
+    else:
+        page = await service.list_recipes_page(limit=limit, cursor=cursor, order_by=order_by)
+    return _paginate(request, page)
 
 
 @router.patch("/{recipe_id}", response_model=RecipeOut)
@@ -49,7 +102,7 @@ async def update_recipe(
     recipe = await service.update_recipe(recipe_id, recipe_in)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
-    return recipe
+    return recipe_response(recipe)
 
 
 @router.delete("/{recipe_id}")
@@ -65,33 +118,89 @@ async def delete_recipe(
 
 @router.get("/filter/", response_model=list[RecipeOut])
 async def filter_recipes(
+        request: Request,
         include: list[str] | None = Query(None),
         exclude: list[str] | None = Query(None),
+        limit: int = Query(20, ge=1, le=settings.STREAM_MAX_ROWS, description=LIMIT_DESCRIPTION),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
+        order_by: RecipeSort = RecipeSort.id,
+        stream: bool = Depends(wants_stream),
         service: RecipeService = Depends(get_service),
 ):
-    return await service.filter_by_ingredients(include=include, exclude=exclude)
+    check_limit(limit, stream)
+    if stream:
+        return ndjson_response(await service.filter_by_ingredients_stream(
+            include, exclude, limit=limit, cursor=cursor, order_by=order_by,
+        ))
+    page = await service.filter_by_ingredients_page(include, exclude, limit=limit, cursor=cursor, order_by=order_by)
+    return _paginate(request, page)
 
 
 @router.get("/search/", response_model=list[RecipeOut])
 async def search_recipes(
+        request: Request,
         q: str = Query(..., description="Natural language query"),
+        limit: int = Query(20, ge=1, le=settings.STREAM_MAX_ROWS, description=LIMIT_DESCRIPTION),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
+        stream: bool = Depends(wants_stream),
         service: RecipeService = Depends(get_service),
 ):
-    return await service.search(q)
+    check_limit(limit, stream)
+    if stream:
+        return ndjson_response(await service.search_stream(q, limit=limit, cursor=cursor))
+    return _paginate(request, await service.search_page(q, limit=limit, cursor=cursor))
 
 
 @router.get("/smart_search/", response_model=list[RecipeOut])
 async def smart_search(
+        request: Request,
         q: str = Query(..., description="Natural language query"),
+        limit: int = Query(20, ge=1, le=settings.STREAM_MAX_ROWS, description=LIMIT_DESCRIPTION),
+        cursor: str | None = Query(None, description="X-Next-Cursor header of the previous page"),
+        stream: bool = Depends(wants_stream),
         service: RecipeService = Depends(get_service)):
     if not settings.OPENAI_API_KEY:
         raise HTTPException(
             status_code=503,
             detail="OpenAI API key is not configured. Smart search is unavailable."
         )
-    return await service.smart_search(q)
+    check_limit(limit, stream)
+    if stream:
+        batches, parser = await service.smart_search_stream(q, limit=limit, cursor=cursor)
+        return ndjson_response(batches, headers={"X-Query-Parser": parser})
+    return _paginate(request, await service.smart_search_page(q, limit=limit, cursor=cursor))
 
 
-@router.get("/vector_search/")
-async def vector_search(q: str, service: RecipeService = Depends(get_service)):
-    return await service.vector_search(q)
+@router.get("/hybrid_search/", response_model=list[RecipeOut])
+async def hybrid_search(
+        request: Request,
+        q: str = Query(..., description="Natural language query"),
+        limit: int = Query(20, ge=1, le=100),
+        text_weight: float | None = Query(None, ge=0, description="Weight of the full-text ranking in the fused score"),
+        vector_weight: float | None = Query(None, ge=0, description="Weight of the embedding ranking in the fused score"),
+        ef_search: int | None = Query(None, ge=1, le=1000, description="HNSW candidate list size, higher is more accurate"),
+        probes: int | None = Query(None, ge=1, description="IVFFlat lists to probe, higher is more accurate"),
+        service: RecipeService = Depends(get_service),
+):
+    if settings.EMBEDDING_BACKEND == "openai" and not settings.OPENAI_API_KEY:
+        raise HTTPException(
+            status_code=503,
+            detail="OpenAI API key is not configured. Hybrid search is unavailable."
+        )
+    recipes = await service.hybrid_search(
+        q, limit=limit, text_weight=text_weight, vector_weight=vector_weight, ef_search=ef_search, probes=probes,
+    )
+    return _paginate(request, RecipePage(items=recipes))
+
+
+@router.get("/vector_search/", response_model=list[RecipeOut])
+async def vector_search(
+        request: Request,
+        q: str,
+        limit: int = Query(5, ge=1, le=100),
+        ef_search: int | None = Query(None, ge=1, le=1000, description="HNSW candidate list size, higher is more accurate"),
+        probes: int | None = Query(None, ge=1, description="IVFFlat lists to probe, higher is more accurate"),
+        service: RecipeService = Depends(get_service),
+):
+    recipes = await service.vector_search(q, limit=limit, ef_search=ef_search, probes=probes)
+    return _paginate(request, RecipePage(items=recipes))
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends
+
+from app.api.dependencies import get_resources
+from app.core.resources import Resources
+from app.utils.nl_query_parser import parse_cache_stats
+from app.utils.unitofwork import UnitOfWork
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/caches")
+async def cache_stats(resources: Resources = Depends(get_resources)):
+    return {
+        "embeddings": resources.embedding_cache.stats(),
+        "nl_parse": parse_cache_stats(),
+        "openai_parse": resources.parser.stats(),
+        "recipes": resources.recipe_cache.stats(),
+    }
+
+
+@router.get("/vector_index")
+async def vector_index_stats(resources: Resources = Depends(get_resources)):
+    if resources.vector_index is None:
+        return {"engine": "pgvector"}
+    return {"engine": "numpy", **resources.vector_index.stats()}
+
+
+@router.get("/batching")
+async def batching_stats(resources: Resources = Depends(get_resources)):
+    return {
+        "embeddings": resources.embedder.batcher.stats(),
+    }
+
+
+@router.get("/embeddings")
+async def embedding_stats(resources: Resources = Depends(get_resources)):
+    async with UnitOfWork() as uow:
+        queue = await uow.embedding_jobs.stats()
+    return {"queue": queue, "worker": resources.embedding_worker.stats()}
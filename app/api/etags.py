@@ -0,0 +1,37 @@
+import hashlib
+from typing import Iterable
+
+from fastapi import Request, Response
+
+from app.api.schemas.recipe import RecipeOut
+
+
+def body_etag(body: bytes) -> str:
+    # a single recipe is served as cached bytes, hashing them is cheaper than parsing out the version
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def list_etag(recipes: Iterable[RecipeOut], *extra: str | None) -> str:
+    # a list body is fully determined by which rows, in which order, at which version
+    digest = hashlib.sha256()
+    for recipe in recipes:
+        digest.update(f"{recipe.id}.{recipe.version},".encode())
+    for value in extra:
+        digest.update(f"|{value or ''}".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    # 304 carries the validators a 200 would have had, but no body, so nothing is serialized
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logger import logger
+from app.core.metrics import REQUEST_LATENCY, REQUESTS_IN_PROGRESS, current_scope, route_label
+from app.utils.profiling import Profiler, current_profile
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_scope.set(scope)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # routing has filled in scope["route"] by now
+            REQUEST_LATENCY.labels(method, route_label(scope), str(status)).observe(time.perf_counter() - started)
+            in_progress.dec()
+            current_scope.reset(token)
+
+
+class ProfilingMiddleware:
+    # profiles a request under cProfile when it carries X-Profile-Token: <PROFILING_TOKEN>, or when it is sampled.
+    # the profile id is sent back in X-Profile-Id and the .prof file is served at /profiles/{id} (open it with
+    # pstats or snakeviz). other requests running on the loop at the same time show up in the profile too
+    def __init__(self, app: ASGIApp, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # downloads carry the token too, they are not worth a profile of their own
+        if scope["type"] != "http" or not self.profiler.enabled or scope["path"].startswith("/profiles"):
+            await self.app(scope, receive, send)
+            return
+
+        token = Headers(scope=scope).get("x-profile-token")
+        profile = self.profiler.begin(forced=self.profiler.authorized(token))
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Profile-Id"] = profile.id
+            await send(message)
+
+        context = current_profile.set(profile)
+        started = time.perf_counter()
+        profile.profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.end(profile)
+            current_profile.reset(context)
+            elapsed = time.perf_counter() - started
+            try:
+                path = await asyncio.to_thread(self.profiler.save, profile)
+                logger.info("Profiled %s %s in %.1fms: %s", scope["method"], route_label(scope), elapsed * 1000, path)
+            except OSError as exc:
+                logger.error("Saving profile %s failed: %s", profile.id, exc)
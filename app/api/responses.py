@@ -0,0 +1,28 @@
+from fastapi import Response
+
+from app.api.schemas.recipe import RecipeOut, RecipeOutAdapter, RecipeOutList
+from app.core.metrics import observe_stage
+
+# returned as-is, FastAPI does not validate a Response against the route's response_model again.
+# the routes keep response_model for the OpenAPI schema
+
+
+def json_response(body: bytes, headers: dict[str, str] | None = None) -> Response:
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def recipe_response(recipe: RecipeOut, headers: dict[str, str] | None = None) -> Response:
+    with observe_stage("serialization"):
+        body = RecipeOutAdapter.dump_json(recipe)
+    return json_response(body, headers)
+
+
+def recipes_response(recipes: list[RecipeOut], headers: dict[str, str] | None = None) -> Response:
+    with observe_stage("serialization"):
+        body = RecipeOutList.dump_json(recipes)
+    return json_response(body, headers)
+
+
+def ndjson_lines(recipes: list[RecipeOut]) -> bytes:
+    with observe_stage("serialization"):
+        return b"".join(RecipeOutAdapter.dump_json(recipe) + b"\n" for recipe in recipes)
@@ -5,3 +5,20 @@ class Difficulty(Enum):
     easy = "easy"
     medium = "medium"
     hard = "hard"
+
+
+class RecipeSort(Enum):
+    id = "id"
+    title = "title"
+    cooking_time = "cooking_time"
+
+
+class ImportFormat(Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class EmbeddingStatus(Enum):
+    pending = "pending"
+    ready = "ready"
+    failed = "failed"
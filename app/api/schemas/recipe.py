@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 
 from app.api.schemas.enums import Difficulty
 
@@ -25,5 +25,33 @@ class RecipeUpdate(BaseModel):
 
 class RecipeOut(RecipeCreate):
     id: int
+    # increases on every change, see app/api/etags.py
+    version: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+# validates or dumps a whole list in one pydantic-core call instead of a Python loop over rows
+RecipeOutList = TypeAdapter(list[RecipeOut])
+# the same for a single recipe, dump_json writes the response body without a dict in between
+RecipeOutAdapter = TypeAdapter(RecipeOut)
+
+
+class RecipePage(BaseModel):
+    items: list[RecipeOut]
+    next_cursor: str | None = None
+    # which query parser produced the search filters: "openai" or "local"
+    parser: str | None = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    processed: int = 0
+    inserted: int = 0
+    failed: int = 0
+    # only the first IMPORT_MAX_REPORTED_ERRORS are listed, failed counts all of them
+    errors: list[ImportRowError] = []
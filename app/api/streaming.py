@@ -0,0 +1,36 @@
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.api.responses import ndjson_lines
+from app.api.schemas.recipe import RecipeOut
+
+NDJSON = "application/x-ndjson"
+# the largest limit a buffered JSON list may ask for, streamed responses go up to STREAM_MAX_ROWS
+PAGE_MAX_ROWS = 100
+
+
+def wants_stream(request: Request) -> bool:
+    # opt-in by content negotiation, a plain JSON client never sees the streamed format
+    return NDJSON in request.headers.get("accept", "")
+
+
+def check_limit(limit: int | None, stream: bool):
+    if limit is not None and limit > PAGE_MAX_ROWS and not stream:
+        raise HTTPException(
+            status_code=422,
+            detail=f"limit above {PAGE_MAX_ROWS} needs Accept: {NDJSON}",
+        )
+
+
+def ndjson_response(
+        batches: AsyncIterator[list[RecipeOut]], headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    # one recipe per line, each batch from the server-side cursor is sent as one chunk.
+    # there is no ETag or next cursor: both depend on rows that have not been read yet
+    async def body():
+        async for recipes in batches:
+            yield ndjson_lines(recipes)
+
+    return StreamingResponse(body(), media_type=NDJSON, headers=headers)
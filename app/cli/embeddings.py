@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.database import engine
+from app.db.vector_storage import ANN_INDEX, ann_index_sql, embedding_sql_type
+from app.services.embedding_worker import EmbeddingWorker
+from app.utils.embedding_backends import can_shorten, openai_embedding_name
+from app.utils.embeddings import EmbeddingGenerator, content_hash, recipe_embedding_text
+from app.utils.unitofwork import UnitOfWork
+
+
+async def worker(args: argparse.Namespace):
+    embedder = EmbeddingGenerator()
+    embedding_worker = EmbeddingWorker(UnitOfWork(), embedder, batch_size=args.batch_size)
+    try:
+        if args.once:
+            while await embedding_worker.run_once():
+                pass
+        else:
+            await embedding_worker.run()
+    finally:
+        await embedder.aclose()
+        embedder.cache.close()
+    print(embedding_worker.stats())
+
+
+async def backfill(args: argparse.Namespace):
+    # queues in batches so a large table is never locked in one transaction
+    uow = UnitOfWork()
+    total = 0
+    while True:
+        async with uow:
+            queued = await uow.embedding_jobs.enqueue_missing(args.batch_size, include_failed=args.failed)
+            await uow.commit()
+        total += queued
+        if queued < args.batch_size:
+            break
+    print(f"queued {total} recipes for embedding")
+
+
+async def column_type() -> str:
+    async with engine.connect() as connection:
+        return (await connection.execute(text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute"
+            " WHERE attrelid = 'recipes'::regclass AND attname = 'embedding'"
+        ))).scalar_one()
+
+
+async def autocommit(*statements: str):
+    # CONCURRENTLY cannot run inside a transaction
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in statements:
+            await connection.execute(text(statement))
+
+
+async def resize(args: argparse.Namespace):
+    # switching model or dimensions: every stored vector is from the old space, so they are all dropped
+    # and re-embedded by the worker. the ALTER rewrites the table under an exclusive lock
+    current, target = await column_type(), embedding_sql_type(args.storage, args.dimensions)
+    if current == target:
+        print(f"recipes.embedding is already {target}")
+        return
+
+    await autocommit(f"DROP INDEX CONCURRENTLY IF EXISTS {ANN_INDEX}")
+    async with engine.begin() as connection:
+        await connection.execute(text(f"ALTER TABLE recipes ALTER COLUMN embedding TYPE {target} USING NULL"))
+        await connection.execute(text("UPDATE recipes SET embedding_hash = NULL, embedding_status = 'pending'"))
+        await connection.execute(text("DELETE FROM embedding_jobs"))
+    await autocommit(ann_index_sql(storage=args.storage))
+    print(f"recipes.embedding resized from {current} to {target}")
+
+    args.failed = False
+    await backfill(args)
+
+
+async def reindex(args: argparse.Namespace):
+    # the migration always builds HNSW with default parameters; this builds the index VECTOR_INDEX_TYPE and its
+    # settings describe next to the old one and swaps them. IVFFlat picks its list centroids from the rows present
+    # at build time, so run it once the data is loaded (and again after large imports)
+    storage = (await column_type()).split("(")[0]
+    await autocommit(
+        f"DROP INDEX CONCURRENTLY IF EXISTS {ANN_INDEX}_next",
+        ann_index_sql(name=f"{ANN_INDEX}_next", storage=storage),
+    )
+    async with engine.begin() as connection:
+        await connection.execute(text(f"SET LOCAL lock_timeout = '{args.lock_timeout}s'"))
+        await connection.execute(text(f"DROP INDEX IF EXISTS {ANN_INDEX}"))
+        await connection.execute(text(f"ALTER INDEX {ANN_INDEX}_next RENAME TO {ANN_INDEX}"))
+    print(f"{ANN_INDEX} rebuilt as {settings.VECTOR_INDEX_TYPE}")
+
+
+async def reencode(args: argparse.Namespace):
+    # converts the stored vectors instead of embedding again: to halfvec, and/or cut to fewer dimensions
+    # for models that allow it. online: a shadow column is filled in batches while a trigger keeps it in step
+    # with writes, its index is built concurrently, and only the final swap takes a (short) exclusive lock
+    current, target = await column_type(), embedding_sql_type(args.storage, args.dimensions)
+    if current == target:
+        print(f"recipes.embedding is already {target}")
+        return
+    current_dimensions = int(current[current.index("(") + 1:-1])
+    if args.dimensions > current_dimensions:
+        raise SystemExit(f"cannot re-encode {current} to more dimensions, use resize to embed again")
+    shorten = args.dimensions < current_dimensions
+    if shorten and not (settings.EMBEDDING_BACKEND == "openai" and can_shorten(settings.EMBEDDING_MODEL)):
+        raise SystemExit(f"{settings.EMBEDDING_MODEL} vectors cannot be shortened, use resize to embed again")
+
+    def converted(column: str) -> str:
+        value = f"l2_normalize(subvector({column}, 1, {args.dimensions}))" if shorten else column
+        return f"{value}::{target}"
+
+    await autocommit(
+        f"ALTER TABLE recipes ADD COLUMN IF NOT EXISTS embedding_next {target}",
+        "CREATE OR REPLACE FUNCTION recipes_embedding_next() RETURNS trigger AS $$"
+        f" BEGIN NEW.embedding_next := {converted('NEW.embedding')}; RETURN NEW; END"
+        " $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS trg_recipes_embedding_next ON recipes",
+        "CREATE TRIGGER trg_recipes_embedding_next BEFORE INSERT OR UPDATE OF embedding ON recipes"
+        " FOR EACH ROW EXECUTE FUNCTION recipes_embedding_next()",
+    )
+
+    # the content hash names the vector space, shortened vectors get the hash of the new one
+    model = openai_embedding_name(settings.EMBEDDING_MODEL, args.dimensions) if shorten else None
+    last_id, converted_rows = 0, 0
+    while True:
+        async with engine.begin() as connection:
+            rows = (await connection.execute(text(
+                "SELECT id, title, ingredients, instructions FROM recipes WHERE id > :after ORDER BY id LIMIT :limit"
+            ), {"after": last_id, "limit": args.batch_size})).all()
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            if model is not None:
+                hashes = [content_hash(model, recipe_embedding_text(*row[1:])) for row in rows]
+                await connection.execute(text(
+                    f"UPDATE recipes r SET embedding_next = {converted('r.embedding')},"
+                    " embedding_hash = CASE WHEN r.embedding IS NULL THEN r.embedding_hash ELSE batch.hash END"
+                    " FROM unnest(CAST(:ids AS integer[]), CAST(:hashes AS text[])) AS batch(id, hash)"
+                    " WHERE r.id = batch.id"
+                ), {"ids": ids, "hashes": hashes})
+            else:
+                await connection.execute(text(
+                    f"UPDATE recipes SET embedding_next = {converted('embedding')} WHERE id = ANY(:ids)"
+                ), {"ids": ids})
+        last_id = ids[-1]
+        converted_rows += len(ids)
+        print(f"re-encoded {converted_rows} recipes", file=sys.stderr)
+
+    await autocommit(ann_index_sql(name=f"{ANN_INDEX}_next", column="embedding_next", storage=args.storage))
+    async with engine.begin() as connection:
+        # fail fast rather than queue every query behind the swap when a long transaction holds the table
+        await connection.execute(text(f"SET LOCAL lock_timeout = '{args.lock_timeout}s'"))
+        await connection.execute(text("DROP TRIGGER trg_recipes_embedding_next ON recipes"))
+        await connection.execute(text("DROP FUNCTION recipes_embedding_next()"))
+        await connection.execute(text(f"DROP INDEX IF EXISTS {ANN_INDEX}"))
+        await connection.execute(text("ALTER TABLE recipes DROP COLUMN embedding"))
+        await connection.execute(text("ALTER TABLE recipes RENAME COLUMN embedding_next TO embedding"))
+        await connection.execute(text(f"ALTER INDEX {ANN_INDEX}_next RENAME TO {ANN_INDEX}"))
+    print(f"recipes.embedding re-encoded from {current} to {target}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the embedding worker, queue recipes or change vector storage.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = commands.add_parser("worker", help="embed queued recipes until interrupted")
+    worker_parser.add_argument("--batch-size", type=int, default=None)
+    worker_parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    worker_parser.set_defaults(run=worker)
+
+    backfill_parser = commands.add_parser("backfill", help="queue recipes whose embedding is NULL")
+    backfill_parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+    backfill_parser.add_argument("--failed", action="store_true", help="also queue recipes the worker gave up on")
+    backfill_parser.set_defaults(run=backfill)
+
+    resize_parser = commands.add_parser("resize", help="change the embedding column type and queue every recipe")
+    resize_parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    resize_parser.add_argument("--storage", choices=["vector", "halfvec"], default=settings.EMBEDDING_STORAGE)
+    resize_parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+    resize_parser.set_defaults(run=resize)
+
+    reindex_parser = commands.add_parser("reindex", help="rebuild the ANN index as VECTOR_INDEX_TYPE configures it")
+    reindex_parser.add_argument("--lock-timeout", type=float, default=5.0, help="seconds the final swap may wait")
+    reindex_parser.set_defaults(run=reindex)
+
+    reencode_parser = commands.add_parser("reencode", help="convert stored vectors to halfvec or fewer dimensions")
+    reencode_parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    reencode_parser.add_argument("--storage", choices=["vector", "halfvec"], default=settings.EMBEDDING_STORAGE)
+    reencode_parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+    reencode_parser.add_argument("--lock-timeout", type=float, default=5.0, help="seconds the final swap may wait")
+    reencode_parser.set_defaults(run=reencode)
+
+    cli_args = parser.parse_args()
+    asyncio.run(cli_args.run(cli_args))
@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+from typing import AsyncIterator
+
+from app.api.schemas.enums import ImportFormat
+from app.services.recipe_import import RecipeImporter
+from app.utils.embeddings import EmbeddingGenerator
+from app.utils.unitofwork import UnitOfWork
+
+CHUNK_SIZE = 1 << 16
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+            yield chunk
+
+
+async def main(args: argparse.Namespace):
+    fmt = ImportFormat(args.format) if args.format else (
+        ImportFormat.csv if args.path.lower().endswith(".csv") else ImportFormat.ndjson
+    )
+    embedder = EmbeddingGenerator()
+    importer = RecipeImporter(UnitOfWork(), embedder=embedder, batch_size=args.batch_size, embed=not args.no_embed)
+    try:
+        report = await importer.run(read_file(args.path), fmt)
+    finally:
+        await embedder.aclose()
+        embedder.cache.close()
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import recipes from an NDJSON or CSV file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=[f.value for f in ImportFormat], default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--no-embed", action="store_true", help="insert without embeddings")
+    asyncio.run(main(parser.parse_args()))
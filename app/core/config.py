@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import ConfigDict
 from pydantic_settings import BaseSettings
 
@@ -9,7 +11,115 @@ class Settings(BaseSettings):
     DB_PASS: str
     DB_NAME: str
 
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+
     OPENAI_API_KEY: str | None = None
+    # one keep-alive connection pool shared by the query parser and the embeddings client
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 30.0
+    OPENAI_HTTP2: bool = False  # needs the h2 package (pip install "httpx[http2]")
+
+    # approximate nearest neighbour index on recipes.embedding. the migration builds HNSW with the defaults below,
+    # `python -m app.cli.embeddings reindex` rebuilds it with these settings (IVFFlat only once the data is loaded)
+    VECTOR_INDEX_TYPE: Literal["hnsw", "ivfflat"] = "hnsw"
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    IVFFLAT_LISTS: int = 100
+    # recall/latency trade-off at query time, can be overridden per request
+    HNSW_EF_SEARCH: int = 40
+    IVFFLAT_PROBES: int = 1
+
+    # ts_rank_cd weights for the {D, C, B, A} labels set by the search_vector trigger
+    FTS_RANK_WEIGHTS: list[float] = [0.1, 0.2, 0.4, 1.0]
+
+    # embeddings cache: in-process LRU, in front of a persistent SQLite file when EMBEDDING_CACHE_PATH is set
+    EMBEDDING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    EMBEDDING_CACHE_PATH: str | None = None
+    EMBEDDING_CACHE_TTL: int = 30 * 24 * 3600
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 100_000
+
+    # "local" embeds with feature hashing on the CPU (no network, deterministic) in a thread or process pool.
+    # EMBEDDING_DIMENSIONS must match the recipes.embedding column, `python -m app.cli.embeddings resize` changes it
+    EMBEDDING_BACKEND: Literal["openai", "local"] = "openai"
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 1536
+    EMBEDDING_LOCAL_WORKERS: int = 2
+    EMBEDDING_LOCAL_EXECUTOR: Literal["thread", "process"] = "thread"
+    # "halfvec" stores 2 bytes per dimension instead of 4 (pgvector >= 0.7), `embeddings reencode` converts online
+    EMBEDDING_STORAGE: Literal["vector", "halfvec"] = "vector"
+
+    # concurrent embedding calls are sent as one API request per window or per max size
+    EMBEDDING_BATCH_WINDOW_MS: float = 5
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+
+    # writes queue their embedding in the embedding_jobs outbox instead of waiting for OpenAI; the worker runs in
+    # each app process unless EMBEDDING_WORKER_IN_PROCESS is off, then `python -m app.cli.embeddings worker` does it
+    EMBEDDING_WORKER_IN_PROCESS: bool = True
+    EMBEDDING_WORKER_BATCH_SIZE: int = 64
+    EMBEDDING_WORKER_POLL_SECONDS: float = 1.0
+    EMBEDDING_WORKER_LEASE_SECONDS: float = 120.0
+    EMBEDDING_WORKER_MAX_ATTEMPTS: int = 8
+    EMBEDDING_WORKER_BACKOFF_SECONDS: float = 2.0
+    EMBEDDING_WORKER_MAX_BACKOFF_SECONDS: float = 600.0
+
+    # Accept: application/x-ndjson streams list, filter and search results from a server-side cursor,
+    # fetching STREAM_BATCH_SIZE rows at a time; streamed requests may ask for up to STREAM_MAX_ROWS
+    STREAM_BATCH_SIZE: int = 500
+    STREAM_MAX_ROWS: int = 100_000
+
+    # bulk import: rows per COPY/commit and how many row errors a report lists
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_MAX_REPORTED_ERRORS: int = 1000
+
+    # /smart_search/ parses kept per process, keyed on normalized query text
+    OPENAI_PARSE_CACHE_SIZE: int = 10_000
+    OPENAI_PARSE_CACHE_TTL: int = 3600
+
+    # GET /recipes/{id} is served from a read-through cache of serialized recipes, in process and,
+    # with RECIPE_CACHE_REDIS_URL (needs the redis package), shared between workers
+    RECIPE_CACHE_SIZE: int = 10_000
+    RECIPE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    RECIPE_CACHE_TTL: float = 300
+    RECIPE_CACHE_REDIS_URL: str | None = None
+
+    # "numpy" answers /vector_search/ from an in-memory matrix loaded at startup instead of the pgvector index;
+    # with several workers each keeps its own copy, VECTOR_INDEX_REFRESH_SECONDS reloads it to pick up other writers
+    VECTOR_ENGINE: Literal["pgvector", "numpy"] = "pgvector"
+    VECTOR_INDEX_DTYPE: Literal["float32", "float16"] = "float32"
+    VECTOR_INDEX_LOAD_BATCH: int = 2000
+    VECTOR_INDEX_REFRESH_SECONDS: float = 0
+
+    # /hybrid_search/ fuses the full-text and kNN rankings with reciprocal rank fusion:
+    # score = sum(weight / (HYBRID_RRF_K + position)) over the HYBRID_CANDIDATES best hits of each branch
+    HYBRID_RRF_K: int = 60
+    HYBRID_CANDIDATES: int = 100
+    HYBRID_TEXT_WEIGHT: float = 1.0
+    HYBRID_VECTOR_WEIGHT: float = 1.0
+
+    # /smart_search/ falls back to the local spaCy parser when OpenAI is slower than the budget
+    # or the breaker is open; the local parse can run concurrently so the fallback costs no extra time
+    SMART_SEARCH_BUDGET_MS: int = 5000
+    SMART_SEARCH_PARALLEL_LOCAL_PARSE: bool = False
+    SMART_SEARCH_BREAKER_FAILURES: int = 5
+    SMART_SEARCH_BREAKER_RESET_SECONDS: float = 30.0
+    SMART_SEARCH_SLOW_CALL_MS: int = 4000
+
+    # profile single requests with cProfile: send X-Profile-Token: <PROFILING_TOKEN>, or sample a fraction of them;
+    # one profile runs at a time, sampled ones are PROFILING_MIN_INTERVAL_SECONDS apart, the newest PROFILING_MAX_FILES are kept
+    PROFILING_TOKEN: str | None = None
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_MIN_INTERVAL_SECONDS: float = 60.0
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_FILES: int = 100
+
+    # load the spaCy model in the background at startup; /ready waits for it
+    SPACY_WARMUP: bool = True
+    WARMUP_RETRY_SECONDS: float = 2.0
+
+    # parsed /search/ queries kept per process, keyed on normalized text
+    NL_PARSE_CACHE_SIZE: int = 4096
 
     @property
     def ASYNC_DATABASE_URL(self):
@@ -0,0 +1,104 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from prometheus_client import Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.db.database import engine
+from app.utils.nl_query_parser import parse_cache_stats
+
+# labels for work done outside a request (CLI, warmup, background tasks) and for requests no route matched
+NO_ROUTE = "none"
+UNMATCHED_ROUTE = "unmatched"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the last response byte.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests currently being handled.",
+    ["method"],
+)
+STAGE_LATENCY = Histogram(
+    "recipe_stage_duration_seconds",
+    "Time spent per request stage: spacy_parse, openai_parse, embedding, db, serialization.",
+    ["route", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_seconds",
+    "Time waiting for a connection from the SQLAlchemy pool.",
+    buckets=LATENCY_BUCKETS,
+)
+
+# ASGI scope of the request being handled; the router records the matched route in it
+current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+
+def route_label(scope: dict | None = None) -> str:
+    # the path template (/recipes/{recipe_id}), raw paths would give one series per recipe
+    scope = scope if scope is not None else current_scope.get()
+    if scope is None:
+        return NO_ROUTE
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    # labelled with the route of the request it runs for, contextvars follow to_thread and tasks
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(route_label(), stage).observe(time.perf_counter() - started)
+
+
+class ResourcesCollector(Collector):
+    # cache and pool figures are read from the live objects at scrape time instead of being mirrored into metrics
+    def __init__(self, resources):
+        self.resources = resources
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits.", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses.", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries held in process.", labels=["cache"])
+        size = GaugeMetricFamily("cache_bytes", "Bytes held in process, where tracked.", labels=["cache"])
+
+        caches = {
+            "embeddings": self.resources.embedding_cache.stats(),
+            "openai_parse": self.resources.parser.stats()["cache"],
+            "recipes": self.resources.recipe_cache.stats(),
+            "nl_parse": parse_cache_stats(),
+        }
+        for name, stats in caches.items():
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            memory = stats.get("memory", stats)
+            entries.add_metric([name], memory.get("entries", 0))
+            if "bytes" in memory:
+                size.add_metric([name], memory["bytes"])
+        yield from (hits, misses, entries, size)
+
+        breaker = self.resources.parser.breaker
+        yield GaugeMetricFamily("openai_parse_breaker_open", "1 while the smart_search circuit breaker is open.",
+                                value=int(breaker.state != "closed"))
+
+        pool = engine.pool
+        connections = GaugeMetricFamily("db_pool_connections", "Connections of the SQLAlchemy pool.", labels=["state"])
+        connections.add_metric(["checked_out"], pool.checkedout())
+        connections.add_metric(["idle"], pool.checkedin())
+        connections.add_metric(["overflow"], max(pool.overflow(), 0))
+        yield connections
+
+        if self.resources.vector_index is not None:
+            yield GaugeMetricFamily("vector_index_vectors", "Embeddings held by the in-memory vector index.",
+                                    value=len(self.resources.vector_index))
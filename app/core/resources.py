@@ -0,0 +1,130 @@
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import ResourcesCollector
+from app.db.database import engine
+from app.utils.embedding_backends import embedding_backend_from_settings
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.embeddings import EmbeddingGenerator
+from app.services.embedding_worker import EmbeddingWorker
+from app.services.vector_engine import load_vector_index
+from app.utils.nl_query_parser import is_nlp_loaded, warmup_nlp
+from app.utils.openai_parser import OpenAIQueryParser
+from app.utils.recipe_cache import RecipeCache
+from app.utils.unitofwork import UnitOfWork
+from app.utils.vector_index import VectorIndex
+
+
+class Resources:
+    # long-lived clients and pools, created once per process in the app lifespan and shared by every request
+    def __init__(self):
+        self.http_client = DefaultAsyncHttpxClient(
+            http2=settings.OPENAI_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.openai = None
+        if settings.OPENAI_API_KEY:
+            self.openai = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=self.http_client)
+        self.embedding_cache = EmbeddingCache.from_settings()
+        self.embedder = EmbeddingGenerator(
+            cache=self.embedding_cache, backend=embedding_backend_from_settings(client=self.openai),
+        )
+        self.parser = OpenAIQueryParser(client=self.openai)
+        self.recipe_cache = RecipeCache.from_settings()
+        self.vector_index = VectorIndex(dtype=settings.VECTOR_INDEX_DTYPE) if settings.VECTOR_ENGINE == "numpy" else None
+        self.embedding_worker = EmbeddingWorker(UnitOfWork(vector_index=self.vector_index), self.embedder)
+        self.metrics_collector = ResourcesCollector(self)
+        REGISTRY.register(self.metrics_collector)
+        self.db_warm = False
+        # background task name -> the exception it ended with, reported by /ready
+        self.task_errors: dict[str, str] = {}
+        self._warmup_task: asyncio.Task | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self._worker_task: asyncio.Task | None = None
+
+    def start_warmup(self):
+        self._warmup_task = self._start_task("warmup", self.warmup())
+
+    def _start_task(self, name: str, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        task.add_done_callback(lambda done: self._task_done(name, done))
+        return task
+
+    def _task_done(self, name: str, task: asyncio.Task):
+        # nothing awaits the task, a failure would otherwise only show up as "exception was never retrieved"
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error("Background task %s failed, /ready stays unavailable", name, exc_info=task.exception())
+        self.task_errors[name] = repr(task.exception())
+
+    async def warmup(self):
+        tasks = [self._warm_db()]
+        if settings.SPACY_WARMUP:
+            tasks.append(asyncio.to_thread(warmup_nlp))
+        await asyncio.gather(*tasks)
+        logger.info("Warmup finished")
+
+    def readiness(self) -> dict:
+        return {
+            "db": self.db_warm,
+            "spacy": is_nlp_loaded() or not settings.SPACY_WARMUP,
+            "vector_index": self.vector_index is None or self.vector_index.loaded,
+        }
+
+    async def _warm_db(self):
+        await self._warm_db_pool()
+        if self.vector_index is not None:
+            # loaded before the worker starts: replace() drops whatever the worker upserted into the old index
+            self.vector_index.replace(await load_vector_index(UnitOfWork()))
+            if settings.VECTOR_INDEX_REFRESH_SECONDS > 0:
+                self._refresh_task = asyncio.create_task(self._refresh_vector_index())
+        if settings.EMBEDDING_WORKER_IN_PROCESS and self.embedder.backend.available:
+            self._worker_task = self._start_task("embedding_worker", self.embedding_worker.run())
+
+    async def _refresh_vector_index(self):
+        # picks up writes made by other workers; local writes during a reload may wait for the next one
+        while True:
+            await asyncio.sleep(settings.VECTOR_INDEX_REFRESH_SECONDS)
+            try:
+                self.vector_index.replace(await load_vector_index(UnitOfWork()))
+            except (OSError, SQLAlchemyError) as exc:
+                logger.warning("Reloading the vector index failed: %s", exc)
+
+    async def _warm_db_pool(self):
+        async def ping():
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+        # open DB_POOL_SIZE connections up front, retrying until the database accepts them
+        while True:
+            try:
+                await asyncio.gather(*(ping() for _ in range(settings.DB_POOL_SIZE)))
+                self.db_warm = True
+                return
+            except (OSError, SQLAlchemyError) as exc:
+                logger.warning("Database is not reachable yet: %s", exc)
+                await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+
+    async def aclose(self):
+        logger.info("Closing shared clients and connection pools")
+        REGISTRY.unregister(self.metrics_collector)
+        # an interrupted batch is picked up again once its lease runs out
+        for task in (self._warmup_task, self._refresh_task, self._worker_task):
+            if task is not None and not task.done():
+                task.cancel()
+        await self.embedder.aclose()
+        await self.http_client.aclose()
+        self.embedding_cache.close()
+        await self.recipe_cache.close()
+        await engine.dispose()
@@ -3,7 +3,17 @@ from sqlalchemy.orm import DeclarativeBase
 
 from app.core.config import settings
 
-engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    connect_args={
+        "server_settings": {
+            "hnsw.ef_search": str(settings.HNSW_EF_SEARCH),
+            "ivfflat.probes": str(settings.IVFFLAT_PROBES),
+        },
+    },
+)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, )
 
 
@@ -1,10 +1,12 @@
-from sqlalchemy import Integer, String, Text, Enum, ARRAY, UniqueConstraint
-from sqlalchemy.dialects.postgresql import TSVECTOR
+from datetime import datetime
+
+from sqlalchemy import DateTime, FetchedValue, ForeignKey, Integer, String, Text, Enum, UniqueConstraint, Index, text
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column
-from pgvector.sqlalchemy import Vector
 
-from app.api.schemas.enums import Difficulty
+from app.api.schemas.enums import Difficulty, EmbeddingStatus
 from app.db.database import Base
+from app.db.vector_storage import embedding_column_type
 
 
 class Recipe(Base):  # pylint: disable=too-few-public-methods
@@ -18,10 +20,40 @@ class Recipe(Base):  # pylint: disable=too-few-public-methods
     difficulty: Mapped[Difficulty] = mapped_column(Enum(Difficulty, name="difficulty_enum"), nullable=False)
     cuisine: Mapped[str] = mapped_column(String, nullable=True, index=True)
     tags: Mapped[list[str]] = mapped_column(ARRAY(String), nullable=True)
+    # bumped by a trigger whenever one of the columns above changes, the source of ETags
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("1"),
+                                         server_onupdate=FetchedValue())
 
-    search_vector: Mapped[str] = mapped_column(TSVECTOR)
-    embedding: Mapped[str] = mapped_column(Vector(1536))
+    # heavy columns are never part of a response, load them only on explicit undefer()
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, deferred=True, deferred_group="heavy",
+                                               deferred_raiseload=True)
+    embedding: Mapped[str] = mapped_column(embedding_column_type(), deferred=True, deferred_group="heavy",
+                                           deferred_raiseload=True)
+    # set by the embedding worker, see EmbeddingJob
+    embedding_status: Mapped[EmbeddingStatus] = mapped_column(
+        Enum(EmbeddingStatus, name="embedding_status_enum"), nullable=False, server_default=EmbeddingStatus.pending.value,
+    )
+    embedding_hash: Mapped[str] = mapped_column(String(64), nullable=True)
 
     __table_args__ = (
         UniqueConstraint("title", "cuisine", name="uq_recipe_title_cuisine"),
+        Index("idx_recipes_ingredients", "ingredients", postgresql_using="gin"),
+        Index("ix_recipes_title_id", "title", "id"),
+        Index("ix_recipes_cooking_time_id", "cooking_time", "id"),
     )
+    # read version back with RETURNING instead of a lazy load after flush
+    __mapper_args__ = {"eager_defaults": True}
+
+
+class EmbeddingJob(Base):  # pylint: disable=too-few-public-methods
+    # outbox of recipes waiting for an embedding, written in the same transaction as the recipe.
+    # one row per recipe: a later write moves requested_at, so a worker holding the old content won't delete it
+    __tablename__ = "embedding_jobs"
+
+    recipe_id: Mapped[int] = mapped_column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    requested_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False,
+                                                   server_default=text("clock_timestamp()"))
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True,
+                                                server_default=text("clock_timestamp()"))
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
@@ -0,0 +1,36 @@
+from pgvector import HalfVector
+from pgvector.sqlalchemy import HALFVEC, Vector
+
+from app.core.config import settings
+
+ANN_INDEX = "ix_recipes_embedding_ann"
+
+
+def embedding_sql_type(storage: str | None = None, dimensions: int | None = None) -> str:
+    # "vector(1536)" or "halfvec(512)", for casts in text SQL and the DDL of the CLI commands
+    return f"{storage or settings.EMBEDDING_STORAGE}({dimensions or settings.EMBEDDING_DIMENSIONS})"
+
+
+def embedding_column_type():
+    if settings.EMBEDDING_STORAGE == "halfvec":
+        return HALFVEC(settings.EMBEDDING_DIMENSIONS)
+    return Vector(settings.EMBEDDING_DIMENSIONS)
+
+
+def embedding_values(value):
+    # halfvec columns load as HalfVector, vector columns as numpy arrays
+    return value.to_numpy() if isinstance(value, HalfVector) else value
+
+
+def ann_index_sql(name: str = ANN_INDEX, column: str = "embedding", storage: str | None = None) -> str:
+    # CREATE INDEX statement for the index configured by VECTOR_INDEX_TYPE, shared by the CLI commands that rebuild it
+    opclass = f"{storage or settings.EMBEDDING_STORAGE}_cosine_ops"
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        method = f"ivfflat ({column} {opclass}) WITH (lists = {settings.IVFFLAT_LISTS})"
+    else:
+        method = (
+            f"hnsw ({column} {opclass}) "
+            f"WITH (m = {settings.HNSW_M}, ef_construction = {settings.HNSW_EF_CONSTRUCTION})"
+        )
+    # CONCURRENTLY keeps the table writable while the index builds, it cannot run inside a transaction
+    return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON recipes USING {method}"
@@ -1,13 +1,50 @@
-from sqlalchemy import select, update
+from typing import AsyncIterator
+
+from sqlalchemy import or_, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from app.core.config import settings
 
 
 class BaseRepository:
     model = None
+    # columns loaded for read queries, empty means every non-deferred column
+    projection: tuple = ()
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    def _select(self, *columns):
+        columns = columns or self.projection
+        query = select(self.model)
+        if columns:
+            query = query.options(load_only(*columns))
+        return query
+
+    def _keyset(self, query, order_by: str = "id", after: list | None = None, limit: int | None = None):
+        # rows strictly after (sort value, id) in (sort value, id) order, nulls last like postgres does
+        sort_column = getattr(self.model, order_by)
+        if after:
+            last_value, last_id = after
+            if order_by == "id":
+                query = query.where(self.model.id > last_id)
+            elif last_value is None:
+                query = query.where(sort_column.is_(None), self.model.id > last_id)
+            else:
+                condition = tuple_(sort_column, self.model.id) > tuple_(last_value, last_id)
+                if sort_column.expression.nullable:
+                    condition = or_(condition, sort_column.is_(None))
+                query = query.where(condition)
+
+        if order_by == "id":
+            query = query.order_by(self.model.id)
+        else:
+            query = query.order_by(sort_column, self.model.id)
+        if limit:
+            query = query.limit(limit)
+        return query
+
     async def create(self, data: dict):
         instance = self.model(**data)
         self.session.add(instance)
@@ -16,16 +53,44 @@ class BaseRepository:
 
     async def get(self, instance_id: int):
         result = await self.session.execute(
-            select(self.model).where(self.model.id == instance_id)
+            self._select().where(self.model.id == instance_id)
         )
         return result.scalar_one_or_none()
 
-    async def get_list(self, skip: int = 0, limit: int = 20) -> list:
+    async def get_list(self, skip: int = 0, limit: int = 20, order_by: str = "id") -> list:
+        result = await self.session.execute(
+            self._keyset(self._select(), order_by=order_by).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
+
+    async def get_page(self, limit: int = 20, order_by: str = "id", after: list | None = None) -> list:
+        # cost does not grow with the page number, unlike get_list's OFFSET
         result = await self.session.execute(
-            select(self.model).offset(skip).limit(limit)
+            self._keyset(self._select(), order_by=order_by, after=after, limit=limit)
         )
         return result.scalars().all()
 
+    async def stream_page(
+            self,
+            limit: int | None = None,
+            order_by: str = "id",
+            after: list | None = None,
+            skip: int = 0,
+            batch_size: int | None = None,
+    ) -> AsyncIterator[list]:
+        query = self._keyset(self._select(), order_by=order_by, after=after, limit=limit)
+        if skip:
+            query = query.offset(skip)
+        async for batch in self._stream(query, batch_size or settings.STREAM_BATCH_SIZE):
+            yield batch
+
+    async def _stream(self, query, batch_size: int) -> AsyncIterator[list]:
+        # server-side cursor: rows arrive batch_size at a time instead of the whole result being buffered.
+        # only the first column is yielded, extra ones (a search rank) are there for the ORDER BY
+        result = await self.session.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for batch in result.partitions():
+            yield batch
+
     async def update(self, instance_id: int, data: dict):
         await self.session.execute(
             update(self.model)
@@ -33,7 +98,11 @@ class BaseRepository:
             .values(**data)
         )
         await self.session.flush()
-        return await self.get(instance_id)
+        # the instance may already sit in the identity map, refresh it so trigger-set columns are current
+        result = await self.session.execute(
+            self._select().where(self.model.id == instance_id).execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
 
     async def delete(self, instance_id: int) -> bool:
         instance = await self.get(instance_id)
@@ -0,0 +1,108 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.schemas.enums import EmbeddingStatus
+from app.db.models import EmbeddingJob, Recipe
+
+
+class EmbeddingJobRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def enqueue(self, recipe_ids: list[int]):
+        # part of the caller's transaction, so a committed write always has its job
+        if not recipe_ids:
+            return
+        await self.session.execute(
+            update(Recipe).where(Recipe.id.in_(recipe_ids)).values(embedding_status=EmbeddingStatus.pending)
+        )
+        now = func.clock_timestamp()
+        stmt = insert(EmbeddingJob).values([{"recipe_id": recipe_id} for recipe_id in recipe_ids])
+        await self.session.execute(stmt.on_conflict_do_update(
+            index_elements=[EmbeddingJob.recipe_id],
+            set_={"requested_at": now, "run_after": now, "attempts": 0, "last_error": None},
+        ))
+
+    async def enqueue_missing(self, limit: int, include_failed: bool = False) -> int:
+        # backfill: rows without an embedding (or given up on) that have no job yet
+        statuses = [EmbeddingStatus.pending.value] + ([EmbeddingStatus.failed.value] if include_failed else [])
+        result = await self.session.execute(text(
+            "WITH missing AS ("
+            " SELECT r.id FROM recipes r"
+            " WHERE ((r.embedding IS NULL AND r.embedding_status <> 'failed') OR r.embedding_status::text = ANY(:statuses))"
+            " AND NOT EXISTS (SELECT 1 FROM embedding_jobs j WHERE j.recipe_id = r.id)"
+            " ORDER BY r.id LIMIT :limit"
+            "), marked AS ("
+            " UPDATE recipes SET embedding_status = 'pending' FROM missing WHERE recipes.id = missing.id"
+            " RETURNING recipes.id"
+            ")"
+            " INSERT INTO embedding_jobs (recipe_id) SELECT id FROM marked ON CONFLICT DO NOTHING"
+        ), {"statuses": statuses, "limit": limit})
+        return result.rowcount
+
+    async def claim(self, limit: int, lease_seconds: float) -> list[tuple[int, datetime, int]]:
+        # SKIP LOCKED lets several workers take disjoint batches; pushing run_after out is the lease,
+        # a worker that dies mid-batch leaves jobs that become claimable again when it expires
+        result = await self.session.execute(text(
+            "UPDATE embedding_jobs SET run_after = clock_timestamp() + make_interval(secs => :lease),"
+            " attempts = attempts + 1"
+            " WHERE recipe_id IN ("
+            "  SELECT recipe_id FROM embedding_jobs WHERE run_after <= clock_timestamp()"
+            "  ORDER BY run_after LIMIT :limit FOR UPDATE SKIP LOCKED"
+            " )"
+            " RETURNING recipe_id, requested_at, attempts"
+        ), {"lease": lease_seconds, "limit": limit})
+        return [tuple(row) for row in result.all()]
+
+    async def complete(self, jobs: list[tuple[int, datetime]]):
+        # a job requested again while it was being worked on stays queued
+        if not jobs:
+            return
+        recipe_ids, requested = zip(*jobs)
+        await self.session.execute(text(
+            "DELETE FROM embedding_jobs j"
+            " USING unnest(CAST(:ids AS integer[]), CAST(:requested AS timestamptz[])) AS done(recipe_id, requested_at)"
+            " WHERE j.recipe_id = done.recipe_id AND j.requested_at = done.requested_at"
+        ), {"ids": list(recipe_ids), "requested": list(requested)})
+
+    async def retry(self, jobs: list[tuple[int, float]], error: str, count_attempt: bool = True):
+        # (recipe id, seconds until the next attempt); count_attempt=False gives back the attempt claim() took
+        if not jobs:
+            return
+        recipe_ids, delays = zip(*jobs)
+        await self.session.execute(text(
+            "UPDATE embedding_jobs j SET run_after = clock_timestamp() + make_interval(secs => retry.delay),"
+            " last_error = :error,"
+            " attempts = CASE WHEN :count_attempt THEN j.attempts ELSE greatest(j.attempts - 1, 0) END"
+            " FROM unnest(CAST(:ids AS integer[]), CAST(:delays AS float8[])) AS retry(recipe_id, delay)"
+            " WHERE j.recipe_id = retry.recipe_id"
+        ), {"ids": list(recipe_ids), "delays": list(delays), "error": error, "count_attempt": count_attempt})
+
+    async def fail(self, jobs: list[tuple[int, datetime]]):
+        # given up after max attempts; the backfill command with --failed queues them again
+        recipe_ids = [recipe_id for recipe_id, _ in jobs]
+        await self.session.execute(
+            update(Recipe).where(Recipe.id.in_(recipe_ids)).values(embedding_status=EmbeddingStatus.failed)
+        )
+        await self.complete(jobs)
+
+    async def stats(self) -> dict:
+        jobs = (await self.session.execute(select(
+            func.count(),
+            func.count().filter(EmbeddingJob.run_after <= func.now()),
+            func.count().filter(EmbeddingJob.attempts > 0),
+            func.date_part("epoch", func.now() - func.min(EmbeddingJob.requested_at)),
+        ).select_from(EmbeddingJob))).one()
+        statuses = await self.session.execute(
+            select(Recipe.embedding_status, func.count()).group_by(Recipe.embedding_status)
+        )
+        return {
+            "queued": jobs[0],
+            "due": jobs[1],
+            "retrying": jobs[2],
+            "oldest_seconds": round(float(jobs[3]), 1) if jobs[3] is not None else None,
+            "recipes": {status.value: count for status, count in statuses.all()},
+        }
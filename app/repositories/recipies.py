@@ -1,60 +1,338 @@
-from sqlalchemy import select, func
+import asyncio
+from typing import AsyncIterator
 
+from sqlalchemy import REAL, Float, and_, cast, func, literal, or_, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, array
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.api.schemas.enums import EmbeddingStatus, RecipeSort
+from app.core.config import settings
 from app.db.models import Recipe
+from app.db.vector_storage import embedding_sql_type, embedding_values
 from app.repositories.base import BaseRepository
+from app.utils.profiling import profile_thread
+from app.utils.vector_index import VectorIndex
+
+IMPORT_COLUMNS = [
+    "line", "title", "ingredients", "instructions", "cooking_time", "difficulty", "cuisine", "tags", "embedding", "embedding_hash",
+]
 
 
 class RecipeRepository(BaseRepository):
     model = Recipe
+    # everything RecipeOut needs, search_vector and embedding stay on the server
+    projection = (
+        Recipe.id,
+        Recipe.title,
+        Recipe.ingredients,
+        Recipe.instructions,
+        Recipe.cooking_time,
+        Recipe.difficulty,
+        Recipe.cuisine,
+        Recipe.tags,
+        Recipe.version,
+    )
+
+    def __init__(self, session: AsyncSession, vector_index: VectorIndex | None = None):
+        super().__init__(session)
+        self.vector_index = vector_index
 
     async def filter_by_ingredients(
             self,
             include: list[str] | None = None,
             exclude: list[str] | None = None,
+            limit: int | None = None,
+            order_by: RecipeSort = RecipeSort.id,
+            after: list | None = None,
     ) -> list[Recipe]:
-        query = select(Recipe)
+        result = await self.session.execute(self._filter_query(include, exclude, limit, order_by, after))
+        return result.scalars().all()
 
+    async def stream_filter_by_ingredients(
+            self,
+            include: list[str] | None = None,
+            exclude: list[str] | None = None,
+            limit: int | None = None,
+            order_by: RecipeSort = RecipeSort.id,
+            after: list | None = None,
+            batch_size: int | None = None,
+    ) -> AsyncIterator[list[Recipe]]:
+        query = self._filter_query(include, exclude, limit, order_by, after)
+        async for batch in self._stream(query, batch_size or settings.STREAM_BATCH_SIZE):
+            yield batch
+
+    def _filter_query(
+            self,
+            include: list[str] | None,
+            exclude: list[str] | None,
+            limit: int | None,
+            order_by: RecipeSort,
+            after: list | None,
+    ):
+        query = self._select()
+
+        # @> is answered by the GIN index on ingredients. NOT (... && ...) cannot be, so the rows to drop are found
+        # with && through the index once and hashed, every other row is checked against that set
         if include:
-            for ingredient in include:
-                query = query.where(func.array_position(Recipe.ingredients, ingredient) != None)
+            query = query.where(Recipe.ingredients.contains(include))
         if exclude:
-            for ingredient in exclude:
-                query = query.where(func.array_position(Recipe.ingredients, ingredient) == None)
+            excluded = aliased(Recipe)
+            query = query.where(Recipe.id.not_in(select(excluded.id).where(excluded.ingredients.overlap(exclude))))
 
-        result = await self.session.execute(query)
-        return result.scalars().all()
+        return self._keyset(query, order_by=order_by.value, after=after, limit=limit)
+
+    async def fulltext_search(
+            self,
+            parsed_query: dict,
+            limit: int | None = None,
+            after: list | None = None,
+    ) -> list[tuple[Recipe, float]]:
+        result = await self.session.execute(self._fulltext_query(parsed_query, limit, after))
+        return [tuple(row) for row in result.all()]
+
+    async def stream_fulltext_search(
+            self,
+            parsed_query: dict,
+            limit: int | None = None,
+            after: list | None = None,
+            batch_size: int | None = None,
+    ) -> AsyncIterator[list[Recipe]]:
+        query = self._fulltext_query(parsed_query, limit, after)
+        async for batch in self._stream(query, batch_size or settings.STREAM_BATCH_SIZE):
+            yield batch
 
-    async def fulltext_search(self, parsed_query: dict) -> list[Recipe]:
-        query = select(Recipe)
+    def _fulltext_query(self, parsed_query: dict, limit: int | None, after: list | None):
+        query = self._select()
 
         if parsed_query.get("fts"):
-            query = query.where(
-                Recipe.search_vector.op("@@")(func.plainto_tsquery("english", parsed_query["fts"]))
+            ts_query, rank = self._text_rank(parsed_query["fts"])
+            rank = rank.label("rank")
+            query = query.where(Recipe.search_vector.op("@@")(ts_query))
+        else:
+            rank = literal(0.0).label("rank")
+        query = query.add_columns(rank)
+
+        query = query.where(*self._structured_filters(parsed_query))
+
+        # keyset on (rank desc, id): with a LIMIT postgres keeps a top-k heap instead of sorting every match
+        if after:
+            last_rank, last_id = after
+            query = query.where(or_(rank < last_rank, and_(rank == last_rank, Recipe.id > last_id)))
+        query = query.order_by(rank.desc(), Recipe.id)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    async def hybrid_search(
+            self,
+            parsed_query: dict,
+            embedding: list[float],
+            limit: int = 20,
+            candidates: int | None = None,
+            text_weight: float | None = None,
+            vector_weight: float | None = None,
+            ef_search: int | None = None,
+            probes: int | None = None,
+    ) -> list[tuple[Recipe, float]]:
+        candidates = max(candidates or settings.HYBRID_CANDIDATES, limit)
+        text_weight = settings.HYBRID_TEXT_WEIGHT if text_weight is None else text_weight
+        vector_weight = settings.HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight
+        await self._tune_ann_search(candidates, ef_search, probes)
+        filters = self._structured_filters(parsed_query)
+
+        # each branch takes its top candidates first and numbers them afterwards,
+        # a window function over the whole match set would force a full sort and skip the ANN index
+        distance = Recipe.embedding.cosine_distance(embedding).label("distance")
+        nearest = (
+            select(Recipe.id, distance)
+            .where(Recipe.embedding.isnot(None), *filters)
+            .order_by(distance)
+            .limit(candidates)
+            .subquery()
+        )
+        knn = select(
+            nearest.c.id,
+            func.row_number().over(order_by=(nearest.c.distance, nearest.c.id)).label("position"),
+        ).cte("knn")
+
+        k = settings.HYBRID_RRF_K
+        vector_score = func.coalesce(cast(vector_weight, Float) / (k + knn.c.position), 0.0)
+        if parsed_query.get("fts"):
+            ts_query, rank = self._text_rank(parsed_query["fts"])
+            matches = (
+                select(Recipe.id, rank.label("rank"))
+                .where(Recipe.search_vector.op("@@")(ts_query), *filters)
+                .order_by(rank.desc(), Recipe.id)
+                .limit(candidates)
+                .subquery()
             )
+            fts = select(
+                matches.c.id,
+                func.row_number().over(order_by=(matches.c.rank.desc(), matches.c.id)).label("position"),
+            ).cte("fts")
+            text_score = func.coalesce(cast(text_weight, Float) / (k + fts.c.position), 0.0)
+            fused = select(
+                func.coalesce(fts.c.id, knn.c.id).label("id"),
+                (text_score + vector_score).label("score"),
+            ).select_from(fts.join(knn, fts.c.id == knn.c.id, full=True))
+        else:
+            fused = select(knn.c.id, vector_score.label("score"))
+        fused = fused.cte("fused")
+
+        query = (
+            self._select()
+            .add_columns(fused.c.score)
+            .join(fused, Recipe.id == fused.c.id)
+            .order_by(fused.c.score.desc(), Recipe.id)
+            .limit(limit)
+        )
+        result = await self.session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+    @staticmethod
+    def _text_rank(fts: str):
+        ts_query = func.plainto_tsquery("english", fts)
+        weights = cast(array(settings.FTS_RANK_WEIGHTS), ARRAY(REAL))
+        return ts_query, func.ts_rank_cd(weights, Recipe.search_vector, ts_query)
+
+    @staticmethod
+    def _structured_filters(parsed_query: dict) -> list:
+        filters = []
 
         # cooking_time
         if parsed_query.get("cooking_time"):
             limit_lte = parsed_query["cooking_time"].get("lte")
             if limit_lte:
-                query = query.where(Recipe.cooking_time <= limit_lte)
+                filters.append(Recipe.cooking_time <= limit_lte)
 
             limit_gte = parsed_query["cooking_time"].get("gte")
             if limit_gte:
-                query = query.where(Recipe.cooking_time >= limit_gte)
+                filters.append(Recipe.cooking_time >= limit_gte)
 
         # difficulty
         if parsed_query.get("difficulty"):
-            query = query.where(Recipe.difficulty == parsed_query["difficulty"])
+            filters.append(Recipe.difficulty == parsed_query["difficulty"])
 
-        result = await self.session.execute(query)
-        return result.scalars().all()
+        return filters
 
-    async def vector_search(self, embedding: list[float], limit: int = 5, threshold: float = 0.3):
-        stmt = (
-            select(self.model)
-            .where(Recipe.embedding.cosine_distance(embedding) < threshold)
-            .order_by(self.model.embedding.cosine_distance(embedding))
+    async def bulk_insert(self, records: list[tuple]) -> list[tuple[int, str, str | None]]:
+        # records follow IMPORT_COLUMNS; COPY them into a staging table, then insert in one statement
+        # so rows that hit uq_recipe_title_cuisine are skipped instead of failing the batch
+        await self.session.execute(text(
+            "CREATE TEMP TABLE recipe_import ("
+            " line integer, title text, ingredients text[], instructions text, cooking_time integer,"
+            " difficulty text, cuisine text, tags text[], embedding text, embedding_hash text"
+            ") ON COMMIT DROP"
+        ))
+        connection = await (await self.session.connection()).get_raw_connection()
+        await connection.driver_connection.copy_records_to_table(
+            "recipe_import", records=records, columns=IMPORT_COLUMNS,
+        )
+        result = await self.session.execute(text(
+            "INSERT INTO recipes (title, ingredients, instructions, cooking_time, difficulty, cuisine, tags, embedding,"
+            " embedding_hash, embedding_status)"
+            " SELECT title, ingredients, instructions, cooking_time, difficulty::difficulty_enum, cuisine, tags,"
+            f" embedding::{embedding_sql_type()}, embedding_hash,"
+            " CASE WHEN embedding IS NULL THEN 'pending' ELSE 'ready' END::embedding_status_enum"
+            " FROM recipe_import ORDER BY line"
+            " ON CONFLICT ON CONSTRAINT uq_recipe_title_cuisine DO NOTHING"
+            " RETURNING id, title, cuisine"
+        ))
+        return [tuple(row) for row in result.all()]
+
+    async def vector_search(
+            self,
+            embedding: list[float],
+            limit: int = 5,
+            threshold: float = 0.3,
+            ef_search: int | None = None,
+            probes: int | None = None,
+    ):
+        if self.vector_index is not None and self.vector_index.loaded:
+            return await self._vector_search_in_memory(embedding, limit, threshold)
+
+        await self._tune_ann_search(limit, ef_search, probes)
+
+        # the index only serves a bare ORDER BY distance LIMIT k, so the threshold is applied on top of it
+        distance = Recipe.embedding.cosine_distance(embedding).label("distance")
+        nearest = (
+            select(Recipe.id, distance)
+            .order_by(distance)
             .limit(limit)
+            .subquery()
+        )
+        stmt = (
+            self._select()
+            .join(nearest, Recipe.id == nearest.c.id)
+            .where(nearest.c.distance < threshold)
+            .order_by(nearest.c.distance)
         )
         result = await self.session.execute(stmt)
         return result.scalars().all()
+
+    async def _vector_search_in_memory(self, embedding: list[float], limit: int, threshold: float) -> list[Recipe]:
+        # the matrix product releases the GIL, run it next to the event loop
+        hits = await asyncio.to_thread(profile_thread(self.vector_index.search), embedding, limit, threshold)
+        if not hits:
+            return []
+        result = await self.session.execute(self._select().where(Recipe.id.in_([recipe_id for recipe_id, _ in hits])))
+        recipes = {recipe.id: recipe for recipe in result.scalars()}
+        # ids deleted since the index saw them simply drop out
+        return [recipes[recipe_id] for recipe_id, _ in hits if recipe_id in recipes]
+
+    async def embeddings_after(self, after_id: int = 0, limit: int = 1000) -> list[tuple[int, list[float]]]:
+        query = (
+            select(Recipe.id, Recipe.embedding)
+            .where(Recipe.id > after_id, Recipe.embedding.isnot(None))
+            .order_by(Recipe.id)
+            .limit(limit)
+        )
+        result = await self.session.execute(query)
+        return [(recipe_id, embedding_values(embedding)) for recipe_id, embedding in result.all()]
+
+    async def embedding_sources(self, ids: list[int]) -> list[tuple]:
+        # (id, version, title, ingredients, instructions, embedding_hash, has embedding) for the embedding worker
+        query = select(
+            Recipe.id, Recipe.version, Recipe.title, Recipe.ingredients, Recipe.instructions, Recipe.embedding_hash,
+            Recipe.embedding.isnot(None),
+        ).where(Recipe.id.in_(ids))
+        result = await self.session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+    async def store_embeddings(self, rows: list[tuple[int, int, str, str]]) -> list[int]:
+        # rows are (id, version, vector literal, hash); a row edited since it was read keeps its job and is skipped
+        if not rows:
+            return []
+        ids, versions, vectors, hashes = zip(*rows)
+        result = await self.session.execute(text(
+            f"UPDATE recipes r SET embedding = fresh.embedding::{embedding_sql_type()},"
+            " embedding_hash = fresh.embedding_hash, embedding_status = 'ready'"
+            " FROM unnest(CAST(:ids AS integer[]), CAST(:versions AS integer[]), CAST(:vectors AS text[]),"
+            " CAST(:hashes AS text[])) AS fresh(id, version, embedding, embedding_hash)"
+            " WHERE r.id = fresh.id AND r.version = fresh.version"
+            " RETURNING r.id"
+        ), {"ids": list(ids), "versions": list(versions), "vectors": list(vectors), "hashes": list(hashes)})
+        return list(result.scalars())
+
+    async def mark_embedded(self, ids: list[int]):
+        if ids:
+            await self.session.execute(
+                update(Recipe).where(Recipe.id.in_(ids)).values(embedding_status=EmbeddingStatus.ready)
+            )
+
+    async def _tune_ann_search(self, limit: int, ef_search: int | None, probes: int | None):
+        # hnsw never returns more than ef_search candidates, raise it for this transaction only when needed.
+        # hybrid search asks for HYBRID_CANDIDATES: above HNSW_EF_SEARCH that costs a set_config round trip per query
+        if ef_search is None and limit > settings.HNSW_EF_SEARCH:
+            ef_search = limit
+
+        # set_config(..., true) behaves like SET LOCAL and is reset at the end of the transaction,
+        # both settings go in one statement so an override costs a single round trip
+        overrides = []
+        if ef_search is not None:
+            overrides.append(func.set_config("hnsw.ef_search", str(ef_search), True))
+        if probes is not None:
+            overrides.append(func.set_config("ivfflat.probes", str(probes), True))
+        if overrides:
+            await self.session.execute(select(*overrides))
@@ -0,0 +1,140 @@
+import asyncio
+
+from openai import OpenAIError
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.embeddings import EmbeddingGenerator, content_hash, recipe_embedding_text, vector_literal
+from app.utils.unitofwork import UnitOfWork
+
+
+class EmbeddingWorker:
+    # drains the embedding_jobs outbox: claim a batch, embed what changed, write it back, retry the rest later
+    def __init__(
+            self,
+            uow: UnitOfWork,
+            embedder: EmbeddingGenerator,
+            batch_size: int | None = None,
+            lease_seconds: float | None = None,
+            max_attempts: int | None = None,
+            backoff: float | None = None,
+            max_backoff: float | None = None,
+    ):
+        self.uow = uow
+        self.embedder = embedder
+        self.batch_size = batch_size or settings.EMBEDDING_WORKER_BATCH_SIZE
+        self.lease_seconds = lease_seconds or settings.EMBEDDING_WORKER_LEASE_SECONDS
+        self.max_attempts = max_attempts or settings.EMBEDDING_WORKER_MAX_ATTEMPTS
+        self.backoff = settings.EMBEDDING_WORKER_BACKOFF_SECONDS if backoff is None else backoff
+        self.max_backoff = settings.EMBEDDING_WORKER_MAX_BACKOFF_SECONDS if max_backoff is None else max_backoff
+        self.embedded = 0
+        self.unchanged = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def run(self, poll_interval: float | None = None, stop: asyncio.Event | None = None):
+        poll_interval = settings.EMBEDDING_WORKER_POLL_SECONDS if poll_interval is None else poll_interval
+        stop = stop or asyncio.Event()
+        logger.info("Embedding worker started (batch_size=%s)", self.batch_size)
+        errors = 0
+        while not stop.is_set():
+            wait = poll_interval
+            try:
+                claimed = await self.run_once()
+                errors = 0
+            except (OSError, SQLAlchemyError) as exc:
+                logger.warning("Embedding worker cannot reach the database: %s", exc)
+                claimed = 0
+            except Exception:  # pylint: disable=broad-exception-caught
+                # a bug or a malformed vector must not end the worker, claimed jobs come back when their lease runs out
+                errors += 1
+                claimed = 0
+                wait = max(poll_interval, min(self.backoff * 2 ** (errors - 1), self.max_backoff))
+                logger.exception("Embedding worker batch failed, next try in %.1fs", wait)
+            # a full batch means there is probably more waiting
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> int:
+        async with self.uow as uow:
+            jobs = await uow.embedding_jobs.claim(self.batch_size, self.lease_seconds)
+            await uow.commit()
+        if not jobs:
+            return 0
+
+        async with self.uow as uow:
+            sources = {row[0]: row for row in await uow.recipies.embedding_sources([job[0] for job in jobs])}
+
+        todo, unchanged = [], []
+        for recipe_id, requested_at, attempts in jobs:
+            source = sources.get(recipe_id)
+            if source is None:
+                # deleted meanwhile, the job went with it
+                continue
+            _, version, title, ingredients, instructions, stored_hash, has_embedding = source
+            text = recipe_embedding_text(title, ingredients, instructions)
+            text_hash = content_hash(self.embedder.model, text)
+            if has_embedding and text_hash == stored_hash:
+                unchanged.append((recipe_id, requested_at))
+            else:
+                todo.append((recipe_id, requested_at, attempts, version, text, text_hash))
+
+        try:
+            # only changed content gets here, a cached vector for the normalized text would be the old one
+            vectors = await self.embedder.generate_many([item[4] for item in todo], refresh=True)
+        except (OpenAIError, RuntimeError) as exc:
+            await self._give_back(todo, unchanged, str(exc))
+            return len(jobs)
+
+        rows = [(recipe_id, version, vector_literal(vector), text_hash)
+                for (recipe_id, _, _, version, _, text_hash), vector in zip(todo, vectors)]
+        async with self.uow as uow:
+            stored = set(await uow.recipies.store_embeddings(rows))
+            await uow.recipies.mark_embedded([recipe_id for recipe_id, _ in unchanged])
+            done = unchanged + [(recipe_id, requested_at) for recipe_id, requested_at, *_ in todo if recipe_id in stored]
+            await uow.embedding_jobs.complete(done)
+            # edited after it was read: leave the job for the next round, with the new content.
+            # nothing failed, so this claim does not count towards max_attempts
+            edited = [(item[0], 0) for item in todo if item[0] not in stored]
+            await uow.embedding_jobs.retry(edited, "edited while embedding", count_attempt=False)
+            await uow.commit()
+
+        if self.uow.vector_index is not None:
+            self.uow.vector_index.upsert_many(
+                [item[0] for item in todo if item[0] in stored],
+                [vector for item, vector in zip(todo, vectors) if item[0] in stored],
+            )
+        self.embedded += len(stored)
+        self.unchanged += len(unchanged)
+        logger.info("Embedded %s recipes, %s unchanged", len(stored), len(unchanged))
+        return len(jobs)
+
+    async def _give_back(self, todo: list[tuple], unchanged: list[tuple], error: str):
+        retry, give_up = [], []
+        for recipe_id, requested_at, attempts, *_ in todo:
+            if attempts >= self.max_attempts:
+                give_up.append((recipe_id, requested_at))
+            else:
+                # exponential backoff, attempts already counts this one
+                retry.append((recipe_id, min(self.backoff * 2 ** (attempts - 1), self.max_backoff)))
+        async with self.uow as uow:
+            await uow.recipies.mark_embedded([recipe_id for recipe_id, _ in unchanged])
+            await uow.embedding_jobs.complete(unchanged)
+            await uow.embedding_jobs.retry(retry, error)
+            await uow.embedding_jobs.fail(give_up)
+            await uow.commit()
+        self.retried += len(retry)
+        self.failed += len(give_up)
+        logger.error("Embedding %s recipes failed, %s will be retried: %s", len(todo), len(retry), error)
+
+    def stats(self) -> dict:
+        return {
+            "embedded": self.embedded,
+            "unchanged": self.unchanged,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
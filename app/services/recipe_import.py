@@ -0,0 +1,110 @@
+from collections import defaultdict, deque
+from typing import AsyncIterator
+
+from openai import OpenAIError
+from pydantic import ValidationError
+
+from app.api.schemas.enums import ImportFormat
+from app.api.schemas.recipe import ImportReport, ImportRowError, RecipeCreate
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.embeddings import EmbeddingGenerator, content_hash, recipe_embedding_text, vector_literal
+from app.utils.record_stream import read_csv, read_ndjson
+from app.utils.unitofwork import UnitOfWork
+
+
+class RecipeImporter:
+    def __init__(
+            self,
+            uow: UnitOfWork,
+            embedder: EmbeddingGenerator | None = None,
+            batch_size: int | None = None,
+            embed: bool = True,
+    ):
+        self.uow = uow
+        self.embedder = embedder if embedder is not None else EmbeddingGenerator()
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.embed = embed
+
+    async def run(self, chunks: AsyncIterator[bytes], fmt: ImportFormat) -> ImportReport:
+        logger.info("Importing recipes from %s stream (batch_size=%s)", fmt.value, self.batch_size)
+        if self.embed and not self.embedder.backend.available:
+            # no API key: import the rows anyway and leave them queued for the embedding worker
+            logger.warning("Embedding backend %s is unavailable, recipes are queued instead", self.embedder.model)
+            self.embed = False
+        reader = read_csv if fmt == ImportFormat.csv else read_ndjson
+        report = ImportReport()
+        batch: list[tuple[int, RecipeCreate]] = []
+
+        async for line, record in reader(chunks):
+            report.processed += 1
+            if isinstance(record, ValueError):
+                self._fail(report, line, str(record))
+                continue
+            try:
+                batch.append((line, RecipeCreate.model_validate(record)))
+            except ValidationError as exc:
+                self._fail(report, line, _describe(exc))
+                continue
+            if len(batch) >= self.batch_size:
+                await self._write_batch(batch, report)
+                batch = []
+        if batch:
+            await self._write_batch(batch, report)
+
+        logger.info("Import finished: processed=%s inserted=%s failed=%s", report.processed, report.inserted, report.failed)
+        return report
+
+    async def _write_batch(self, batch: list[tuple[int, RecipeCreate]], report: ImportReport):
+        embeddings = [None] * len(batch)
+        hashes = [None] * len(batch)
+        if self.embed:
+            texts = [recipe_embedding_text(r.title, r.ingredients, r.instructions) for _, r in batch]
+            hashes = [content_hash(self.embedder.model, text) for text in texts]
+            try:
+                embeddings = await self.embedder.generate_many(texts)
+            except (OpenAIError, RuntimeError) as exc:
+                logger.error("Embedding a batch of %s recipes failed: %s", len(batch), exc)
+                for line, _ in batch:
+                    self._fail(report, line, f"embedding failed: {exc}")
+                return
+
+        records = [
+            (line, r.title, r.ingredients, r.instructions, r.cooking_time, r.difficulty.value, r.cuisine, r.tags,
+             vector_literal(embedding), text_hash)
+            for (line, r), embedding, text_hash in zip(batch, embeddings, hashes)
+        ]
+        # whatever is not returned by the insert collided with uq_recipe_title_cuisine
+        pending = defaultdict(deque)
+        for position, (line, r) in enumerate(batch):
+            pending[(r.title, r.cuisine)].append((line, position))
+        new_ids, new_embeddings, unembedded = [], [], []
+        async with self.uow as uow:
+            inserted = await uow.recipies.bulk_insert(records)
+            for recipe_id, title, cuisine in inserted:
+                _, position = pending[(title, cuisine)].popleft()
+                if embeddings[position] is None:
+                    unembedded.append(recipe_id)
+                else:
+                    new_ids.append(recipe_id)
+                    new_embeddings.append(embeddings[position])
+            # rows imported with --no-embed are embedded later by the worker
+            await uow.embedding_jobs.enqueue(unembedded)
+            await uow.commit()
+
+        if self.uow.vector_index is not None:
+            self.uow.vector_index.upsert_many(new_ids, new_embeddings)
+        report.inserted += len(inserted)
+        for line in sorted(line for lines in pending.values() for line, _ in lines):
+            self._fail(report, line, "Recipe with this title and cuisine already exists")
+        logger.info("Imported batch: inserted=%s total=%s", len(inserted), report.inserted)
+
+    @staticmethod
+    def _fail(report: ImportReport, line: int, error: str):
+        report.failed += 1
+        if len(report.errors) < settings.IMPORT_MAX_REPORTED_ERRORS:
+            report.errors.append(ImportRowError(line=line, error=error))
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())
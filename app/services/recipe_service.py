@@ -1,34 +1,77 @@
+import asyncio
+import time
+from typing import AsyncIterator, Callable
+
 from fastapi import HTTPException, status
 from sqlalchemy.exc import IntegrityError
 
-from app.api.schemas.recipe import RecipeCreate, RecipeUpdate, RecipeOut
+from app.api.schemas.enums import RecipeSort
+from app.api.schemas.recipe import RecipeCreate, RecipeUpdate, RecipeOut, RecipeOutAdapter, RecipeOutList, RecipePage
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.metrics import observe_stage
 from app.utils.embeddings import EmbeddingGenerator
 from app.utils.nl_query_parser import parse_natural_query
 from app.utils.openai_parser import OpenAIQueryParser
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.profiling import profile_thread
+from app.repositories.recipies import RecipeRepository
+from app.utils.recipe_cache import RecipeCache
 from app.utils.unitofwork import UnitOfWork
 
+# the columns recipe_embedding_text is built from
+EMBEDDED_FIELDS = {"title", "ingredients", "instructions"}
+
+# what a cursor may carry for each sort column; cooking_time is nullable and sorts nulls last
+SORT_VALUE_TYPES = {
+    RecipeSort.id: int,
+    RecipeSort.title: str,
+    RecipeSort.cooking_time: (int, type(None)),
+}
+# search cursors carry (rank, id)
+RANK_CURSOR_TYPES = ((int, float), int)
+# id and cooking_time are integer (int4) columns, a larger value fails in asyncpg before postgres sees it
+CURSOR_INT_RANGE = range(-2 ** 31, 2 ** 31)
+
+
+def _valid_cursor_value(value, expected) -> bool:
+    if isinstance(value, bool) or not isinstance(value, expected):
+        return False
+    return not isinstance(value, int) or value in CURSOR_INT_RANGE
+
+
+def _discard(task: asyncio.Future | None):
+    # nobody awaits the task any more, retrieve its outcome so a failure is not logged as never retrieved
+    if task is not None:
+        task.cancel()
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
 
 class RecipeService:
-    def __init__(self, uow: UnitOfWork):
+    def __init__(
+            self,
+            uow: UnitOfWork,
+            parser: OpenAIQueryParser | None = None,
+            embedder: EmbeddingGenerator | None = None,
+            recipe_cache: RecipeCache | None = None,
+    ):
         self.uow = uow
-        self.parser = OpenAIQueryParser()
-        self.embedder = EmbeddingGenerator()
+        self.parser = parser if parser is not None else OpenAIQueryParser()
+        self.embedder = embedder if embedder is not None else EmbeddingGenerator()
+        self.recipe_cache = recipe_cache
 
     async def create_recipe(self, data: RecipeCreate) -> RecipeOut:
         logger.info("Creating recipe: %s", data.title)
 
-        text = f"{data.title} {', '.join(data.ingredients)} {data.instructions}"
-        embedding = await self.embedder.generate(text)
-        new_recipe = data.model_dump()
-        new_recipe['embedding'] = embedding
-
         async with self.uow as uow:
             try:
-                recipe = await uow.recipies.create(new_recipe)
+                with observe_stage("db"):
+                    recipe = await uow.recipies.create(data.model_dump())
+                    # the embedding worker picks it up after commit, the request does not wait for OpenAI
+                    await uow.embedding_jobs.enqueue([recipe.id])
                 await uow.commit()
                 logger.info("Recipe created with id=%s", recipe.id)
-                return RecipeOut.model_validate(recipe, from_attributes=True)
+                return self._to_out([recipe])[0]
             except IntegrityError:
                 await uow.rollback()
                 raise HTTPException(
@@ -38,78 +81,353 @@ class RecipeService:
 
     async def get_recipe(self, recipe_id: int) -> RecipeOut | None:
         logger.info("Getting recipe with id=%s", recipe_id)
+        if self.recipe_cache is not None:
+            payload = await self.get_recipe_json(recipe_id)
+            if payload is None:
+                return None
+            with observe_stage("serialization"):
+                return RecipeOutAdapter.validate_json(payload)
+        return await self._load_recipe(recipe_id)
+
+    async def get_recipe_json(self, recipe_id: int) -> bytes | None:
+        # the response body itself: cached bytes are sent as they are, without validating and dumping them again
+        if self.recipe_cache is not None:
+            return await self.recipe_cache.get_or_load(recipe_id, lambda: self._load_recipe_json(recipe_id))
+        return await self._load_recipe_json(recipe_id)
+
+    async def _load_recipe_json(self, recipe_id: int) -> bytes | None:
+        recipe = await self._load_recipe(recipe_id)
+        if recipe is None:
+            return None
+        with observe_stage("serialization"):
+            return RecipeOutAdapter.dump_json(recipe)
+
+    async def _load_recipe(self, recipe_id: int) -> RecipeOut | None:
         async with self.uow as uow:
-            recipe = await uow.recipies.get(recipe_id)
+            with observe_stage("db"):
+                recipe = await uow.recipies.get(recipe_id)
             if recipe:
                 logger.info("Recipe found: id=%s title=%s", recipe.id, recipe.title)
-                return RecipeOut.model_validate(recipe, from_attributes=True)
+                return self._to_out([recipe])[0]
             logger.warning("Recipe with id=%s not found", recipe_id)
             return None
 
-    async def list_recipes(self, skip: int = 0, limit: int = 20) -> list[RecipeOut]:
+    async def list_recipes(self, skip: int = 0, limit: int = 20, order_by: RecipeSort = RecipeSort.id) -> list[RecipeOut]:
         logger.info("Listing recipes (skip=%s, limit=%s)", skip, limit)
         async with self.uow as uow:
-            recipes = await uow.recipies.get_list(skip=skip, limit=limit)
+            with observe_stage("db"):
+                recipes = await uow.recipies.get_list(skip=skip, limit=limit, order_by=order_by.value)
             logger.info("Found %s recipes", len(recipes))
-            return [RecipeOut.model_validate(r, from_attributes=True) for r in recipes]
+            return self._to_out(recipes)
+
+    async def list_recipes_page(
+            self,
+            limit: int = 20,
+            cursor: str | None = None,
+            order_by: RecipeSort = RecipeSort.id,
+    ) -> RecipePage:
+        logger.info("Listing recipes (cursor=%s, limit=%s, order_by=%s)", cursor, limit, order_by.value)
+        after = self._decode_keyset_cursor(cursor, order_by)
+        async with self.uow as uow:
+            with observe_stage("db"):
+                recipes = await uow.recipies.get_page(limit=limit, order_by=order_by.value, after=after)
+            logger.info("Found %s recipes", len(recipes))
+            return self._keyset_page(recipes, limit, order_by)
+
+    async def list_recipes_stream(
+            self,
+            limit: int | None = None,
+            cursor: str | None = None,
+            order_by: RecipeSort = RecipeSort.id,
+            skip: int = 0,
+    ) -> AsyncIterator[list[RecipeOut]]:
+        logger.info("Streaming recipes (cursor=%s, limit=%s, order_by=%s)", cursor, limit, order_by.value)
+        after = self._decode_keyset_cursor(cursor, order_by)
+        return await self._stream(
+            lambda recipies: recipies.stream_page(limit=limit, order_by=order_by.value, after=after, skip=skip)
+        )
 
     async def update_recipe(self, recipe_id: int, data: RecipeUpdate) -> RecipeOut | None:
         data_dict = data.model_dump(exclude_unset=True)
         logger.info("Updating recipe id=%s with data=%s", recipe_id, data_dict)
         async with self.uow as uow:
-            recipe = await uow.recipies.update(recipe_id, data_dict)
+            with observe_stage("db"):
+                recipe = await uow.recipies.update(recipe_id, data_dict)
+                if recipe and EMBEDDED_FIELDS & data_dict.keys():
+                    await uow.embedding_jobs.enqueue([recipe_id])
             if recipe:
                 await uow.commit()
+                await self._invalidate_cached(recipe_id)
                 logger.info("Recipe id=%s updated successfully", recipe_id)
-                return RecipeOut.model_validate(recipe, from_attributes=True)
+                return self._to_out([recipe])[0]
             logger.warning("Failed to update recipe id=%s (not found)", recipe_id)
             return None
 
     async def delete_recipe(self, recipe_id: int) -> bool:
         logger.info("Deleting recipe id=%s", recipe_id)
         async with self.uow as uow:
-            deleted = await uow.recipies.delete(recipe_id)
+            with observe_stage("db"):
+                deleted = await uow.recipies.delete(recipe_id)
             if deleted:
                 await uow.commit()
+                await self._invalidate_cached(recipe_id)
+                if uow.vector_index is not None:
+                    uow.vector_index.remove(recipe_id)
                 logger.info("Recipe id=%s deleted successfully", recipe_id)
             else:
                 logger.warning("Failed to delete recipe id=%s (not found)", recipe_id)
             return deleted
 
+    async def _invalidate_cached(self, recipe_id: int):
+        # after the commit: a reader that loaded the old row before it is fenced off by the generation bump
+        if self.recipe_cache is not None:
+            await self.recipe_cache.invalidate(recipe_id)
+
     async def filter_by_ingredients(
             self,
             include: list[str] | None = None,
             exclude: list[str] | None = None,
+            limit: int | None = None,
+            order_by: RecipeSort = RecipeSort.id,
     ) -> list[RecipeOut]:
-        logger.info("Filtering recipes include=%s exclude=%s", include, exclude)
+        page = await self.filter_by_ingredients_page(include, exclude, limit=limit, order_by=order_by)
+        return page.items
+
+    async def filter_by_ingredients_page(
+            self,
+            include: list[str] | None = None,
+            exclude: list[str] | None = None,
+            limit: int | None = None,
+            cursor: str | None = None,
+            order_by: RecipeSort = RecipeSort.id,
+    ) -> RecipePage:
+        logger.info("Filtering recipes include=%s exclude=%s limit=%s order_by=%s", include, exclude, limit, order_by.value)
+        after = self._decode_keyset_cursor(cursor, order_by)
         async with self.uow as uow:
-            recipes = await uow.recipies.filter_by_ingredients(include, exclude)
+            with observe_stage("db"):
+                recipes = await uow.recipies.filter_by_ingredients(include, exclude, limit=limit, order_by=order_by, after=after)
             logger.info("Found %s recipes matching filter", len(recipes))
-            return [RecipeOut.model_validate(r, from_attributes=True) for r in recipes]
+            return self._keyset_page(recipes, limit, order_by)
 
-    async def search(self, query: str) -> list[RecipeOut]:
+    async def filter_by_ingredients_stream(
+            self,
+            include: list[str] | None = None,
+            exclude: list[str] | None = None,
+            limit: int | None = None,
+            cursor: str | None = None,
+            order_by: RecipeSort = RecipeSort.id,
+    ) -> AsyncIterator[list[RecipeOut]]:
+        logger.info("Streaming filtered recipes include=%s exclude=%s limit=%s", include, exclude, limit)
+        after = self._decode_keyset_cursor(cursor, order_by)
+        return await self._stream(
+            lambda recipies: recipies.stream_filter_by_ingredients(
+                include, exclude, limit=limit, order_by=order_by, after=after,
+            )
+        )
+
+    async def search(self, query: str, limit: int = 20, cursor: str | None = None) -> list[RecipeOut]:
+        return (await self.search_page(query, limit=limit, cursor=cursor)).items
+
+    async def search_page(self, query: str, limit: int = 20, cursor: str | None = None) -> RecipePage:
         logger.info("Performing natural search with query='%s'", query)
-        parsed_query = parse_natural_query(query)
+        parsed_query = await self._parse_locally(query)
         logger.info("Parsed query=%s", parsed_query)
-        async with self.uow as uow:
-            recipes = await uow.recipies.fulltext_search(parsed_query)
-            logger.info("Fulltext search found %s recipes", len(recipes))
-            return [RecipeOut.model_validate(r, from_attributes=True) for r in recipes]
+        page = await self._fulltext_page(parsed_query, limit, cursor)
+        logger.info("Fulltext search found %s recipes", len(page.items))
+        return page
+
+    async def smart_search(self, query: str, limit: int = 20, cursor: str | None = None) -> list[RecipeOut]:
+        return (await self.smart_search_page(query, limit=limit, cursor=cursor)).items
 
-    async def smart_search(self, query: str) -> list[RecipeOut]:
+    async def smart_search_page(self, query: str, limit: int = 20, cursor: str | None = None) -> RecipePage:
         logger.info("Performing smart search with OpenAI for query='%s'", query)
-        parsed_query = await self.parser.parse(query)
-        logger.info("Parsed query with OpenAI=%s", parsed_query)
+        parsed_query, parser = await self._parse_smart_query(query)
+        logger.info("Parsed query with %s=%s", parser, parsed_query)
+        page = await self._fulltext_page(parsed_query, limit, cursor)
+        page.parser = parser
+        logger.info("Smart search found %s recipes", len(page.items))
+        return page
+
+    async def search_stream(
+            self, query: str, limit: int | None = None, cursor: str | None = None,
+    ) -> AsyncIterator[list[RecipeOut]]:
+        logger.info("Streaming natural search with query='%s'", query)
+        after = self._decode_cursor(cursor, *RANK_CURSOR_TYPES)
+        parsed_query = await self._parse_locally(query)
+        return await self._stream(
+            lambda recipies: recipies.stream_fulltext_search(parsed_query, limit=limit, after=after)
+        )
+
+    async def smart_search_stream(
+            self, query: str, limit: int | None = None, cursor: str | None = None,
+    ) -> tuple[AsyncIterator[list[RecipeOut]], str]:
+        logger.info("Streaming smart search for query='%s'", query)
+        after = self._decode_cursor(cursor, *RANK_CURSOR_TYPES)
+        parsed_query, parser = await self._parse_smart_query(query)
+        batches = await self._stream(
+            lambda recipies: recipies.stream_fulltext_search(parsed_query, limit=limit, after=after)
+        )
+        return batches, parser
+
+    async def _stream(self, load: Callable[[RecipeRepository], AsyncIterator[list]]) -> AsyncIterator[list[RecipeOut]]:
+        batches = self._stream_batches(load)
+        # the query runs before the response starts, so a failing one still gets an error status
+        first = await anext(batches, None)
+
+        async def chained():
+            if first is None:
+                return
+            yield first
+            async for batch in batches:
+                yield batch
+
+        return chained()
+
+    async def _stream_batches(
+            self, load: Callable[[RecipeRepository], AsyncIterator[list]],
+    ) -> AsyncIterator[list[RecipeOut]]:
+        # the unit of work, and its connection, stay open until the last row is sent or the client goes away
         async with self.uow as uow:
-            recipes = await uow.recipies.fulltext_search(parsed_query)
-            logger.info("Smart search found %s recipes", len(recipes))
-            return [RecipeOut.model_validate(r, from_attributes=True) for r in recipes]
+            recipes = load(uow.recipies)
+            while True:
+                with observe_stage("db"):
+                    batch = await anext(recipes, None)
+                if batch is None:
+                    return
+                yield self._to_out(batch)
+
+    async def _parse_smart_query(self, query: str) -> tuple[dict, str]:
+        local = None
+        if settings.SMART_SEARCH_PARALLEL_LOCAL_PARSE:
+            local = asyncio.ensure_future(self._parse_locally(query))
+
+        breaker = self.parser.breaker
+        if breaker.allow():
+            started = time.perf_counter()
+            try:
+                with observe_stage("openai_parse"):
+                    parsed = await asyncio.wait_for(self.parser.parse(query), timeout=settings.SMART_SEARCH_BUDGET_MS / 1000)
+            except asyncio.TimeoutError:
+                breaker.record_failure()
+                logger.warning("OpenAI parse exceeded %sms budget, falling back to local parser", settings.SMART_SEARCH_BUDGET_MS)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                # a missing key or an unparsable reply ends a half-open trial just like an API error
+                breaker.record_failure()
+                logger.warning("OpenAI parse failed (%r), falling back to local parser", exc)
+            except asyncio.CancelledError:
+                breaker.abandon()
+                _discard(local)
+                raise
+            else:
+                breaker.record_success(time.perf_counter() - started)
+                _discard(local)
+                return parsed, "openai"
+        else:
+            logger.warning("OpenAI circuit breaker is open, using local parser")
+
+        if local is None:
+            local = self._parse_locally(query)
+        return await local, "local"
+
+    async def _parse_locally(self, query: str) -> dict:
+        # CPU-bound and possibly waiting for the model to load, keep it off the event loop
+        with observe_stage("spacy_parse"):
+            return await asyncio.to_thread(profile_thread(parse_natural_query), query)
 
-    async def vector_search(self, query: str, limit: int = 5):
+    async def _embed(self, text: str) -> list[float]:
+        with observe_stage("embedding"):
+            return await self.embedder.generate(text)
+
+    async def hybrid_search(
+            self,
+            query: str,
+            limit: int = 20,
+            text_weight: float | None = None,
+            vector_weight: float | None = None,
+            ef_search: int | None = None,
+            probes: int | None = None,
+    ) -> list[RecipeOut]:
+        logger.info("Performing hybrid search for query='%s'", query)
+        # the local parse feeds the text branch and the filters, the raw query is embedded for the kNN branch
+        parsed_query, embedding = await asyncio.gather(self._parse_locally(query), self._embed(query))
+        logger.info("Parsed query=%s", parsed_query)
+
+        async with self.uow as uow:
+            with observe_stage("db"):
+                rows = await uow.recipies.hybrid_search(
+                    parsed_query, embedding, limit=limit, text_weight=text_weight, vector_weight=vector_weight,
+                    ef_search=ef_search, probes=probes,
+                )
+            logger.info("Hybrid search found %s recipes", len(rows))
+            return self._to_out(r for r, _ in rows)
+
+    async def _fulltext_page(self, parsed_query: dict, limit: int, cursor: str | None) -> RecipePage:
+        after = self._decode_cursor(cursor, *RANK_CURSOR_TYPES)
+        async with self.uow as uow:
+            with observe_stage("db"):
+                rows = await uow.recipies.fulltext_search(parsed_query, limit=limit, after=after)
+            items = self._to_out(r for r, _ in rows)
+
+        next_cursor = None
+        if rows and len(rows) == limit:
+            last, rank = rows[-1]
+            next_cursor = encode_cursor(rank, last.id)
+        return RecipePage(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    def _to_out(recipes) -> list[RecipeOut]:
+        with observe_stage("serialization"):
+            return RecipeOutList.validate_python(list(recipes), from_attributes=True)
+
+    def _keyset_page(self, recipes: list, limit: int | None, order_by: RecipeSort) -> RecipePage:
+        items = self._to_out(recipes)
+        next_cursor = None
+        if recipes and len(recipes) == limit:
+            last = recipes[-1]
+            next_cursor = encode_cursor(order_by.value, getattr(last, order_by.value), last.id)
+        return RecipePage(items=items, next_cursor=next_cursor)
+
+    def _decode_keyset_cursor(self, cursor: str | None, order_by: RecipeSort) -> list | None:
+        values = self._decode_cursor(cursor, str, SORT_VALUE_TYPES[order_by], int)
+        if values is None:
+            return None
+        if values[0] != order_by.value:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Pagination cursor was issued for order_by={values[0]}",
+            )
+        return values[1:]
+
+    @staticmethod
+    def _decode_cursor(cursor: str | None, *types) -> list | None:
+        # every value is checked against its expected type and range so a crafted cursor is a 400, not a database error
+        if cursor is None:
+            return None
+        try:
+            values = decode_cursor(cursor, size=len(types))
+        except ValueError:
+            values = None
+        if values is None or not all(_valid_cursor_value(value, expected) for value, expected in zip(values, types)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor",
+            )
+        return values
+
+    async def vector_search(
+            self,
+            query: str,
+            limit: int = 5,
+            ef_search: int | None = None,
+            probes: int | None = None,
+    ):
         logger.info("Performing vector search for query='%s'", query)
-        embedding = await self.embedder.generate(query)
+        embedding = await self._embed(query)
 
         async with self.uow:
-            recipes = await self.uow.recipies.vector_search(embedding, limit=limit)
+            with observe_stage("db"):
+                recipes = await self.uow.recipies.vector_search(
+                    embedding, limit=limit, ef_search=ef_search, probes=probes,
+                )
             logger.info("Vector search found %s recipes", len(recipes))
-            return [RecipeOut.model_validate(r, from_attributes=True) for r in recipes]
+            return self._to_out(recipes)
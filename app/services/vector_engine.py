@@ -0,0 +1,21 @@
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.unitofwork import UnitOfWork
+from app.utils.vector_index import VectorIndex
+
+
+async def load_vector_index(uow: UnitOfWork, dtype: str | None = None, batch_size: int | None = None) -> VectorIndex:
+    # walk the table in id order, one short transaction per batch so startup never pins a connection for long
+    index = VectorIndex(dtype=dtype or settings.VECTOR_INDEX_DTYPE)
+    batch_size = batch_size or settings.VECTOR_INDEX_LOAD_BATCH
+    last_id = 0
+    while True:
+        async with uow:
+            rows = await uow.recipies.embeddings_after(last_id, limit=batch_size)
+        if not rows:
+            break
+        index.upsert_many([recipe_id for recipe_id, _ in rows], [embedding for _, embedding in rows])
+        last_id = rows[-1][0]
+    index.loaded = True
+    logger.info("Loaded %s embeddings into the in-memory vector index", len(index))
+    return index
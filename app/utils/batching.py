@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class MicroBatcher:
+    # coalesces concurrent submit() calls into one handler call per window or per max_batch_size items
+    def __init__(
+            self,
+            handler: Callable[[list], Awaitable[list]],
+            max_batch_size: int = 64,
+            max_wait: float = 0.005,
+    ):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    async def aclose(self):
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            # callers that were cancelled while waiting simply drop their result
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,128 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+_MISSING = object()
+
+
+def normalize_text(text: str) -> str:
+    # cache keys ignore case and whitespace differences
+    return " ".join(text.lower().split())
+
+
+class LRUCache:
+    def __init__(
+            self,
+            maxsize: int | None = None,
+            max_bytes: int | None = None,
+            ttl: float | None = None,
+            sizeof: Callable[[Any], int] = sys.getsizeof,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.clock = clock
+        self._data: OrderedDict[Hashable, tuple[Any, int, float | None]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= self.clock():
+            self.pop(key)
+            entry = None
+        if entry is None:
+            if count:
+                self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.pop(key)
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self.clock() + ttl if ttl is not None else None
+        self._data[key] = (value, size, expires_at)
+        self.bytes += size
+        self._evict()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self.bytes -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _evict(self):
+        while self._data and (
+                (self.maxsize is not None and len(self._data) > self.maxsize)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            _, (_, size, _) = self._data.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+
+class SingleFlight:
+    # concurrent calls with the same key share one in-flight execution of fn
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        # a caller that goes away must not cancel the call the others are waiting for
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+        }
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter was cancelled
@@ -0,0 +1,69 @@
+import time
+from typing import Callable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    # opens after failure_threshold consecutive failures (slow calls count as failures),
+    # lets one trial call through after reset_timeout and closes again if it succeeds
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            reset_timeout: float = 30.0,
+            slow_call_threshold: float | None = None,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_threshold = slow_call_threshold
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, elapsed: float = 0.0):
+        if self.slow_call_threshold is not None and elapsed > self.slow_call_threshold:
+            self.record_failure()
+            return
+        self.failures = 0
+        self.state = CLOSED
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+    def abandon(self):
+        # the call was cancelled before it had an outcome, a half-open breaker lets the next one try
+        self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Protocol
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# dimensions of the OpenAI models when the request does not ask for fewer
+OPENAI_NATIVE_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def openai_request_dimensions(model: str, dimensions: int | None) -> int | None:
+    # only text-embedding-3 models accept `dimensions`, send it only when it asks for a shorter vector
+    return dimensions if dimensions and dimensions != OPENAI_NATIVE_DIMENSIONS.get(model) else None
+
+
+def openai_embedding_name(model: str, dimensions: int | None) -> str:
+    request_dimensions = openai_request_dimensions(model, dimensions)
+    return model if request_dimensions is None else f"{model}:{request_dimensions}"
+
+
+def can_shorten(model: str) -> bool:
+    # text-embedding-3 vectors cut to their first n dimensions and renormalized are what the API returns for
+    # dimensions=n, so stored vectors can be shortened without calling the API again
+    return model.startswith("text-embedding-3")
+
+
+class EmbeddingBackend(Protocol):
+    # name identifies the vector space: it is part of cache keys and content hashes, so changing
+    # model or dimensions never mixes old and new vectors
+    name: str
+    dimensions: int
+    available: bool
+
+    async def embed(self, texts: list[str]) -> list[List[float]]: ...
+
+    async def aclose(self): ...
+
+
+class OpenAIEmbeddingBackend:
+    def __init__(self, client: AsyncOpenAI | None, model: str, dimensions: int | None = None):
+        if client is None:
+            logger.warning("OpenAI API key is not set. Embeddings will not work.")
+        self.client = client
+        self.model = model
+        self.request_dimensions = openai_request_dimensions(model, dimensions)
+        self.dimensions = dimensions or OPENAI_NATIVE_DIMENSIONS.get(model)
+        self.name = openai_embedding_name(model, dimensions)
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None
+
+    async def embed(self, texts: list[str]) -> list[List[float]]:
+        if not self.client:
+            raise RuntimeError("OpenAI API key not configured")
+        unique = list(dict.fromkeys(texts))
+        kwargs = {"dimensions": self.request_dimensions} if self.request_dimensions else {}
+        response = await self.client.embeddings.create(model=self.model, input=unique, **kwargs)
+        vectors = {unique[item.index]: item.embedding for item in response.data}
+        return [vectors[text] for text in texts]
+
+    async def aclose(self):
+        pass
+
+
+def hashing_embed(texts: list[str], dimensions: int) -> list[List[float]]:
+    # signed feature hashing of words and word pairs with sublinear term frequency, L2-normalized.
+    # module level so a process pool can pickle it
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in TOKEN.findall(text.lower())]
+        # an empty text still gets a unit vector, a zero vector has no cosine distance
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])] or [""]
+        digests = np.frombuffer(
+            b"".join(hashlib.blake2b(feature.encode(), digest_size=8).digest() for feature in features), dtype="<u8",
+        )
+        signs = np.where(digests >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+        np.add.at(vectors[row], (digests % np.uint64(dimensions)).astype(np.intp), signs)
+    vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).tolist()
+
+
+class HashingEmbeddingBackend:
+    # local CPU embeddings: no network and no model download, the same text always gives the same vector.
+    # it matches words rather than meaning, good enough for offline use, tests and benchmarks
+    available = True
+
+    def __init__(self, dimensions: int, executor: Executor | None = None):
+        self.dimensions = dimensions
+        self.name = f"hashing-v1:{dimensions}"
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+    async def embed(self, texts: list[str]) -> list[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, hashing_embed, texts, self.dimensions)
+
+    async def aclose(self):
+        self.executor.shutdown(wait=False)
+
+
+def embedding_backend_from_settings(client: AsyncOpenAI | None = None, model: str | None = None) -> EmbeddingBackend:
+    if settings.EMBEDDING_BACKEND == "local":
+        workers = settings.EMBEDDING_LOCAL_WORKERS
+        if settings.EMBEDDING_LOCAL_EXECUTOR == "process":
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+        return HashingEmbeddingBackend(settings.EMBEDDING_DIMENSIONS, executor=executor)
+    if client is None and settings.OPENAI_API_KEY:
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    return OpenAIEmbeddingBackend(client, model or settings.EMBEDDING_MODEL, dimensions=settings.EMBEDDING_DIMENSIONS)
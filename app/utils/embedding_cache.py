@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.caching import LRUCache, normalize_text
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode()).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    # vectors are stored as float32 blobs, which is also what pgvector keeps
+    def __init__(self, path: str, ttl: float, max_entries: int, prune_every: int = 1000):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_accessed_at ON embeddings (accessed_at)")
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE embeddings SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, vector: bytes):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, vector, now, now),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune(now)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM embeddings WHERE created_at <= ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class EmbeddingCache:
+    def __init__(self, memory: LRUCache, store: SQLiteEmbeddingStore | None = None):
+        self.memory = memory
+        self.store = store
+        self.store_hits = 0
+        self.store_misses = 0
+
+    async def get(self, model: str, text: str) -> list[float] | None:
+        key = embedding_key(model, text)
+        vector = self.memory.get(key)
+        if vector is None and self.store is not None:
+            vector = await asyncio.to_thread(self.store.get, key)
+            if vector is None:
+                self.store_misses += 1
+            else:
+                self.store_hits += 1
+                self.memory.set(key, vector)
+        if vector is None:
+            return None
+        return array("f", vector).tolist()
+
+    async def set(self, model: str, text: str, embedding: list[float]):
+        key = embedding_key(model, text)
+        vector = array("f", embedding).tobytes()
+        self.memory.set(key, vector)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.set, key, vector)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.memory.hits + self.store_hits,
+            "misses": self.store_misses if self.store is not None else self.memory.misses,
+            "memory": self.memory.stats(),
+            "store": {
+                "enabled": self.store is not None,
+                "hits": self.store_hits,
+                "misses": self.store_misses,
+            },
+        }
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    @classmethod
+    def from_settings(cls) -> "EmbeddingCache":
+        memory = LRUCache(max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES, sizeof=len)
+        store = None
+        if settings.EMBEDDING_CACHE_PATH:
+            try:
+                store = SQLiteEmbeddingStore(
+                    settings.EMBEDDING_CACHE_PATH,
+                    ttl=settings.EMBEDDING_CACHE_TTL,
+                    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                )
+            except sqlite3.Error as exc:
+                logger.warning("Persistent embedding cache at %s is unavailable: %s", settings.EMBEDDING_CACHE_PATH, exc)
+        return cls(memory, store)
@@ -1,16 +1,74 @@
+import asyncio
+import hashlib
 from typing import List
+
 from openai import AsyncOpenAI
+
 from app.core.config import settings
+from app.utils.batching import MicroBatcher
+from app.utils.embedding_backends import EmbeddingBackend, OpenAIEmbeddingBackend, embedding_backend_from_settings
+from app.utils.embedding_cache import EmbeddingCache
+
+
+def recipe_embedding_text(title: str, ingredients: list[str], instructions: str) -> str:
+    return f"{title} {', '.join(ingredients)} {instructions}"
+
+
+def content_hash(model: str, text: str) -> str:
+    # change detection for stored embeddings: unlike the cache key the text is not normalized,
+    # so an edit that only changes case or spacing is still embedded again
+    return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+
+def vector_literal(embedding: list[float] | None) -> str | None:
+    # pgvector's text input format, for COPY and unnest() parameters
+    if embedding is None:
+        return None
+    return "[" + ",".join(map(str, embedding)) + "]"
 
 
 class EmbeddingGenerator:
-    def __init__(self, model: str = "text-embedding-3-small"):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = model
-
-    async def generate(self, text: str) -> List[float]:
-        response = await self.client.embeddings.create(
-            model=self.model,
-            input=text,
+    # cache and micro-batching in front of an EmbeddingBackend
+    def __init__(
+            self,
+            model: str | None = None,
+            cache: EmbeddingCache | None = None,
+            client: AsyncOpenAI | None = None,
+            batch_window_ms: float | None = None,
+            max_batch_size: int | None = None,
+            backend: EmbeddingBackend | None = None,
+    ):
+        if backend is None:
+            if client is not None:
+                backend = OpenAIEmbeddingBackend(client, model or settings.EMBEDDING_MODEL, dimensions=settings.EMBEDDING_DIMENSIONS)
+            else:
+                backend = embedding_backend_from_settings(model=model)
+        self.backend = backend
+        self.cache = cache if cache is not None else EmbeddingCache.from_settings()
+        self.batcher = MicroBatcher(
+            self.backend.embed,
+            max_batch_size=max_batch_size or settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait=(settings.EMBEDDING_BATCH_WINDOW_MS if batch_window_ms is None else batch_window_ms) / 1000,
         )
-        return response.data[0].embedding
+
+    @property
+    def model(self) -> str:
+        return self.backend.name
+
+    async def generate(self, text: str, refresh: bool = False) -> List[float]:
+        # refresh skips the lookup: the cache is keyed by normalized text, an edit of case or spacing would hit it
+        if not refresh:
+            cached = await self.cache.get(self.model, text)
+            if cached is not None:
+                return cached
+
+        embedding = await self.batcher.submit(text)
+        await self.cache.set(self.model, text, embedding)
+        return embedding
+
+    async def generate_many(self, texts: list[str], refresh: bool = False) -> list[List[float]]:
+        return list(await asyncio.gather(*(self.generate(text, refresh=refresh) for text in texts)))
+
+    async def aclose(self):
+        await self.batcher.aclose()
+        await self.backend.aclose()
@@ -1,16 +1,54 @@
-import spacy
+import copy
+import threading
+from functools import lru_cache
 
+from app.core.config import settings
 from app.core.logger import logger
+from app.utils.caching import normalize_text
 
-nlp = spacy.load("en_core_web_sm")
+# the parser only reads lemmas, stop words and like_num: the lemmatizer needs POS from
+# tok2vec + tagger + attribute_ruler, the dependency parser and NER are never used
+SPACY_MODEL = "en_core_web_sm"
+SPACY_EXCLUDE = ["parser", "ner", "senter"]
+
+_nlp = None
+_nlp_lock = threading.Lock()
 
 CUSTOM_STOPWORDS = {"less", "under", "with", "minute", "minutes", "recipe", "recipes"}
 
 
+def get_nlp():
+    # loaded on first use (or by warmup_nlp) so importing the app stays cheap for CRUD-only workers and alembic
+    global _nlp  # pylint: disable=global-statement
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy  # pylint: disable=import-outside-toplevel
+                logger.info("Loading spaCy model %s", SPACY_MODEL)
+                _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+    return _nlp
+
+
+def is_nlp_loaded() -> bool:
+    return _nlp is not None
+
+
+def warmup_nlp():
+    # the first call through the pipeline allocates its buffers, do it before real traffic
+    get_nlp()("warmup query for an easy pasta under 30 minutes")
+
+
 def parse_natural_query(text: str) -> dict:
     logger.info("Parsing natural query: '%s'", text)
+    # cached results are shared, hand out copies
+    parsed = copy.deepcopy(_parse_normalized(normalize_text(text)))
+    logger.info("Parsed natural query result: %s", parsed)
+    return parsed
 
-    doc = nlp(text.lower())
+
+@lru_cache(maxsize=settings.NL_PARSE_CACHE_SIZE)
+def _parse_normalized(text: str) -> dict:
+    doc = get_nlp()(text)
     filters = {}
     keywords = []
 
@@ -46,10 +84,18 @@ def parse_natural_query(text: str) -> dict:
         if token.is_alpha:
             keywords.append(token.lemma_)
 
-    parsed = {
+    return {
         "fts": " ".join(keywords),
         **filters
     }
 
-    logger.info("Parsed natural query result: %s", parsed)
-    return parsed
+
+def parse_cache_stats() -> dict:
+    info = _parse_normalized.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "entries": info.currsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_ratio": info.hits / lookups if lookups else 0.0,
+    }
@@ -1,19 +1,29 @@
+import copy
 import json
 
 from openai import AsyncOpenAI
 
 from app.core.config import settings
 from app.core.logger import logger
+from app.utils.caching import LRUCache, SingleFlight, normalize_text
+from app.utils.circuit_breaker import CircuitBreaker
 
 
 class OpenAIQueryParser:
-    def __init__(self, model: str = "gpt-5"):
-        if not settings.OPENAI_API_KEY:
+    def __init__(self, model: str = "gpt-5", client: AsyncOpenAI | None = None):
+        if client is None and settings.OPENAI_API_KEY:
+            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        if client is None:
             logger.warning("OpenAI API key is not set. Smart search will not work.")
-            self.client = None
-        else:
-            self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = client
         self.model = model
+        self.cache = LRUCache(maxsize=settings.OPENAI_PARSE_CACHE_SIZE, ttl=settings.OPENAI_PARSE_CACHE_TTL)
+        self.single_flight = SingleFlight()
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.SMART_SEARCH_BREAKER_FAILURES,
+            reset_timeout=settings.SMART_SEARCH_BREAKER_RESET_SECONDS,
+            slow_call_threshold=settings.SMART_SEARCH_SLOW_CALL_MS / 1000,
+        )
 
     @staticmethod
     def _build_prompt(query: str) -> str:
@@ -60,6 +70,23 @@ class OpenAIQueryParser:
             logger.error("OpenAI client not initialized: missing API key")
             raise RuntimeError("OpenAI API key not configured")
 
+        key = normalize_text(query)
+        parsed = self.cache.get(key)
+        if parsed is None:
+            parsed = await self.single_flight.do(key, lambda: self._request(key, query))
+        else:
+            logger.info("OpenAI parse cache hit for query: %s", query)
+        # cached results are shared, hand out copies
+        return copy.deepcopy(parsed)
+
+    def stats(self) -> dict:
+        return {
+            "cache": self.cache.stats(),
+            "single_flight": self.single_flight.stats(),
+            "breaker": self.breaker.stats(),
+        }
+
+    async def _request(self, key: str, query: str) -> dict:
         logger.info("Sending query to OpenAI: %s", query)
         response = await self.client.chat.completions.create(
             model=self.model,
@@ -73,6 +100,9 @@ class OpenAIQueryParser:
         raw = response.choices[0].message.content.strip()
         logger.info("OpenAI response: %s", raw)
         try:
-            return json.loads(raw)
+            parsed = json.loads(raw)
         except json.JSONDecodeError:
+            # not cached, the next call may get a usable answer
             return {"fts": query, "cooking_time": None, "difficulty": None}
+        self.cache.set(key, parsed)
+        return parsed
@@ -0,0 +1,18 @@
+import base64
+import json
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int | None = None) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    if not isinstance(values, list) or not values or (size is not None and len(values) != size):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
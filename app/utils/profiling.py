@@ -0,0 +1,158 @@
+import cProfile
+import functools
+import hmac
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable
+
+from app.core.config import settings
+
+PROFILE_ID = re.compile(r"^\d+-[0-9a-f]{12}$")
+# from 3.12 cProfile is built on sys.monitoring, which sees every thread but allows one profiler at a time
+PROFILER_SEES_THREADS = sys.version_info >= (3, 12)
+
+
+class RequestProfile:
+    # before 3.12 cProfile only sees the thread it was enabled in, work sent to_thread is profiled
+    # separately and merged in when the profile is saved
+    def __init__(self, profile_id: str):
+        self.id = profile_id
+        self.profiler = cProfile.Profile()
+        self._threads: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_thread(self, profiler: cProfile.Profile):
+        with self._lock:
+            self._threads.append(profiler)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.profiler)
+        with self._lock:
+            for profiler in self._threads:
+                stats.add(profiler)
+        return stats
+
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar("current_profile", default=None)
+
+
+def profile_thread(func: Callable) -> Callable:
+    # for functions run with asyncio.to_thread, which copies the request context into the worker
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None or PROFILER_SEES_THREADS:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            profile.add_thread(profiler)
+
+    return wrapper
+
+
+class Profiler:
+    # decides which requests get profiled and keeps the results on disk.
+    # overhead guard: a single profile at a time (cProfile slows every coroutine on the loop while enabled),
+    # sampled profiles at most one per min_interval, and only the newest max_files are kept
+    def __init__(
+            self,
+            directory: str | Path,
+            token: str | None = None,
+            sample_rate: float = 0.0,
+            min_interval: float = 60.0,
+            max_files: int = 100,
+            clock: Callable[[], float] = time.monotonic,
+            rand: Callable[[], float] = random.random,
+    ):
+        self.directory = Path(directory)
+        self.token = token
+        self.sample_rate = sample_rate
+        self.min_interval = min_interval
+        self.max_files = max_files
+        self.clock = clock
+        self.rand = rand
+        self.active: RequestProfile | None = None
+        self.profiled = 0
+        self.skipped = 0
+        self._last_sampled: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def authorized(self, token: str | None) -> bool:
+        return bool(self.token) and token is not None and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def begin(self, forced: bool = False) -> RequestProfile | None:
+        if not forced:
+            if self.rand() >= self.sample_rate:
+                return None
+            now = self.clock()
+            if self._last_sampled is not None and now - self._last_sampled < self.min_interval:
+                return None
+        if self.active is not None:
+            self.skipped += 1
+            return None
+        if not forced:
+            self._last_sampled = now
+        self.active = RequestProfile(f"{int(time.time())}-{uuid.uuid4().hex[:12]}")
+        return self.active
+
+    def end(self, profile: RequestProfile):
+        profile.profiler.disable()
+        if self.active is profile:
+            self.active = None
+        self.profiled += 1
+
+    def save(self, profile: RequestProfile) -> Path:
+        # blocking file I/O, callers run it in a thread
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{profile.id}.prof"
+        profile.stats().dump_stats(path)
+        older = [file for file in self._files() if file != path]
+        for old in older[max(self.max_files - 1, 0):]:
+            old.unlink(missing_ok=True)
+        return path
+
+    def path(self, profile_id: str) -> Path | None:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.prof"
+        return path if path.is_file() else None
+
+    def profiles(self) -> list[dict]:
+        return [{"id": path.stem, "bytes": path.stat().st_size} for path in self._files()]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "active": self.active is not None,
+            "profiled": self.profiled,
+            "skipped": self.skipped,
+        }
+
+    def _files(self) -> list[Path]:
+        # newest first
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob("*.prof"), key=lambda path: path.stat().st_mtime_ns, reverse=True)
+
+    @classmethod
+    def from_settings(cls) -> "Profiler":
+        return cls(
+            settings.PROFILING_DIR,
+            token=settings.PROFILING_TOKEN,
+            sample_rate=settings.PROFILING_SAMPLE_RATE,
+            min_interval=settings.PROFILING_MIN_INTERVAL_SECONDS,
+            max_files=settings.PROFILING_MAX_FILES,
+        )
@@ -0,0 +1,226 @@
+import time
+from typing import Awaitable, Callable, Protocol
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.caching import LRUCache, SingleFlight
+
+
+class CacheBackendError(Exception):
+    pass
+
+
+class CacheBackend(Protocol):
+    # shared store behind the in-process tier, e.g. Redis; failures surface as CacheBackendError
+    name: str
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]: ...
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None): ...
+
+    async def incr(self, key: str, ttl: float | None = None) -> int: ...
+
+    async def close(self): ...
+
+
+class MemoryBackend:
+    # shared backend for a single process and for tests, several RecipeCache instances can point at one
+    name = "memory"
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._data: dict[str, tuple[bytes, float | None]] = {}
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        return [self._get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        self._data[key] = (value, self.clock() + ttl if ttl else None)
+
+    async def incr(self, key: str, ttl: float | None = None) -> int:
+        value = int(self._get(key) or 0) + 1
+        await self.set(key, str(value).encode(), ttl)
+        return value
+
+    async def close(self):
+        self._data.clear()
+
+    def _get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= self.clock():
+            del self._data[key]
+            return None
+        return entry[0]
+
+
+class RedisBackend:
+    name = "redis"
+
+    def __init__(self, url: str):
+        # optional dependency, only needed when RECIPE_CACHE_REDIS_URL is set
+        from redis import asyncio as redis  # pylint: disable=import-outside-toplevel
+        from redis.exceptions import RedisError  # pylint: disable=import-outside-toplevel
+
+        self._client = redis.from_url(url)
+        self._errors = RedisError
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        try:
+            return await self._client.mget(keys)
+        except self._errors as exc:
+            raise CacheBackendError(str(exc)) from exc
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        try:
+            await self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+        except self._errors as exc:
+            raise CacheBackendError(str(exc)) from exc
+
+    async def incr(self, key: str, ttl: float | None = None) -> int:
+        try:
+            async with self._client.pipeline(transaction=True) as pipe:
+                pipe.incr(key)
+                if ttl:
+                    pipe.pexpire(key, int(ttl * 1000))
+                value, *_ = await pipe.execute()
+            return value
+        except self._errors as exc:
+            raise CacheBackendError(str(exc)) from exc
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class RecipeCache:
+    # read-through cache of serialized recipes. every entry is tagged with the generation of its id,
+    # writers bump the generation after commit, so a value loaded before (or while) a write is never served after it
+    def __init__(self, local: LRUCache, backend: CacheBackend | None = None, ttl: float | None = None, prefix: str = "recipe"):
+        self.local = local
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.single_flight = SingleFlight()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.backend_errors = 0
+        # without a backend, generations only matter while a load is in flight
+        self._generations: dict[int, int] = {}
+        self._loads_in_flight = 0
+
+    async def get_or_load(self, recipe_id: int, load: Callable[[], Awaitable[bytes | None]]) -> bytes | None:
+        generation = await self._generation(recipe_id)
+        if generation is not None:
+            cached = self.local.get(recipe_id)
+            # invalidate() drops local entries itself, only other processes can make them stale
+            if cached is not None and (self.backend is None or cached[0] == generation):
+                self.local_hits += 1
+                return cached[1]
+            if self.backend is not None:
+                payload = await self._get_shared(recipe_id, generation)
+                if payload is not None:
+                    self.shared_hits += 1
+                    self.local.set(recipe_id, (generation, payload))
+                    return payload
+
+        self.misses += 1
+        return await self.single_flight.do((recipe_id, generation), lambda: self._load(recipe_id, generation, load))
+
+    async def invalidate(self, recipe_id: int):
+        self.local.pop(recipe_id)
+        if self.backend is None:
+            self._generations[recipe_id] = self._generations.get(recipe_id, 0) + 1
+            return
+        try:
+            await self.backend.incr(self._key(recipe_id, "gen"), ttl=self._generation_ttl)
+        except CacheBackendError as exc:
+            # entries expire after RECIPE_CACHE_TTL, that is as stale as it can get
+            self.backend_errors += 1
+            logger.error("Invalidating cached recipe id=%s failed: %s", recipe_id, exc)
+
+    def stats(self) -> dict:
+        hits = self.local_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "entries": len(self.local),
+            "bytes": self.local.bytes,
+            "evictions": self.local.evictions,
+            "backend": self.backend.name if self.backend is not None else None,
+            "backend_errors": self.backend_errors,
+        }
+
+    async def close(self):
+        self.local.clear()
+        if self.backend is not None:
+            await self.backend.close()
+
+    @property
+    def _generation_ttl(self) -> float | None:
+        # outlive every value tagged with it
+        return self.ttl * 2 if self.ttl else None
+
+    async def _generation(self, recipe_id: int) -> int | None:
+        if self.backend is None:
+            return self._generations.get(recipe_id, 0)
+        try:
+            raw, = await self.backend.get_many([self._key(recipe_id, "gen")])
+        except CacheBackendError as exc:
+            self.backend_errors += 1
+            logger.warning("Recipe cache backend is unavailable: %s", exc)
+            return None
+        return int(raw or 0)
+
+    async def _get_shared(self, recipe_id: int, generation: int) -> bytes | None:
+        try:
+            stored, = await self.backend.get_many([self._key(recipe_id)])
+        except CacheBackendError as exc:
+            self.backend_errors += 1
+            logger.warning("Recipe cache backend is unavailable: %s", exc)
+            return None
+        if stored is None:
+            return None
+        tag, _, payload = stored.partition(b":")
+        return payload if int(tag) == generation else None
+
+    async def _load(self, recipe_id: int, generation: int | None, load: Callable[[], Awaitable[bytes | None]]) -> bytes | None:
+        self._loads_in_flight += 1
+        try:
+            payload = await load()
+            if payload is None or generation is None:
+                return payload
+            if self.backend is None:
+                if self._generations.get(recipe_id, 0) == generation:
+                    self.local.set(recipe_id, (generation, payload))
+                return payload
+            self.local.set(recipe_id, (generation, payload))
+            try:
+                await self.backend.set(self._key(recipe_id), b"%d:%s" % (generation, payload), ttl=self.ttl)
+            except CacheBackendError as exc:
+                self.backend_errors += 1
+                logger.warning("Recipe cache backend is unavailable: %s", exc)
+            return payload
+        finally:
+            self._loads_in_flight -= 1
+            if not self._loads_in_flight:
+                self._generations.clear()
+
+    def _key(self, recipe_id: int, kind: str = "json") -> str:
+        return f"{self.prefix}:{kind}:{recipe_id}"
+
+    @classmethod
+    def from_settings(cls) -> "RecipeCache":
+        local = LRUCache(
+            maxsize=settings.RECIPE_CACHE_SIZE,
+            max_bytes=settings.RECIPE_CACHE_MAX_BYTES,
+            ttl=settings.RECIPE_CACHE_TTL,
+            sizeof=lambda entry: len(entry[1]),
+        )
+        backend = RedisBackend(settings.RECIPE_CACHE_REDIS_URL) if settings.RECIPE_CACHE_REDIS_URL else None
+        return cls(local, backend=backend, ttl=settings.RECIPE_CACHE_TTL)
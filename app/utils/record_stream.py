@@ -0,0 +1,92 @@
+import csv
+import json
+from typing import AsyncIterator
+
+LIST_SEPARATOR = ";"
+CSV_LIST_FIELDS = {"ingredients", "tags"}
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str | None]]:
+    # only the current partial line is buffered, however large the input is; undecodable lines come out as None
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, _decode(line, first=line_no == 1)
+    if buffer:
+        yield line_no + 1, _decode(buffer, first=line_no == 0)
+
+
+def _decode(line: bytes, first: bool) -> str | None:
+    try:
+        return line.decode("utf-8-sig" if first else "utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def read_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | ValueError]]:
+    async for line_no, line in read_lines(chunks):
+        if line is None:
+            yield line_no, ValueError("invalid UTF-8")
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_no, ValueError(f"invalid JSON: {exc}")
+            continue
+        if not isinstance(record, dict):
+            yield line_no, ValueError("expected a JSON object")
+            continue
+        yield line_no, record
+
+
+async def read_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | ValueError]]:
+    # header row names the fields, ingredients and tags are ";"-separated
+    header = None
+    record, start = "", 0
+    async for line_no, line in read_lines(chunks):
+        if line is None:
+            yield line_no, ValueError("invalid UTF-8")
+            record, start = "", 0
+            continue
+        record = f"{record}\n{line}" if record else line
+        start = start or line_no
+        # an odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            continue
+        text, record, record_start, start = record, "", start, 0
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]), None)
+        except csv.Error as exc:
+            yield record_start, ValueError(f"invalid CSV: {exc}")
+            continue
+        if values is None:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, ValueError(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        yield record_start, _csv_record(dict(zip(header, values)))
+    if record:
+        yield start, ValueError("unterminated quoted field")
+
+
+def _csv_record(row: dict) -> dict:
+    record = {}
+    for name, value in row.items():
+        if name in CSV_LIST_FIELDS:
+            record[name] = [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+        elif value == "":
+            record[name] = None
+        else:
+            record[name] = value
+    return record
@@ -1,18 +1,26 @@
+from app.core.metrics import DB_POOL_CHECKOUT, observe_stage
 from app.db.database import async_session_maker
 
+from app.repositories.embedding_jobs import EmbeddingJobRepository
 from app.repositories.recipies import RecipeRepository
+from app.utils.vector_index import VectorIndex
 
 
 class UnitOfWork:
-    def __init__(self, session_factory=None):
+    def __init__(self, session_factory=None, vector_index: VectorIndex | None = None):
         if session_factory is None:
             self.session_factory = async_session_maker
         else:
             self.session_factory = session_factory
+        self.vector_index = vector_index
 
     async def __aenter__(self):
         self.session = self.session_factory()
-        self.recipies = RecipeRepository(self.session)
+        self.recipies = RecipeRepository(self.session, vector_index=self.vector_index)
+        self.embedding_jobs = EmbeddingJobRepository(self.session)
+        # check the connection out up front so the pool wait is measured on its own
+        with DB_POOL_CHECKOUT.time():
+            await self.session.connection()
         return self
 
     async def __aexit__(self, *args):
@@ -20,7 +28,8 @@ class UnitOfWork:
         await self.session.close()
 
     async def commit(self):
-        await self.session.commit()
+        with observe_stage("db"):
+            await self.session.commit()
 
     async def rollback(self):
         await self.session.rollback()
@@ -0,0 +1,178 @@
+import threading
+from typing import Iterable, NamedTuple, Sequence
+
+import numpy as np
+
+SCORE_BLOCK_ROWS = 16384
+
+
+class Snapshot(NamedTuple):
+    ids: np.ndarray
+    matrix: np.ndarray
+    positions: dict[int, int]
+    size: int
+    dimensions: int | None
+
+
+class VectorIndex:
+    # exact cosine top-k over an in-memory matrix of unit vectors, one row per recipe id.
+    # rows are normalized on the way in so a single matrix-vector product gives every cosine similarity
+    def __init__(self, dtype: str = "float32", initial_capacity: int = 1024):
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = initial_capacity
+        self.loaded = False
+        self._lock = threading.Lock()
+        # searches in flight on the current arrays; while there are any, a write to an existing row
+        # copies the arrays first (copy-on-write) so those searches keep a consistent view
+        self._readers = 0
+        self._generation = 0
+        self._reset(0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, recipe_id: int) -> bool:
+        return recipe_id in self._positions
+
+    def upsert(self, recipe_id: int, embedding: Sequence[float]):
+        self.upsert_many([recipe_id], [embedding])
+
+    def upsert_many(self, ids: Iterable[int], embeddings: Iterable[Sequence[float]]):
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(list(embeddings), dtype=np.float32))
+        with self._lock:
+            if self._dimensions is None:
+                self._dimensions = vectors.shape[1]
+                self._matrix = np.empty((self.initial_capacity, self._dimensions), dtype=self.dtype)
+            elif vectors.shape[1] != self._dimensions:
+                raise ValueError(f"Expected {self._dimensions} dimensions, got {vectors.shape[1]}")
+
+            if any(recipe_id in self._positions for recipe_id in ids):
+                self._copy_on_write()
+            for recipe_id, vector in zip(ids, vectors):
+                position = self._positions.get(recipe_id)
+                if position is None:
+                    position = self._size
+                    self._grow(position + 1)
+                    self._ids[position] = recipe_id
+                    self._positions[recipe_id] = position
+                    self._size += 1
+                self._matrix[position] = vector
+
+    def remove(self, recipe_id: int) -> bool:
+        with self._lock:
+            position = self._positions.pop(recipe_id, None)
+            if position is None:
+                return False
+            self._copy_on_write()
+            # move the last row into the hole so the live rows stay contiguous
+            last = self._size - 1
+            if position != last:
+                moved_id = int(self._ids[last])
+                self._ids[position] = moved_id
+                self._matrix[position] = self._matrix[last]
+                self._positions[moved_id] = position
+            self._size -= 1
+            return True
+
+    def snapshot(self) -> Snapshot:
+        # the arrays are handed over, not copied: meant for an index that is not written afterwards
+        with self._lock:
+            return Snapshot(self._ids, self._matrix, dict(self._positions), self._size, self._dimensions)
+
+    def replace(self, other: "VectorIndex"):
+        # swap in a freshly loaded index in one step, searches see either the old or the new contents
+        self.install(other.snapshot())
+
+    def install(self, snapshot: Snapshot):
+        with self._lock:
+            self._ids, self._matrix, self._positions, self._size, self._dimensions = snapshot
+            # searches still running hold the previous arrays, nothing writes to these yet
+            self._readers = 0
+            self._generation += 1
+        self.loaded = True
+
+    def search(self, embedding: Sequence[float], limit: int = 5, threshold: float | None = None) -> list[tuple[int, float]]:
+        # (id, cosine distance) pairs, nearest first, same semantics as pgvector's <=>
+        query = self._normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        # score outside the lock so searches run in parallel, on arrays that writers leave alone until it is done
+        with self._lock:
+            size, matrix, ids, generation = self._size, self._matrix, self._ids, self._generation
+            self._readers += 1
+        try:
+            if not size:
+                return []
+            if query.shape[0] != matrix.shape[1]:
+                raise ValueError(f"Expected {matrix.shape[1]} dimensions, got {query.shape[0]}")
+            scores = self._scores(matrix[:size], query)
+            ids = ids[:size].copy()
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    self._readers -= 1
+
+        k = min(limit, size)
+        # argpartition finds the k best in O(n), only those k get sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        distances = 1.0 - scores[top].astype(np.float64)
+        hits = [(int(ids[i]), float(d)) for i, d in zip(top, distances)]
+
+        if threshold is not None:
+            hits = [hit for hit in hits if hit[1] < threshold]
+        return hits
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "vectors": self._size,
+            "dimensions": self._dimensions,
+            "dtype": self.dtype.name,
+            "bytes": self._size * (self._dimensions or 0) * self.dtype.itemsize,
+        }
+
+    def _scores(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return matrix @ query
+        # numpy has no BLAS kernel for float16, widen it a block at a time instead of copying the whole matrix
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+            scores[start:start + SCORE_BLOCK_ROWS] = matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ query
+        return scores
+
+    def _copy_on_write(self):
+        # called with the lock held, before a row that searches may be reading is overwritten or moved.
+        # appends need no copy, searches only look at the rows that existed when they started
+        if self._readers:
+            self._ids, self._matrix = self._ids.copy(), self._matrix.copy()
+            self._readers = 0
+            self._generation += 1
+
+    def _reset(self, capacity: int):
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._matrix = np.empty((capacity, 0), dtype=self.dtype)
+        self._positions: dict[int, int] = {}
+        self._size = 0
+        self._dimensions: int | None = None
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity and needed <= len(self._matrix):
+            return
+        capacity = max(needed, capacity * 2, self.initial_capacity)
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        matrix = np.empty((capacity, self._dimensions), dtype=self.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._ids, self._matrix = ids, matrix
+        # running searches keep the old arrays
+        self._readers = 0
+        self._generation += 1
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
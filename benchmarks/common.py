@@ -0,0 +1,30 @@
+import json
+import statistics
+import sys
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def write_results(results: dict, path: str | None = None):
+    payload = json.dumps(results, indent=2, default=str)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        sys.stdout.write(payload + "\n")
@@ -0,0 +1,60 @@
+"""Compare two benchmarks.endpoints result files, e.g. before and after a commit.
+
+Prints p50/p95/p99 and throughput per scenario and concurrency level with the relative change,
+and exits with 1 when a p95 got slower than --fail-above percent, so it can gate CI.
+
+    python -m benchmarks.compare before.json after.json --fail-above 20
+"""
+import argparse
+import json
+import sys
+
+METRICS = [("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("rps", True)]
+
+
+def change(before: float, after: float) -> float | None:
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before: dict, after: dict, fail_above: float | None) -> list[str]:
+    regressions = []
+    header = f"{'scenario':<24}{'c':>4}" + "".join(f"{name:>26}" for name, _ in METRICS)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    print(header)
+    for scenario, levels in after["results"].items():
+        for concurrency, new in levels.items():
+            old = before["results"].get(scenario, {}).get(concurrency)
+            if old is None:
+                continue
+            cells = []
+            for name, higher_is_better in METRICS:
+                delta = change(old[name], new[name])
+                mark = ""
+                if delta is not None and (delta < 0 if higher_is_better else delta > 0) and abs(delta) >= 5:
+                    mark = " !"
+                text = f"{old[name]:.1f} -> {new[name]:.1f} ({delta:+.0f}%){mark}" if delta is not None else f"{new[name]:.1f}"
+                cells.append(f"{text:>26}")
+            print(f"{scenario:<24}{concurrency:>4}" + "".join(cells))
+
+            p95 = change(old["p95_ms"], new["p95_ms"])
+            if fail_above is not None and p95 is not None and p95 > fail_above:
+                regressions.append(f"{scenario} c={concurrency}: p95 {p95:+.0f}%")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--fail-above", type=float, default=None, help="p95 regression in percent that fails the run")
+    args = parser.parse_args()
+    with open(args.before, encoding="utf-8") as f:
+        before_results = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after_results = json.load(f)
+    failed = compare(before_results, after_results, args.fail_above)
+    for line in failed:
+        print(f"regression: {line}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
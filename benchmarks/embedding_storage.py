@@ -0,0 +1,109 @@
+"""Recall vs size of compact embedding storage: halfvec and fewer dimensions.
+
+Takes stored recipe embeddings from the configured database as the reference, re-encodes
+them the way `python -m app.cli.embeddings reencode` would (first n dimensions renormalized,
+optionally rounded to float16) and measures exact top-k recall against the full vectors,
+together with the bytes per row pgvector needs and an estimate of the HNSW index size.
+
+    python -m benchmarks.embedding_storage --vectors 20000 --queries 200 --dimensions 1536 1024 512 256
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db.models import Recipe
+from app.db.vector_storage import ANN_INDEX, embedding_values
+from benchmarks.common import summarize, write_results
+
+# pgvector stores a 4-byte varlena header and 4 bytes of dimension/unused before the values
+VECTOR_HEADER_BYTES = 8
+# an HNSW layer-0 element keeps 2 * m neighbour tids of 6 bytes next to its own copy of the vector
+TID_BYTES = 6
+
+
+def encode(vectors: np.ndarray, dimensions: int, dtype: str) -> np.ndarray:
+    shortened = vectors[:, :dimensions]
+    shortened = shortened / np.maximum(np.linalg.norm(shortened, axis=1, keepdims=True), 1e-12)
+    return shortened.astype(dtype)
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> tuple[np.ndarray, list[float]]:
+    found, samples = [], []
+    for query in queries:
+        started = time.perf_counter()
+        scores = corpus @ query
+        nearest = np.argpartition(-scores, k)[:k]
+        found.append(nearest[np.argsort(-scores[nearest])])
+        samples.append(time.perf_counter() - started)
+    return np.array(found), samples
+
+
+async def main(vectors: int, queries: int, k: int, dimensions: list[int], out: str | None):
+    engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        rows = await session.execute(
+            select(Recipe.embedding)
+            .where(Recipe.embedding.is_not(None))
+            .order_by(func.random())
+            .limit(vectors + queries)
+        )
+        sample = np.array([embedding_values(embedding) for embedding in rows.scalars()], dtype=np.float32)
+        total = (await session.execute(select(func.count()).where(Recipe.embedding.is_not(None)))).scalar_one()
+        current = (await session.execute(text(
+            "SELECT avg(pg_column_size(embedding)), pg_relation_size(to_regclass(:index))"
+            " FROM recipes WHERE embedding IS NOT NULL"
+        ), {"index": ANN_INDEX})).one()
+    await engine.dispose()
+    if len(sample) <= queries:
+        raise SystemExit("not enough stored embeddings, import or seed recipes first")
+
+    query_vectors, corpus = sample[:queries], sample[queries:]
+    full = encode(corpus, corpus.shape[1], "float32")
+    truth, _ = top_k(encode(query_vectors, corpus.shape[1], "float32"), full, k)
+
+    configs = []
+    for size in sorted({min(size, corpus.shape[1]) for size in dimensions}, reverse=True):
+        for storage, dtype, value_bytes in (("vector", "float32", 4), ("halfvec", "float16", 2)):
+            # float16 is only the storage format, scores are computed in float32 like pgvector does
+            encoded = encode(corpus, size, dtype).astype(np.float32)
+            found, samples = top_k(encode(query_vectors, size, "float32"), encoded, k)
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+            row_bytes = VECTOR_HEADER_BYTES + value_bytes * size
+            configs.append({
+                "type": f"{storage}({size})",
+                "bytes_per_row": row_bytes,
+                "table_mb": round(total * row_bytes / 1e6, 1),
+                "hnsw_mb_estimate": round(total * (row_bytes + 2 * settings.HNSW_M * TID_BYTES) / 1e6, 1),
+                f"recall_at_{k}": round(float(recall), 4),
+                "exact_search": summarize(samples),
+            })
+
+    results = {
+        "stored_vectors": total,
+        "sampled": len(corpus),
+        "queries": len(query_vectors),
+        "current": {
+            "type": f"{settings.EMBEDDING_STORAGE}({corpus.shape[1]})",
+            "avg_bytes_per_row": round(float(current[0] or 0), 1),
+            "ann_index_mb": round((current[1] or 0) / 1e6, 1),
+        },
+        "configs": configs,
+    }
+    write_results(results, out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[1536, 1024, 768, 512, 256])
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.vectors, args.queries, args.k, args.dimensions, args.out))
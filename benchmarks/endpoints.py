@@ -0,0 +1,349 @@
+"""Throughput and p50/p95/p99 latency of every recipe endpoint at several concurrency levels.
+
+Seeds a dedicated database (created and migrated on first use, reused while the recipe count matches)
+with synthetic recipes and deterministic fake embeddings, then drives the real app in process through
+httpx's ASGI transport. OpenAI is replaced by a local stand-in behind the real AsyncOpenAI client, so the
+parser, embedder, batcher and caches run as in production and only the network round trip is simulated.
+
+    python -m benchmarks.endpoints --recipes 100000 --concurrency 1 8 32 --out before.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+from openai import AsyncOpenAI
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from alembic import command
+from alembic.config import Config
+from app.api.endpoints.recipes import get_service
+from app.core.config import settings
+from app.db.models import Recipe
+from app.services.recipe_service import RecipeService
+from app.utils.caching import LRUCache
+from app.utils.embedding_backends import HashingEmbeddingBackend
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.embeddings import EmbeddingGenerator, content_hash, recipe_embedding_text, vector_literal
+from app.utils.openai_parser import OpenAIQueryParser
+from app.utils.recipe_cache import RecipeCache
+from app.utils.unitofwork import UnitOfWork
+from benchmarks.common import summarize, write_results
+from main import app
+
+INGREDIENTS = [
+    "egg", "flour", "milk", "butter", "sugar", "salt", "pepper", "garlic", "onion", "tomato", "potato", "carrot",
+    "cheese", "bacon", "chicken", "beef", "pork", "salmon", "shrimp", "tofu", "rice", "pasta", "spaghetti", "noodles",
+    "basil", "parsley", "cilantro", "ginger", "chili", "lemon", "lime", "avocado", "spinach", "lettuce", "cucumber",
+    "mushroom", "zucchini", "eggplant", "beans", "lentils", "chickpeas", "yogurt", "cream", "honey", "olive oil",
+    "soy sauce", "coconut milk", "curry paste", "paprika", "cumin", "oregano", "thyme", "apple", "banana", "oats",
+]
+CUISINES = ["Italian", "French", "Mexican", "Indian", "Thai", "Japanese", "Chinese", "Greek", "Spanish", "American"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+TAGS = ["quick", "vegetarian", "vegan", "breakfast", "lunch", "dinner", "healthy", "classic", "spicy", "kids"]
+DISHES = ["soup", "salad", "stew", "curry", "bake", "pie", "stir fry", "pancakes", "risotto", "tacos", "bowl", "roast"]
+
+SCENARIOS = [
+    "create_recipe", "get_recipe", "update_recipe", "list_recipes", "filter_by_ingredients",
+    "search", "smart_search", "vector_search", "hybrid_search", "delete_recipe",
+]
+
+
+def fake_vector(key: str, dimensions: int) -> list[float]:
+    # same text, same unit vector, on every machine
+    seed = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def synthetic_recipe(rng: random.Random, number: int) -> dict:
+    ingredients = rng.sample(INGREDIENTS, rng.randint(3, 8))
+    return {
+        "title": f"{rng.choice(CUISINES)} {ingredients[0]} {rng.choice(DISHES)} #{number}",
+        "ingredients": ingredients,
+        "instructions": " ".join(
+            f"{rng.choice(['Chop', 'Fry', 'Boil', 'Mix', 'Bake', 'Simmer'])} the {item}." for item in ingredients
+        ),
+        "cooking_time": rng.randint(5, 180),
+        "difficulty": rng.choice(DIFFICULTIES),
+        "cuisine": rng.choice(CUISINES),
+        "tags": rng.sample(TAGS, rng.randint(0, 3)),
+    }
+
+
+def natural_query(rng: random.Random) -> str:
+    parts = [rng.choice(DIFFICULTIES), rng.choice(CUISINES).lower(), rng.choice(INGREDIENTS)]
+    if rng.random() < 0.5:
+        parts.append(f"without {rng.choice(INGREDIENTS)}")
+    if rng.random() < 0.5:
+        parts.append(f"under {rng.choice([15, 30, 45, 60])} minutes")
+    return " ".join(parts)
+
+
+class FakeOpenAI:
+    # answers embeddings and chat completions locally, after the configured latency
+    def __init__(self, dimensions: int, latency: float):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key="benchmark",
+            base_url="http://fake-openai/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle)),
+        )
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        payload = json.loads(request.content)
+        if request.url.path.endswith("/embeddings"):
+            inputs = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+            return httpx.Response(200, json={
+                "object": "list",
+                "model": payload["model"],
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_vector(item, self.dimensions)}
+                    for i, item in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+            })
+
+        query = re.search(r'User query: "(.*)"', payload["messages"][-1]["content"]).group(1)
+        minutes = re.search(r"under (\d+) minutes", query)
+        difficulty = next((level for level in DIFFICULTIES if level in query.split()), None)
+        parsed = {
+            "fts": re.sub(r"under \d+ minutes|without \S+", "", query).strip(),
+            "cooking_time": {"lte": int(minutes.group(1))} if minutes else None,
+            "difficulty": difficulty,
+        }
+        return httpx.Response(200, json={
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": json.dumps(parsed)}}],
+        })
+
+
+def database_urls(name: str) -> tuple[str, str, str]:
+    credentials = f"{settings.DB_USER}:{settings.DB_PASS}@{settings.DB_HOST}:{settings.DB_PORT}"
+    return (
+        f"postgresql+asyncpg://{credentials}/{name}",
+        f"postgresql+psycopg2://{credentials}/{name}",
+        f"postgresql://{credentials}/postgres",
+    )
+
+
+def prepare_database(name: str):
+    _, sync_url, admin_url = database_urls(name)
+    admin_engine = create_engine(admin_url, isolation_level="AUTOCOMMIT")
+    with admin_engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": name}).scalar()
+        if not exists:
+            conn.execute(text(f'CREATE DATABASE "{name}"'))
+    admin_engine.dispose()
+
+    alembic_cfg = Config("alembic.ini")
+    alembic_cfg.set_main_option("sqlalchemy.url", sync_url)
+    command.upgrade(alembic_cfg, "head")
+
+
+def drop_database(name: str):
+    *_, admin_url = database_urls(name)
+    admin_engine = create_engine(admin_url, isolation_level="AUTOCOMMIT")
+    with admin_engine.begin() as conn:
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+    admin_engine.dispose()
+
+
+async def seed(session_maker, recipes: int, seed_value: int, embedder: EmbeddingGenerator, batch_size: int) -> float:
+    async with session_maker() as session:
+        count = (await session.execute(select(func.count(Recipe.id)))).scalar_one()
+    if count == recipes:
+        return 0.0
+
+    started = time.perf_counter()
+    async with session_maker() as session:
+        await session.execute(text("TRUNCATE recipes RESTART IDENTITY"))
+        await session.commit()
+
+    rng = random.Random(seed_value)
+    uow = UnitOfWork(session_maker)
+    for start in range(0, recipes, batch_size):
+        batch = [synthetic_recipe(rng, number) for number in range(start, min(start + batch_size, recipes))]
+        contents = [recipe_embedding_text(r["title"], r["ingredients"], r["instructions"]) for r in batch]
+        # straight to the backend, the cache would only fill up with vectors nobody asks for again
+        embeddings = await embedder.backend.embed(contents)
+        records = [
+            (start + i, r["title"], r["ingredients"], r["instructions"], r["cooking_time"], r["difficulty"], r["cuisine"],
+             r["tags"], vector_literal(embedding), content_hash(embedder.model, content))
+            for i, (r, content, embedding) in enumerate(zip(batch, contents, embeddings))
+        ]
+        async with uow:
+            await uow.recipies.bulk_insert(records)
+            await uow.commit()
+        print(f"seeded {min(start + batch_size, recipes)}/{recipes}", file=sys.stderr)
+
+    async with session_maker() as session:
+        await session.execute(text("ANALYZE recipes"))
+        await session.commit()
+    return time.perf_counter() - started
+
+
+class Workload:
+    # builds the requests of each scenario; create feeds the ids that update and delete work on
+    def __init__(self, ids: list[int], seed_value: int):
+        self.ids = ids
+        self.rng = random.Random(seed_value)
+        self.created: list[int] = []
+        self.counter = 0
+
+    def request(self, scenario: str) -> tuple[str, str, dict]:
+        rng = self.rng
+        if scenario == "create_recipe":
+            self.counter += 1
+            recipe = synthetic_recipe(rng, self.counter)
+            recipe["title"] = f"benchmark {time.time_ns()} {self.counter}"
+            return "POST", "/recipes/", {"json": recipe}
+        if scenario == "get_recipe":
+            return "GET", f"/recipes/{rng.choice(self.ids)}", {}
+        if scenario == "update_recipe":
+            return "PATCH", f"/recipes/{rng.choice(self.created or self.ids)}", {"json": {"cooking_time": rng.randint(5, 180)}}
+        if scenario == "delete_recipe":
+            if self.created:
+                return "DELETE", f"/recipes/{self.created.pop()}", {}
+            return "DELETE", "/recipes/0", {}
+        if scenario == "list_recipes":
+            return "GET", "/recipes/", {"params": {"limit": 20, "order_by": rng.choice(["id", "title", "cooking_time"])}}
+        if scenario == "filter_by_ingredients":
+            include, exclude = rng.sample(INGREDIENTS, 2)
+            return "GET", "/recipes/filter/", {"params": {"include": [include], "exclude": [exclude], "limit": 20}}
+        if scenario in ("search", "smart_search", "vector_search", "hybrid_search"):
+            return "GET", f"/recipes/{scenario}/", {"params": {"q": natural_query(rng), "limit": 10}}
+        raise ValueError(scenario)
+
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, scenario: str, requests: int, concurrency: int) -> dict:
+    queue = [workload.request(scenario) for _ in range(requests)]
+    samples, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            method, url, kwargs = queue.pop()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+            elif scenario == "create_recipe":
+                workload.created.append(response.json()["id"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(samples), "rps": round(len(samples) / elapsed, 1), "errors": errors}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    logging.getLogger("smart_recipe_finder").setLevel(logging.WARNING)
+    prepare_database(args.database)
+    async_url, *_ = database_urls(args.database)
+    engine = create_async_engine(async_url, pool_size=max(args.concurrency), max_overflow=0)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    dimensions = Recipe.embedding.type.dim
+
+    # the search endpoints refuse to run without a key, the stand-in never sends it anywhere
+    settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or "benchmark"
+    openai = FakeOpenAI(dimensions, args.openai_latency_ms / 1000).client()
+    cache = EmbeddingCache(LRUCache(max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES, sizeof=len))
+    if args.local_embeddings:
+        embedder = EmbeddingGenerator(cache=cache, backend=HashingEmbeddingBackend(dimensions))
+    else:
+        embedder = EmbeddingGenerator(cache=cache, client=openai)
+    parser = OpenAIQueryParser(client=openai)
+
+    seed_seconds = await seed(session_maker, args.recipes, args.seed, embedder, args.batch_size)
+    async with session_maker() as session:
+        ids = list((await session.execute(select(Recipe.id))).scalars())
+
+    recipe_cache = RecipeCache.from_settings() if args.recipe_cache else None
+    app.dependency_overrides[get_service] = lambda: RecipeService(
+        UnitOfWork(session_maker), parser=parser, embedder=embedder, recipe_cache=recipe_cache,
+    )
+
+    workload = Workload(ids, args.seed)
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        for scenario in args.scenarios:
+            results[scenario] = {}
+            for concurrency in args.concurrency:
+                if args.warmup:
+                    await run_level(client, workload, scenario, args.warmup, concurrency)
+                results[scenario][str(concurrency)] = await run_level(client, workload, scenario, args.requests, concurrency)
+                print(f"{scenario} c={concurrency}: {results[scenario][str(concurrency)]}", file=sys.stderr)
+
+    app.dependency_overrides.clear()
+    await embedder.aclose()
+    await engine.dispose()
+    if args.drop:
+        drop_database(args.database)
+
+    write_results({
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "recipes": args.recipes,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 1),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "openai_latency_ms": args.openai_latency_ms,
+            "embeddings": embedder.model,
+            "recipe_cache": args.recipe_cache,
+            "vector_engine": settings.VECTOR_ENGINE,
+        },
+        "results": results,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=1000, help="synthetic recipes to seed, e.g. 1000, 100000, 1000000")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", default=f"{settings.DB_NAME}_bench", help="created if missing, reseeded when the count differs")
+    parser.add_argument("--drop", action="store_true", help="drop the benchmark database afterwards")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per COPY while seeding")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each level")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--openai-latency-ms", type=float, default=0.0, help="simulated OpenAI round trip")
+    parser.add_argument("--recipe-cache", action="store_true", help="serve get_recipe through the recipe cache")
+    parser.add_argument("--local-embeddings", action="store_true",
+                        help="embed with the local hashing backend (reseed with --drop when switching)")
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
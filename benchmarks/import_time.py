@@ -0,0 +1,51 @@
+"""Cold-start cost of importing main:app, measured in fresh interpreters.
+
+    python -m benchmarks.import_time --repeat 10 --out import_time.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks.common import summarize, write_results
+
+PROBE = (
+    "import sys, time; started = time.perf_counter(); import main; "
+    "print(__import__('json').dumps({'seconds': time.perf_counter() - started, 'spacy_imported': 'spacy' in sys.modules}))"
+)
+
+
+def measure_once() -> dict:
+    output = subprocess.run([sys.executable, "-c", PROBE], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_modules(limit: int) -> list[dict]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], check=True, capture_output=True, text=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+    return sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)[:limit]
+
+
+def main(repeat: int, out: str | None):
+    runs = [measure_once() for _ in range(repeat)]
+    results = {
+        "import_main": summarize([run["seconds"] for run in runs]),
+        "spacy_imported": any(run["spacy_imported"] for run in runs),
+        "slowest_modules": slowest_modules(15),
+    }
+    write_results(results, out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    main(args.repeat, args.out)
@@ -0,0 +1,60 @@
+"""Per-query latency of parse_natural_query: full spaCy pipeline vs trimmed pipeline vs parse cache.
+
+    python -m benchmarks.nl_parse --repeat 20 --out nl_parse.json
+"""
+import argparse
+import logging
+import time
+
+import spacy
+
+from app.utils import nl_query_parser
+from benchmarks.common import summarize, write_results
+
+QUERIES = [
+    "Quick Italian recipes under 30 minutes",
+    "Vegetarian recipes using potatoes and cheese",
+    "What can I cook with eggs and flour?",
+    "Healthy lunches with avocado",
+    "Recipes for beginner cooks",
+    "Hard french dessert that takes more than 90 minutes",
+    "easy chicken curry",
+    "spicy noodle soup for dinner",
+]
+
+
+def run(repeat: int, clear_cache: bool) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            if clear_cache:
+                nl_query_parser._parse_normalized.cache_clear()  # pylint: disable=protected-access
+            started = time.perf_counter()
+            nl_query_parser.parse_natural_query(query)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main(repeat: int, out: str | None):
+    logging.getLogger("smart_recipe_finder").setLevel(logging.WARNING)
+    trimmed = nl_query_parser.get_nlp()
+    results = {"pipelines": {"full": None, "trimmed": trimmed.pipe_names}}
+
+    nl_query_parser._nlp = spacy.load(nl_query_parser.SPACY_MODEL)  # pylint: disable=protected-access
+    results["pipelines"]["full"] = nl_query_parser.get_nlp().pipe_names
+    results["full_pipeline"] = summarize(run(repeat, clear_cache=True))
+
+    nl_query_parser._nlp = trimmed  # pylint: disable=protected-access
+    results["trimmed_pipeline"] = summarize(run(repeat, clear_cache=True))
+
+    nl_query_parser._parse_normalized.cache_clear()  # pylint: disable=protected-access
+    results["trimmed_pipeline_cached"] = summarize(run(repeat, clear_cache=False))
+    write_results(results, out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    main(args.repeat, args.out)
@@ -0,0 +1,93 @@
+"""Bytes and decode time saved by keeping search_vector/embedding out of read queries.
+
+Runs every RecipeRepository read path twice against the configured database:
+once with the default projection and once with the heavy columns undeferred.
+
+    python -m benchmarks.projection --repeat 50 --out projection.json
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import undefer
+
+from app.core.config import settings
+from app.db.models import Recipe
+from app.repositories.recipies import RecipeRepository
+from benchmarks.common import summarize, write_results
+
+
+class FullRecipeRepository(RecipeRepository):
+    projection = RecipeRepository.projection + (Recipe.search_vector, Recipe.embedding)
+
+
+async def heavy_bytes(session, ids: list[int]) -> int:
+    if not ids:
+        return 0
+    result = await session.execute(
+        select(
+            func.coalesce(func.sum(func.pg_column_size(Recipe.embedding)), 0)
+            + func.coalesce(func.sum(func.pg_column_size(Recipe.search_vector)), 0)
+        ).where(Recipe.id.in_(ids))
+    )
+    return int(result.scalar_one())
+
+
+async def measure(session_maker, call, repeat: int) -> dict:
+    report = {}
+    for name, repo_cls in (("projected", RecipeRepository), ("full", FullRecipeRepository)):
+        samples = []
+        rows = []
+        for _ in range(repeat):
+            async with session_maker() as session:
+                repo = repo_cls(session)
+                started = time.perf_counter()
+                rows = await call(repo)
+                samples.append(time.perf_counter() - started)
+        report[name] = summarize(samples)
+        report[name]["rows"] = len(rows)
+
+    async with session_maker() as session:
+        report["heavy_bytes_saved_per_call"] = await heavy_bytes(session, [r.id for r in rows])
+    report["decode_ms_saved_per_call"] = round(report["full"]["mean_ms"] - report["projected"]["mean_ms"], 3)
+    return report
+
+
+async def main(repeat: int, out: str | None):
+    engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with session_maker() as session:
+        sample = (await session.execute(
+            select(Recipe).options(undefer(Recipe.embedding)).where(Recipe.embedding.is_not(None)).limit(1)
+        )).scalar_one_or_none()
+        first_id = (await session.execute(select(func.min(Recipe.id)))).scalar_one()
+
+    calls = {
+        "get_recipe": lambda repo: _as_list(repo.get(first_id)),
+        "list_recipes": lambda repo: repo.get_list(limit=20),
+        "filter_by_ingredients": lambda repo: repo.filter_by_ingredients(include=["egg"]),
+        "search": lambda repo: repo.fulltext_search({"fts": "pasta"}),
+    }
+    if sample is not None:
+        embedding = list(sample.embedding)
+        calls["vector_search"] = lambda repo: repo.vector_search(embedding, limit=5, threshold=2.0)
+
+    results = {name: await measure(session_maker, call, repeat) for name, call in calls.items()}
+    write_results(results, out)
+    await engine.dispose()
+
+
+async def _as_list(coro):
+    row = await coro
+    return [row] if row is not None else []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat, args.out))
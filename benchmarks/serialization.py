@@ -0,0 +1,81 @@
+"""Per-row cost of turning loaded Recipe rows into a JSON response body.
+
+Compares the old path (RecipeOut.model_validate per row, then FastAPI validating the list
+against response_model again before dumping it) with the single pass the recipe endpoints
+use now (one TypeAdapter validation of the list, then dump_json straight to bytes).
+Rows are detached ORM objects built from the endpoint benchmark's synthetic recipes, no
+database is needed.
+
+    python -m benchmarks.serialization --rows 20 200 2000 --repeat 200
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.api.schemas.enums import Difficulty
+from app.api.schemas.recipe import RecipeOut, RecipeOutList
+from app.db.models import Recipe
+from benchmarks.common import summarize, write_results
+from benchmarks.endpoints import synthetic_recipe
+
+RESPONSE_FIELD = create_model_field(name="Response", type_=list[RecipeOut], mode="serialization")
+
+
+def recipes(count: int, seed: int) -> list[Recipe]:
+    rng = random.Random(seed)
+    rows = []
+    for number in range(count):
+        data = synthetic_recipe(rng, number)
+        data["difficulty"] = Difficulty(data["difficulty"])
+        rows.append(Recipe(id=number + 1, version=1, **data))
+    return rows
+
+
+async def double_validation(rows: list[Recipe]) -> bytes:
+    items = [RecipeOut.model_validate(row, from_attributes=True) for row in rows]
+    return await serialize_response(field=RESPONSE_FIELD, response_content=items, dump_json=True)
+
+
+async def single_pass(rows: list[Recipe]) -> bytes:
+    return RecipeOutList.dump_json(RecipeOutList.validate_python(rows, from_attributes=True))
+
+
+async def measure(call, rows: list[Recipe], repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call(rows)
+        samples.append(time.perf_counter() - started)
+    report = summarize(samples)
+    report["per_row_us"] = round(report["p50_ms"] * 1000 / len(rows), 3)
+    return report
+
+
+async def main(sizes: list[int], repeat: int, seed: int, out: str | None):
+    results = {}
+    for size in sizes:
+        rows = recipes(size, seed)
+        # the two paths must produce the same body
+        assert await double_validation(rows) == await single_pass(rows)
+        before = await measure(double_validation, rows, repeat)
+        after = await measure(single_pass, rows, repeat)
+        results[str(size)] = {
+            "double_validation": before,
+            "single_pass": after,
+            "speedup": round(before["p50_ms"] / after["p50_ms"], 2) if after["p50_ms"] else None,
+        }
+    write_results(results, out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat, args.seed, args.out))
@@ -0,0 +1,72 @@
+"""Latency and overlap of pgvector vs the in-memory NumPy engine for vector_search.
+
+Loads the in-memory index from the configured database, then runs the same query
+embeddings (taken from stored recipes) through both RecipeRepository paths.
+
+    python -m benchmarks.vector_engine --queries 200 --limit 10 --dtype float16
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.db.models import Recipe
+from app.db.vector_storage import embedding_values
+from app.services.vector_engine import load_vector_index
+from app.utils.unitofwork import UnitOfWork
+from benchmarks.common import summarize, write_results
+
+
+async def run_queries(uow: UnitOfWork, embeddings: list, limit: int) -> tuple[list[float], list[list[int]]]:
+    samples, results = [], []
+    for embedding in embeddings:
+        async with uow:
+            started = time.perf_counter()
+            found = await uow.recipies.vector_search(embedding, limit=limit, threshold=2.0)
+            samples.append(time.perf_counter() - started)
+        results.append([r.id for r in found])
+    return samples, results
+
+
+async def main(queries: int, limit: int, dtype: str, out: str | None):
+    engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with session_maker() as session:
+        rows = await session.execute(
+            select(Recipe.embedding).where(Recipe.embedding.is_not(None)).order_by(func.random()).limit(queries)
+        )
+        embeddings = [list(embedding_values(embedding)) for embedding in rows.scalars()]
+
+    started = time.perf_counter()
+    index = await load_vector_index(UnitOfWork(session_maker), dtype=dtype)
+    load_seconds = time.perf_counter() - started
+
+    db_samples, db_results = await run_queries(UnitOfWork(session_maker), embeddings, limit)
+    np_samples, np_results = await run_queries(UnitOfWork(session_maker, vector_index=index), embeddings, limit)
+
+    # the numpy engine is exact, so this is the recall of the ANN index (or float16 rounding)
+    overlap = [len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(db_results, np_results)]
+    results = {
+        "vectors": len(index),
+        "index": index.stats(),
+        "load_seconds": round(load_seconds, 3),
+        "pgvector": summarize(db_samples),
+        "numpy": summarize(np_samples),
+        "mean_overlap": round(sum(overlap) / len(overlap), 4) if overlap else None,
+    }
+    write_results(results, out)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.queries, args.limit, args.dtype, args.out))
@@ -1,11 +1,32 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
-from app.api.endpoints import recipes
+from app.api.endpoints import health, metrics, profiles, recipes, stats
+from app.api.middleware import MetricsMiddleware, ProfilingMiddleware
+from app.core.resources import Resources
+from app.utils.profiling import Profiler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):  # pylint: disable=redefined-outer-name
+    app.state.resources = Resources()
+    app.state.resources.start_warmup()
+    yield
+    await app.state.resources.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.state.profiler = Profiler.from_settings()
+app.add_middleware(ProfilingMiddleware, profiler=app.state.profiler)
+app.add_middleware(MetricsMiddleware)
 
+app.include_router(health.router)
 app.include_router(recipes.router)
+app.include_router(stats.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
 
 
 @app.get("/")
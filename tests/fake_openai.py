@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+
+import httpx
+from fastapi import Body, FastAPI
+from openai import AsyncOpenAI
+
+
+def fake_embedding(text: str, dimensions: int) -> list[float]:
+    digest = hashlib.sha256(text.encode()).digest()
+    return [digest[i % len(digest)] / 255 for i in range(dimensions)]
+
+
+class FakeOpenAI:
+    # local stand-in for the OpenAI HTTP API, served in-process through an ASGI transport
+    def __init__(self, dimensions: int = 8, delay: float = 0.0, chat_content: str = "{}"):
+        self.dimensions = dimensions
+        self.delay = delay
+        self.chat_content = chat_content
+        self.embedding_requests: list[list[str]] = []
+        self.chat_requests: list[list[dict]] = []
+        self.app = FastAPI()
+        self.app.post("/v1/embeddings")(self._embeddings)
+        self.app.post("/v1/chat/completions")(self._chat_completions)
+
+    def client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key="test",
+            base_url="http://fake-openai/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app)),
+        )
+
+    async def _embeddings(self, payload: dict = Body(...)):
+        inputs = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+        self.embedding_requests.append(inputs)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {
+            "object": "list",
+            "model": payload["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.dimensions)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        }
+
+    async def _chat_completions(self, payload: dict = Body(...)):
+        self.chat_requests.append(payload["messages"])
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {
+            "id": f"chatcmpl-{len(self.chat_requests)}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": payload["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": self.chat_content},
+            }],
+        }
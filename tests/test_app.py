@@ -0,0 +1,214 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi.routing import serialize_response
+from fastapi.testclient import TestClient
+from fastapi.utils import create_model_field
+
+from app.api.endpoints.recipes import get_service
+from app.api.schemas.recipe import RecipeOut
+from app.core.config import settings
+from app.core import resources as resources_module
+from app.core.resources import Resources
+from app.services.embedding_worker import EmbeddingWorker
+from app.services.recipe_service import RecipeService
+from app.utils.caching import LRUCache
+from app.utils.recipe_cache import RecipeCache
+from app.utils.vector_index import VectorIndex
+from main import app
+
+
+def test_shared_resources_live_for_the_app_lifetime():
+    with TestClient(app) as client:
+        resources = app.state.resources
+        first = get_service(resources)
+        second = get_service(resources)
+
+        assert first.parser is second.parser is resources.parser
+        assert first.embedder is second.embedder is resources.embedder
+        assert client.get("/stats/caches").status_code == 200
+
+    assert resources.http_client.is_closed
+
+
+def test_ready_reports_ready_after_warmup():
+    with TestClient(app) as client:
+        client.portal.call(app.state.resources.warmup)
+        response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "db": True, "spacy": True, "vector_index": True}
+
+
+def test_ready_reports_a_failed_warmup(monkeypatch):
+    async def broken_warmup(self):
+        raise RuntimeError("spaCy model is missing")
+
+    monkeypatch.setattr(Resources, "warmup", broken_warmup)
+    with TestClient(app) as client:
+        client.portal.call(asyncio.wait, [app.state.resources._warmup_task])
+        response = client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json()["status"] == "warmup_failed"
+    assert "spaCy model is missing" in response.json()["error"]
+
+
+@pytest.mark.asyncio
+async def test_embedding_worker_starts_after_the_vector_index_is_loaded(monkeypatch):
+    events = []
+
+    async def warm_pool(self):
+        self.db_warm = True
+
+    async def load(uow):
+        await asyncio.sleep(0.01)  # reading the embeddings takes a while
+        events.append("load")
+        return VectorIndex()
+
+    async def run(self, *args, **kwargs):
+        events.append("worker")
+
+    monkeypatch.setattr(settings, "VECTOR_ENGINE", "numpy")
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(settings, "EMBEDDING_WORKER_IN_PROCESS", True)
+    monkeypatch.setattr(Resources, "_warm_db_pool", warm_pool)
+    monkeypatch.setattr(resources_module, "load_vector_index", load)
+    monkeypatch.setattr(EmbeddingWorker, "run", run)
+    resources = Resources()
+    try:
+        await resources.warmup()
+        await asyncio.sleep(0)
+    finally:
+        await resources.aclose()
+
+    assert events == ["load", "worker"]
+
+
+@pytest.mark.asyncio
+async def test_a_dead_embedding_worker_is_reported_on_ready(monkeypatch):
+    async def warm_pool(self):
+        self.db_warm = True
+
+    async def run(self, *args, **kwargs):
+        raise KeyError("dimensions")
+
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "local")
+    monkeypatch.setattr(settings, "EMBEDDING_WORKER_IN_PROCESS", True)
+    monkeypatch.setattr(Resources, "_warm_db_pool", warm_pool)
+    monkeypatch.setattr(EmbeddingWorker, "run", run)
+    resources = Resources()
+    try:
+        await resources.warmup()
+        await asyncio.sleep(0.01)
+    finally:
+        await resources.aclose()
+
+    assert "dimensions" in resources.task_errors["embedding_worker"]
+
+
+@pytest_asyncio.fixture
+async def api(uow_factory):
+    # requests go through the real routes, the service talks to the test database
+    app.dependency_overrides[get_service] = lambda: RecipeService(uow_factory)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_recipe_etag_answers_304_until_the_recipe_changes(api):
+    recipe_id = (await api.get("/recipes/", params={"limit": 1})).json()[0]["id"]
+    first = await api.get(f"/recipes/{recipe_id}")
+    etag = first.headers["ETag"]
+
+    cached = await api.get(f"/recipes/{recipe_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    await api.patch(f"/recipes/{recipe_id}", json={"cooking_time": first.json()["cooking_time"] + 1})
+    changed = await api.get(f"/recipes/{recipe_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["version"] == first.json()["version"] + 1
+
+
+async def response_model_body(model, content) -> bytes:
+    # what FastAPI sent before the routes returned ready bytes
+    field = create_model_field(name="Response", type_=model, mode="serialization")
+    return await serialize_response(field=field, response_content=content, dump_json=True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cached", [False, True])
+async def test_bodies_are_byte_identical_to_the_response_model_output(uow_factory, cached):
+    recipe_cache = RecipeCache(LRUCache(maxsize=100, sizeof=lambda entry: len(entry[1]))) if cached else None
+    service = RecipeService(uow_factory, recipe_cache=recipe_cache)
+    app.dependency_overrides[get_service] = lambda: service
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            recipes = await service.list_recipes(limit=5)
+            listed = await client.get("/recipes/", params={"limit": 5})
+            assert listed.content == await response_model_body(list[RecipeOut], recipes)
+
+            for _ in range(2):  # a miss, then a hit when cached
+                one = await client.get(f"/recipes/{recipes[0].id}")
+                assert one.content == await response_model_body(RecipeOut, recipes[0])
+
+            found = await client.get("/recipes/search/", params={"q": "pasta"})
+            assert found.content == await response_model_body(list[RecipeOut], await service.search("pasta"))
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_list_etag_keeps_pagination_headers_on_304(api):
+    first = await api.get("/recipes/", params={"limit": 2})
+    cached = await api.get("/recipes/", params={"limit": 2}, headers={"If-None-Match": f'W/"x", {first.headers["ETag"]}'})
+
+    assert cached.status_code == 304
+    assert cached.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+    other_page = await api.get("/recipes/", params={"limit": 3}, headers={"If-None-Match": first.headers["ETag"]})
+    assert other_page.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_metrics_break_latency_down_by_route_and_stage(api):
+    recipe_id = (await api.get("/recipes/", params={"limit": 1})).json()[0]["id"]
+    await api.get(f"/recipes/{recipe_id}")
+    body = (await api.get("/metrics")).text
+
+    assert 'http_request_duration_seconds_count{method="GET",route="/recipes/{recipe_id}",status="200"}' in body
+    assert 'recipe_stage_duration_seconds_count{route="/recipes/{recipe_id}",stage="db"}' in body
+    assert 'recipe_stage_duration_seconds_count{route="/recipes/",stage="serialization"}' in body
+
+
+@pytest.mark.asyncio
+async def test_ndjson_stream_matches_the_buffered_list(api):
+    buffered = await api.get("/recipes/filter/", params={"include": "egg"})
+    streamed = await api.get("/recipes/filter/", params={"include": "egg"}, headers={"Accept": "application/x-ndjson"})
+
+    assert streamed.status_code == 200
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    assert "ETag" not in streamed.headers
+    assert [json.loads(line) for line in streamed.text.splitlines()] == buffered.json()
+
+
+@pytest.mark.asyncio
+async def test_large_limits_need_the_stream(api):
+    assert (await api.get("/recipes/", params={"limit": 500})).status_code == 422
+    streamed = await api.get("/recipes/", params={"limit": 500}, headers={"Accept": "application/x-ndjson"})
+    assert streamed.status_code == 200
+    assert len(streamed.text.splitlines()) == len((await api.get("/recipes/", params={"limit": 100})).json())
+
+
+@pytest.mark.asyncio
+async def test_filter_limit_is_capped_like_the_list(api):
+    assert (await api.get("/recipes/filter/", params={"include": "egg", "limit": 500})).status_code == 422
+    too_many = {"include": "egg", "limit": settings.STREAM_MAX_ROWS + 1}
+    streamed = await api.get("/recipes/filter/", params=too_many, headers={"Accept": "application/x-ndjson"})
+    assert streamed.status_code == 422
@@ -0,0 +1,53 @@
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_consecutive_failures_and_recovers_after_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial call while half open
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_and_slow_calls_count_as_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, slow_call_threshold=0.5, clock=clock)
+
+    breaker.record_success(elapsed=0.9)
+    assert breaker.state == "open"
+
+    clock.now = 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_abandoned_trial_lets_the_next_call_try():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 5
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
@@ -0,0 +1,67 @@
+import pytest
+
+from app.utils.caching import LRUCache
+from app.utils.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache_respects_byte_budget():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    assert cache.get("a") == b"12345"
+
+    cache.set("c", b"12345")
+
+    assert "b" not in cache
+    assert cache.get("a") == b"12345"
+    assert cache.bytes == 10
+    assert cache.evictions == 1
+
+
+def test_lru_cache_expires_entries():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_normalizes_text_and_persists(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(LRUCache(max_bytes=1024, sizeof=len), SQLiteEmbeddingStore(path, ttl=60, max_entries=10))
+    await cache.set("model", "Quick  Pasta", [0.5, 0.25])
+
+    assert await cache.get("model", "quick pasta") == [0.5, 0.25]
+    assert await cache.get("other-model", "quick pasta") is None
+    cache.close()
+
+    reopened = EmbeddingCache(LRUCache(max_bytes=1024, sizeof=len), SQLiteEmbeddingStore(path, ttl=60, max_entries=10))
+    assert await reopened.get("model", "quick pasta") == [0.5, 0.25]
+    assert reopened.stats()["store"]["hits"] == 1
+    reopened.close()
+
+
+def test_sqlite_store_prunes_least_recently_used(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "embeddings.sqlite3"), ttl=60, max_entries=2, prune_every=1)
+    store.set("a", b"1")
+    store.set("b", b"2")
+    store.get("a")
+    store.set("c", b"3")
+
+    assert store.get("b") is None
+    assert store.get("a") == b"1"
+    assert store.get("c") == b"3"
+    store.close()
@@ -0,0 +1,114 @@
+import asyncio
+
+import numpy as np
+import pytest
+from pgvector import HalfVector
+
+from app.db.vector_storage import embedding_values
+from app.utils.caching import LRUCache
+from app.utils.embedding_backends import HashingEmbeddingBackend, OpenAIEmbeddingBackend
+from app.utils.embedding_cache import EmbeddingCache, embedding_key
+from app.utils.embeddings import EmbeddingGenerator, content_hash
+from tests.fake_openai import FakeOpenAI, fake_embedding
+
+
+def make_generator(fake: FakeOpenAI, **kwargs) -> EmbeddingGenerator:
+    cache = EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len))
+    return EmbeddingGenerator(cache=cache, client=fake.client(), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_generate_calls_share_one_request():
+    fake = FakeOpenAI()
+    generator = make_generator(fake, batch_window_ms=20, max_batch_size=64)
+    texts = [f"recipe {i}" for i in range(10)]
+
+    vectors = await asyncio.gather(*(generator.generate(text) for text in texts))
+
+    assert len(fake.embedding_requests) == 1
+    assert sorted(fake.embedding_requests[0]) == sorted(texts)
+    for text, vector in zip(texts, vectors):
+        assert vector == pytest.approx(fake_embedding(text, fake.dimensions))
+
+
+@pytest.mark.asyncio
+async def test_batches_are_split_at_max_size_and_deduplicated():
+    fake = FakeOpenAI()
+    generator = make_generator(fake, batch_window_ms=20, max_batch_size=4)
+
+    await generator.generate_many(["a", "b", "c", "d", "e", "a"])
+
+    assert [len(batch) for batch in fake.embedding_requests] == [4, 2]
+    assert generator.batcher.stats()["batches"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_texts_skip_the_api():
+    fake = FakeOpenAI()
+    generator = make_generator(fake, batch_window_ms=1)
+
+    first = await generator.generate("Quick pasta")
+    second = await generator.generate("quick  pasta")
+
+    assert first == pytest.approx(second)
+    assert len(fake.embedding_requests) == 1
+
+    refreshed = await generator.generate("quick  pasta", refresh=True)
+    assert len(fake.embedding_requests) == 2
+    assert refreshed != pytest.approx(first)
+
+
+def cosine(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+@pytest.mark.asyncio
+async def test_hashing_backend_is_deterministic_and_normalized():
+    backend = HashingEmbeddingBackend(dimensions=256)
+    try:
+        first, second, empty = await backend.embed(["Tomato basil pasta", "tomato  basil pasta", ""])
+        tomato_soup, = await backend.embed(["Tomato soup with basil"])
+        brownies, = await backend.embed(["Chocolate brownies"])
+    finally:
+        await backend.aclose()
+
+    assert len(first) == 256
+    assert first == second
+    assert cosine(first, first) == pytest.approx(1.0, abs=1e-5)
+    assert cosine(empty, empty) == pytest.approx(1.0, abs=1e-5)
+    assert cosine(first, tomato_soup) > cosine(first, brownies)
+
+
+@pytest.mark.asyncio
+async def test_cache_is_keyed_by_the_backend_vector_space():
+    cache = EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len))
+    small = EmbeddingGenerator(cache=cache, backend=HashingEmbeddingBackend(dimensions=64), batch_window_ms=1)
+    large = EmbeddingGenerator(cache=cache, backend=HashingEmbeddingBackend(dimensions=128), batch_window_ms=1)
+
+    assert len(await small.generate("Quick pasta")) == 64
+    assert len(await large.generate("Quick pasta")) == 128
+    assert small.model != large.model
+    await small.aclose()
+    await large.aclose()
+
+
+def test_shortened_openai_vectors_are_a_separate_space():
+    full = OpenAIEmbeddingBackend(None, "text-embedding-3-small", dimensions=1536)
+    short = OpenAIEmbeddingBackend(None, "text-embedding-3-small", dimensions=512)
+
+    assert full.request_dimensions is None
+    assert short.request_dimensions == 512
+    assert full.name != short.name
+
+
+def test_halfvec_embeddings_load_as_float_arrays():
+    values = embedding_values(HalfVector([0.5, -0.25, 1.0]))
+
+    assert values.dtype == np.float16
+    assert values.astype(np.float32).tolist() == [0.5, -0.25, 1.0]
+
+
+def test_content_hash_sees_edits_the_cache_key_normalizes_away():
+    assert embedding_key("m", "Simmer  Gently") == embedding_key("m", "simmer gently")
+    assert content_hash("m", "Simmer  Gently") != content_hash("m", "simmer gently")
+    assert content_hash("m", "simmer") != content_hash("n", "simmer")
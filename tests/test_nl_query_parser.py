@@ -0,0 +1,21 @@
+from app.utils.nl_query_parser import get_nlp, parse_cache_stats, parse_natural_query
+
+
+def test_pipeline_skips_unused_components():
+    nlp = get_nlp()
+    assert "parser" not in nlp.pipe_names
+    assert "ner" not in nlp.pipe_names
+    assert "lemmatizer" in nlp.pipe_names
+
+
+def test_parse_is_cached_on_normalized_text():
+    first = parse_natural_query("Easy pasta under 20 minutes")
+    hits = parse_cache_stats()["hits"]
+
+    second = parse_natural_query("  easy PASTA under 20   minutes ")
+
+    assert second == first == {"fts": "pasta", "cooking_time": {"lte": 20}, "difficulty": "easy"}
+    assert parse_cache_stats()["hits"] == hits + 1
+
+    second["cooking_time"]["lte"] = 99
+    assert parse_natural_query("easy pasta under 20 minutes")["cooking_time"] == {"lte": 20}
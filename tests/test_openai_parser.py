@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import pytest
+
+from app.utils.openai_parser import OpenAIQueryParser
+from tests.fake_openai import FakeOpenAI
+
+PARSED = {"fts": "pasta", "cooking_time": {"lte": 30}, "difficulty": "easy"}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_queries_share_one_call():
+    fake = FakeOpenAI(delay=0.05, chat_content=json.dumps(PARSED))
+    parser = OpenAIQueryParser(client=fake.client())
+
+    results = await asyncio.gather(*(parser.parse("Easy pasta under 30 minutes") for _ in range(5)))
+
+    assert results == [PARSED] * 5
+    assert len(fake.chat_requests) == 1
+    assert parser.stats()["single_flight"]["shared"] == 4
+
+
+@pytest.mark.asyncio
+async def test_parsed_queries_are_cached_on_normalized_text():
+    fake = FakeOpenAI(chat_content=json.dumps(PARSED))
+    parser = OpenAIQueryParser(client=fake.client())
+
+    first = await parser.parse("Easy pasta under 30 minutes")
+    first["fts"] = "changed by the caller"
+    second = await parser.parse("  easy PASTA under 30   minutes")
+
+    assert second == PARSED
+    assert len(fake.chat_requests) == 1
+    assert parser.stats()["cache"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unparseable_answers_are_not_cached():
+    fake = FakeOpenAI(chat_content="not json")
+    parser = OpenAIQueryParser(client=fake.client())
+
+    assert (await parser.parse("pasta"))["fts"] == "pasta"
+    await parser.parse("pasta")
+
+    assert len(fake.chat_requests) == 2
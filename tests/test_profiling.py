@@ -0,0 +1,62 @@
+import asyncio
+import pstats
+
+from app.utils.profiling import Profiler, current_profile, profile_thread
+
+
+def test_sampled_profiles_are_spaced_and_never_overlap(tmp_path):
+    now = [0.0]
+    profiler = Profiler(tmp_path, token="secret", sample_rate=0.5, min_interval=10, clock=lambda: now[0], rand=lambda: 0.1)
+
+    first = profiler.begin()
+    assert first is not None
+    # a forced request while another profile runs is skipped rather than stacked
+    assert profiler.begin(forced=True) is None
+    assert profiler.skipped == 1
+    profiler.end(first)
+
+    now[0] = 5.0
+    assert profiler.begin() is None
+    assert profiler.begin(forced=True) is not None
+    assert not profiler.authorized("wrong") and profiler.authorized("secret")
+
+
+def test_thread_work_is_merged_into_the_saved_profile(tmp_path):
+    profiler = Profiler(tmp_path, token="secret", max_files=1)
+
+    def parse(text):
+        return text.split()
+
+    async def handle():
+        profile = profiler.begin(forced=True)
+        current_profile.set(profile)
+        profile.profiler.enable()
+        await asyncio.to_thread(profile_thread(parse), "pasta without eggs")
+        profiler.end(profile)
+        return profile
+
+    older = profiler.save(asyncio.run(handle()))
+    path = profiler.save(asyncio.run(handle()))
+
+    assert any(name == "parse" for _, _, name in pstats.Stats(str(path)).stats)
+    assert profiler.path(path.stem) == path
+    # only the newest max_files are kept
+    assert [p["id"] for p in profiler.profiles()] == [path.stem]
+    assert not older.exists()
+    assert profiler.path("../etc/passwd") is None
+
+
+def test_thread_work_runs_while_the_request_profiler_is_enabled(tmp_path):
+    # a second profiler in the worker thread is refused from 3.12 on, the wrapper must not start one there
+    profiler = Profiler(tmp_path, token="secret")
+
+    async def handle():
+        profile = profiler.begin(forced=True)
+        current_profile.set(profile)
+        profile.profiler.enable()
+        try:
+            return await asyncio.to_thread(profile_thread(sorted), [3, 1, 2])
+        finally:
+            profiler.end(profile)
+
+    assert asyncio.run(handle()) == [1, 2, 3]
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.utils.caching import LRUCache
+from app.utils.recipe_cache import CacheBackendError, MemoryBackend, RecipeCache
+
+
+def make_cache(backend=None) -> RecipeCache:
+    return RecipeCache(LRUCache(maxsize=100, sizeof=lambda entry: len(entry[1])), backend=backend, ttl=60)
+
+
+class Loader:
+    def __init__(self, value: bytes | None = b'{"id": 1}', delay: float = 0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> bytes | None:
+        self.calls += 1
+        value = self.value
+        await asyncio.sleep(self.delay)
+        return value
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", [None, MemoryBackend()])
+async def test_read_through_and_invalidate(backend):
+    cache = make_cache(backend)
+    load = Loader()
+
+    assert await cache.get_or_load(1, load) == b'{"id": 1}'
+    assert await cache.get_or_load(1, load) == b'{"id": 1}'
+    assert load.calls == 1
+
+    load.value = b'{"id": 1, "title": "new"}'
+    await cache.invalidate(1)
+    assert await cache.get_or_load(1, load) == b'{"id": 1, "title": "new"}'
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_recipes_are_not_cached():
+    cache = make_cache()
+    load = Loader(value=None)
+
+    assert await cache.get_or_load(1, load) is None
+    assert await cache.get_or_load(1, load) is None
+    assert load.calls == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", [None, MemoryBackend()])
+async def test_load_racing_a_write_is_not_cached(backend):
+    cache = make_cache(backend)
+    slow = Loader(value=b"old", delay=0.05)
+
+    reading = asyncio.create_task(cache.get_or_load(1, slow))
+    await asyncio.sleep(0.01)
+    await cache.invalidate(1)  # the write commits while the old row is on its way
+    assert await reading == b"old"
+
+    fresh = Loader(value=b"new")
+    assert await cache.get_or_load(1, fresh) == b"new"
+    assert fresh.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers_through_the_backend():
+    backend = MemoryBackend()
+    worker_a, worker_b = make_cache(backend), make_cache(backend)
+    load = Loader(value=b"old")
+
+    assert await worker_a.get_or_load(1, load) == b"old"
+    assert await worker_b.get_or_load(1, load) == b"old"
+    assert load.calls == 1
+    assert worker_b.stats()["shared_hits"] == 1
+
+    load.value = b"new"
+    await worker_a.invalidate(1)
+    assert await worker_b.get_or_load(1, load) == b"new"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = make_cache()
+    load = Loader(delay=0.02)
+
+    results = await asyncio.gather(*(cache.get_or_load(1, load) for _ in range(5)))
+
+    assert results == [b'{"id": 1}'] * 5
+    assert load.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_backend_outage_falls_back_to_loading():
+    class BrokenBackend(MemoryBackend):
+        name = "broken"
+
+        async def get_many(self, keys):
+            raise CacheBackendError("connection refused")
+
+    cache = make_cache(BrokenBackend())
+    load = Loader()
+
+    assert await cache.get_or_load(1, load) == b'{"id": 1}'
+    assert await cache.get_or_load(1, load) == b'{"id": 1}'
+    assert load.calls == 2
+    assert cache.stats()["backend_errors"] == 2
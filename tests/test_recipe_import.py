@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from app.api.schemas.enums import ImportFormat
+from app.services.recipe_import import RecipeImporter
+from app.utils.caching import LRUCache
+from app.utils.embedding_backends import OpenAIEmbeddingBackend
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.embeddings import EmbeddingGenerator
+from app.utils.record_stream import read_csv
+from app.utils.unitofwork import UnitOfWork
+
+
+async def chunked(data: bytes, size: int = 16):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def ndjson(*rows) -> bytes:
+    return "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows).encode()
+
+
+@pytest.mark.asyncio
+async def test_csv_reader_handles_quoted_newlines_and_lists():
+    data = (
+        b'title,ingredients,instructions,cooking_time,difficulty,cuisine,tags\n'
+        b'Pancakes,"egg; flour","Mix.\nFry ""thin""",15,easy,,breakfast\n'
+        b'Broken,egg\n'
+    )
+
+    records = [record async for record in read_csv(chunked(data, 7))]
+
+    assert records[0] == (2, {
+        "title": "Pancakes",
+        "ingredients": ["egg", "flour"],
+        "instructions": 'Mix.\nFry "thin"',
+        "cooking_time": "15",
+        "difficulty": "easy",
+        "cuisine": None,
+        "tags": ["breakfast"],
+    })
+    assert records[1][0] == 4
+    assert isinstance(records[1][1], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_import_reports_row_errors_without_aborting(uow_factory: UnitOfWork):
+    recipe = {
+        "title": "Imported Soup",
+        "ingredients": ["water", "salt"],
+        "instructions": "Boil.",
+        "cooking_time": 10,
+        "difficulty": "easy",
+        "cuisine": "ImportCuisine",
+        "tags": [],
+    }
+    data = ndjson(
+        recipe,
+        "{not json",
+        {**recipe, "title": "Imported Stew", "cooking_time": -1},
+        {**recipe, "title": "Tomato Pasta", "cuisine": "Italian"},
+        recipe,
+        {**recipe, "title": "Imported Stew"},
+    )
+
+    report = await RecipeImporter(uow_factory, batch_size=2, embed=False).run(chunked(data), ImportFormat.ndjson)
+
+    assert report.processed == 6
+    assert report.inserted == 2
+    assert [e.line for e in report.errors] == [2, 3, 4, 5]
+    assert "already exists" in report.errors[2].error
+
+
+@pytest.mark.asyncio
+async def test_import_without_an_api_key_queues_rows_for_the_worker(uow_factory: UnitOfWork):
+    embedder = EmbeddingGenerator(
+        cache=EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len)),
+        backend=OpenAIEmbeddingBackend(None, "text-embedding-3-small"),
+    )
+    recipe = {
+        "title": "Keyless Broth",
+        "ingredients": ["water", "bones"],
+        "instructions": "Simmer.",
+        "cooking_time": 240,
+        "difficulty": "easy",
+        "cuisine": "ImportCuisine",
+        "tags": [],
+    }
+
+    report = await RecipeImporter(uow_factory, embedder=embedder).run(chunked(ndjson(recipe)), ImportFormat.ndjson)
+
+    assert report.inserted == 1 and report.failed == 0
+    async with uow_factory as uow:
+        assert (await uow.embedding_jobs.stats())["queued"] >= 1
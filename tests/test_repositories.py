@@ -0,0 +1,146 @@
+import pytest
+from sqlalchemy import func, inspect, select, text, update
+
+from app.api.schemas.enums import RecipeSort
+from app.core.config import settings
+from app.db.models import Recipe
+from app.utils.unitofwork import UnitOfWork
+from app.utils.vector_index import VectorIndex
+
+
+@pytest.mark.asyncio
+async def test_read_queries_skip_heavy_columns(uow_factory: UnitOfWork):
+    async with uow_factory as uow:
+        recipes = await uow.recipies.get_list()
+        recipe = await uow.recipies.get(recipes[0].id)
+        found = await uow.recipies.fulltext_search({"fts": "pasta"})
+
+        for instance in [*recipes, recipe, *found]:
+            assert {"embedding", "search_vector"} <= inspect(instance).unloaded
+
+
+def _unit_vector(index: int, dimensions: int = 1536) -> list[float]:
+    vector = [0.0] * dimensions
+    vector[index] = 1.0
+    return vector
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_fuses_text_and_vector_rankings(uow_factory: UnitOfWork):
+    async with uow_factory as uow:
+        recipes = {r.title: r for r in await uow.recipies.get_list()}
+        for i, title in enumerate(["Spaghetti Carbonara", "Avocado Chicken Salad"]):
+            await uow.session.execute(
+                update(Recipe).where(Recipe.id == recipes[title].id).values(embedding=_unit_vector(i))
+            )
+
+        rows = await uow.recipies.hybrid_search({"fts": "pasta"}, _unit_vector(0), limit=10)
+        titles = [r.title for r, _ in rows]
+        # first in the vector ranking and a text match beats the best text-only match
+        assert titles[0] == "Spaghetti Carbonara"
+        assert {"Tomato Pasta", "Avocado Chicken Salad"} <= set(titles)
+        assert [score for _, score in rows] == sorted((score for _, score in rows), reverse=True)
+
+        text_only = await uow.recipies.hybrid_search({"fts": "pasta"}, _unit_vector(0), limit=10, vector_weight=0)
+        assert text_only[0][0].title == "Tomato Pasta"
+
+        # structured filters apply to both branches
+        filtered = await uow.recipies.hybrid_search(
+            {"fts": "pasta", "cooking_time": {"lte": 20}}, _unit_vector(1), limit=10,
+        )
+        assert [r.title for r, _ in filtered] == ["Spaghetti Carbonara"]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_raises_ef_search_only_above_the_default(monkeypatch, uow_factory: UnitOfWork):
+    current = select(func.current_setting("hnsw.ef_search"))
+    monkeypatch.setattr(settings, "HYBRID_CANDIDATES", 100)
+    async with uow_factory as uow:
+        default = int(await uow.session.scalar(current))
+        monkeypatch.setattr(settings, "HNSW_EF_SEARCH", default)
+        await uow.recipies.hybrid_search({"fts": "pasta"}, _unit_vector(0), limit=10)
+        assert await uow.session.scalar(current) == str(max(default, 100))
+
+    # set_config(..., true) ends with the transaction, the connection keeps HNSW_EF_SEARCH
+    monkeypatch.setattr(settings, "HYBRID_CANDIDATES", 10)
+    async with uow_factory as uow:
+        await uow.recipies.hybrid_search({"fts": "pasta"}, _unit_vector(0), limit=10)
+        assert await uow.session.scalar(current) == str(default)
+
+
+@pytest.mark.asyncio
+async def test_vector_search_orders_by_distance_and_cuts_at_the_threshold(uow_factory: UnitOfWork):
+    near = _unit_vector(0)
+    near[1] = 0.3  # cosine distance to _unit_vector(0) is about 0.04
+    embeddings = {"Tomato Pasta": _unit_vector(0), "Spaghetti Carbonara": near, "Egg and Flour Pancakes": _unit_vector(1)}
+    async with uow_factory as uow:
+        recipes = {r.title: r for r in await uow.recipies.get_list()}
+        for title, embedding in embeddings.items():
+            await uow.session.execute(update(Recipe).where(Recipe.id == recipes[title].id).values(embedding=embedding))
+
+        found = await uow.recipies.vector_search(_unit_vector(0), limit=5, threshold=0.3)
+        assert [r.title for r in found] == ["Tomato Pasta", "Spaghetti Carbonara"]
+
+        closest = await uow.recipies.vector_search(_unit_vector(0), limit=1, threshold=0.3)
+        assert [r.title for r in closest] == ["Tomato Pasta"]
+
+        strict = await uow.recipies.vector_search(_unit_vector(0), limit=5, threshold=0.01)
+        assert [r.title for r in strict] == ["Tomato Pasta"]
+
+
+@pytest.mark.asyncio
+async def test_vector_search_overrides_ann_settings_for_the_transaction(uow_factory: UnitOfWork):
+    async with uow_factory as uow:
+        await uow.recipies.vector_search(_unit_vector(0), limit=5, ef_search=123, probes=7)
+        overrides = (await uow.session.execute(
+            select(func.current_setting("hnsw.ef_search"), func.current_setting("ivfflat.probes"))
+        )).one()
+        assert tuple(overrides) == ("123", "7")
+
+    # hnsw never returns more than ef_search rows, a larger limit raises it for that transaction only
+    async with uow_factory as uow:
+        await uow.recipies.vector_search(_unit_vector(0), limit=settings.HNSW_EF_SEARCH + 1)
+        ef_search = await uow.session.scalar(select(func.current_setting("hnsw.ef_search")))
+        assert ef_search == str(settings.HNSW_EF_SEARCH + 1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("include, exclude", [(["egg"], None), (None, ["bacon"])])
+async def test_ingredient_filters_probe_the_gin_index(uow_factory: UnitOfWork, include, exclude):
+    async with uow_factory as uow:
+        # the test table is tiny, a sequential scan would always win otherwise
+        await uow.session.execute(text("SET LOCAL enable_seqscan = off"))
+        query = uow.recipies._filter_query(include, exclude, 10, RecipeSort.id, None)
+        sql = query.compile(dialect=uow.session.bind.dialect, compile_kwargs={"literal_binds": True})
+        plan = "\n".join((await uow.session.execute(text(f"EXPLAIN {sql}"))).scalars())
+    assert "idx_recipes_ingredients" in plan
+
+
+@pytest.mark.asyncio
+async def test_vector_search_uses_loaded_in_memory_index(uow_factory: UnitOfWork):
+    async with uow_factory as uow:
+        recipes = {r.title: r for r in await uow.recipies.get_list()}
+
+    index = VectorIndex()
+    index.upsert(recipes["Tomato Pasta"].id, _unit_vector(0))
+    index.upsert(recipes["Egg and Flour Pancakes"].id, _unit_vector(1))
+    index.upsert(10 ** 9, _unit_vector(0))  # deleted meanwhile
+    index.loaded = True
+
+    async with UnitOfWork(uow_factory.session_factory, vector_index=index) as uow:
+        found = await uow.recipies.vector_search(_unit_vector(0), limit=5, threshold=0.3)
+
+    assert [r.title for r in found] == ["Tomato Pasta"]
+
+
+@pytest.mark.asyncio
+async def test_version_changes_only_with_visible_columns(uow_factory: UnitOfWork):
+    async with uow_factory as uow:
+        recipe = (await uow.recipies.get_list(limit=1))[0]
+        version = recipe.version
+
+        same = await uow.recipies.update(recipe.id, {"embedding": _unit_vector(2)})
+        assert same.version == version
+
+        changed = await uow.recipies.update(recipe.id, {"cooking_time": (recipe.cooking_time or 0) + 1})
+        assert changed.version == version + 1
@@ -1,9 +1,25 @@
+import asyncio
+import json
+
 import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
 
-from app.api.schemas.enums import Difficulty
+from app.api.schemas.enums import Difficulty, EmbeddingStatus, RecipeSort
 from app.api.schemas.recipe import RecipeCreate, RecipeUpdate
+from app.services.embedding_worker import EmbeddingWorker
+from app.core.config import settings
+from app.db.models import EmbeddingJob, Recipe
 from app.services.recipe_service import RecipeService
+from app.utils.caching import LRUCache
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.embeddings import EmbeddingGenerator
 from app.utils.openai_parser import OpenAIQueryParser
+from app.utils.pagination import encode_cursor
+from app.utils.recipe_cache import MemoryBackend, RecipeCache
+from app.utils.unitofwork import UnitOfWork
+from app.utils.vector_index import VectorIndex
+from tests.fake_openai import FakeOpenAI
 
 
 @pytest.mark.asyncio
@@ -80,12 +96,84 @@ async def test_search_basic(recipe_service: RecipeService):
     assert any(r.cuisine == "Italian" for r in results)
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_by", list(RecipeSort))
+async def test_list_recipes_cursor_pages_cover_offset_pages(recipe_service: RecipeService, order_by: RecipeSort):
+    everything = await recipe_service.list_recipes(limit=100, order_by=order_by)
+
+    seen = []
+    page = await recipe_service.list_recipes_page(limit=2, order_by=order_by)
+    while True:
+        seen.extend(r.id for r in page.items)
+        if not page.next_cursor:
+            break
+        page = await recipe_service.list_recipes_page(limit=2, cursor=page.next_cursor, order_by=order_by)
+
+    assert seen == [r.id for r in everything]
+
+
+@pytest.mark.asyncio
+async def test_list_recipes_rejects_cursor_for_other_order(recipe_service: RecipeService):
+    page = await recipe_service.list_recipes_page(limit=1, order_by=RecipeSort.title)
+    with pytest.raises(HTTPException) as exc:
+        await recipe_service.list_recipes_page(limit=1, cursor=page.next_cursor, order_by=RecipeSort.id)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_by, cursor", [
+    (RecipeSort.cooking_time, encode_cursor("cooking_time", "soon", 1)),
+    (RecipeSort.title, encode_cursor("title", 3, 1)),
+    (RecipeSort.id, encode_cursor("id", 1, "1")),
+    (RecipeSort.id, encode_cursor("id", True, 1)),
+    (RecipeSort.id, encode_cursor("id", 2 ** 63, 1)),
+    (RecipeSort.cooking_time, encode_cursor("cooking_time", 30, 2 ** 31)),
+])
+async def test_list_recipes_rejects_cursor_values_of_the_wrong_type(
+        recipe_service: RecipeService, order_by: RecipeSort, cursor: str,
+):
+    with pytest.raises(HTTPException) as exc:
+        await recipe_service.list_recipes_page(limit=1, cursor=cursor, order_by=order_by)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_is_ranked_and_paginated(recipe_service: RecipeService):
+    first = await recipe_service.search_page("pasta", limit=1)
+    assert [r.title for r in first.items] == ["Tomato Pasta"]
+    assert first.next_cursor
+
+    second = await recipe_service.search_page("pasta", limit=1, cursor=first.next_cursor)
+    assert [r.title for r in second.items] == ["Spaghetti Carbonara"]
+
+
+@pytest.mark.asyncio
+async def test_search_rejects_invalid_cursor(recipe_service: RecipeService):
+    with pytest.raises(HTTPException) as exc:
+        await recipe_service.search_page("pasta", cursor="not-a-cursor")
+    assert exc.value.status_code == 400
+    with pytest.raises(HTTPException) as exc:
+        await recipe_service.search_page("pasta", cursor=encode_cursor("high", 1))
+    assert exc.value.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_filter_by_ingredients(recipe_service: RecipeService):
     results = await recipe_service.filter_by_ingredients(["egg", "flour"])
     assert any("egg" in r.ingredients and "flour" in r.ingredients for r in results)
 
 
+@pytest.mark.asyncio
+async def test_filter_by_ingredients_exclude_and_limit(recipe_service: RecipeService):
+    results = await recipe_service.filter_by_ingredients(include=["egg"], exclude=["bacon"])
+    assert results
+    assert all("egg" in r.ingredients and "bacon" not in r.ingredients for r in results)
+
+    limited = await recipe_service.filter_by_ingredients(include=["cheese"], limit=1, order_by=RecipeSort.title)
+    assert len(limited) == 1
+    assert limited[0].title == "Spaghetti Carbonara"
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("query,expected", [
     ("Quick Italian recipes under 30 minutes", "Spaghetti Carbonara"),
@@ -112,3 +200,237 @@ async def test_smart_search(monkeypatch, recipe_service: RecipeService, query, e
     results = await recipe_service.smart_search(query)
     titles = [r.title for r in results]
     assert expected in titles
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parallel", [False, True])
+async def test_smart_search_falls_back_to_local_parser_over_budget(monkeypatch, uow_factory, parallel):
+    monkeypatch.setattr(settings, "SMART_SEARCH_BUDGET_MS", 50)
+    monkeypatch.setattr(settings, "SMART_SEARCH_PARALLEL_LOCAL_PARSE", parallel)
+    fake = FakeOpenAI(delay=1.0, chat_content=json.dumps({"fts": "nothing like this", "cooking_time": None, "difficulty": None}))
+    service = RecipeService(uow_factory, parser=OpenAIQueryParser(client=fake.client()))
+
+    page = await service.smart_search_page("pasta")
+
+    assert page.parser == "local"
+    assert "Tomato Pasta" in [r.title for r in page.items]
+
+
+@pytest.mark.asyncio
+async def test_smart_search_uses_openai_within_budget(uow_factory):
+    fake = FakeOpenAI(chat_content=json.dumps({"fts": "avocado", "cooking_time": None, "difficulty": None}))
+    service = RecipeService(uow_factory, parser=OpenAIQueryParser(client=fake.client()))
+
+    page = await service.smart_search_page("Healthy lunches with avocado")
+
+    assert page.parser == "openai"
+    assert "Avocado Chicken Salad" in [r.title for r in page.items]
+
+
+@pytest.mark.asyncio
+async def test_smart_search_skips_openai_while_breaker_is_open(monkeypatch, uow_factory):
+    monkeypatch.setattr(settings, "SMART_SEARCH_BUDGET_MS", 20)
+    fake = FakeOpenAI(delay=1.0)
+    parser = OpenAIQueryParser(client=fake.client())
+    parser.breaker.failure_threshold = 2
+    service = RecipeService(uow_factory, parser=parser)
+
+    for query in ("pasta", "italian", "avocado"):
+        assert (await service.smart_search_page(query)).parser == "local"
+
+    assert parser.breaker.state == "open"
+    assert len(fake.chat_requests) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parallel", [False, True])
+async def test_failed_half_open_trial_of_any_kind_reopens_the_breaker(monkeypatch, uow_factory, parallel):
+    monkeypatch.setattr(settings, "SMART_SEARCH_PARALLEL_LOCAL_PARSE", parallel)
+    parser = OpenAIQueryParser(client=None)  # parse raises RuntimeError
+    parser.breaker.failure_threshold = 1
+    parser.breaker.reset_timeout = 0
+    service = RecipeService(uow_factory, parser=parser)
+
+    for query in ("pasta", "italian"):
+        assert (await service.smart_search_page(query)).parser == "local"
+        assert parser.breaker.state == "open"
+    assert parser.breaker.times_opened == 2
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_applies_parsed_filters(uow_factory):
+    fake = FakeOpenAI(dimensions=1536)
+    cache = EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len))
+    service = RecipeService(uow_factory, embedder=EmbeddingGenerator(cache=cache, client=fake.client()))
+
+    results = await service.hybrid_search("pasta under 25 minutes")
+
+    assert [r.title for r in results] == ["Spaghetti Carbonara"]
+    assert fake.embedding_requests == [["pasta under 25 minutes"]]
+
+
+@pytest.mark.asyncio
+async def test_create_and_delete_keep_vector_index_in_sync(uow_factory):
+    fake = FakeOpenAI(dimensions=1536)
+    cache = EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len))
+    index = VectorIndex()
+    index.loaded = True
+    uow = UnitOfWork(uow_factory.session_factory, vector_index=index)
+    service = RecipeService(uow, embedder=EmbeddingGenerator(cache=cache, client=fake.client()))
+
+    created = await service.create_recipe(RecipeCreate(
+        title="Lemon Risotto", ingredients=["rice", "lemon"], instructions="Stir rice. Add lemon.",
+        cooking_time=35, difficulty=Difficulty.medium, cuisine="Italian", tags=[],
+    ))
+    assert created.id not in index
+    worker = EmbeddingWorker(uow, service.embedder)
+    while await worker.run_once():
+        pass
+    assert created.id in index
+
+    await service.delete_recipe(created.id)
+    assert created.id not in index
+
+
+@pytest.mark.asyncio
+async def test_get_recipe_cache_is_invalidated_by_update_and_delete(uow_factory):
+    cache = RecipeCache(LRUCache(maxsize=100, sizeof=lambda entry: len(entry[1])), backend=MemoryBackend(), ttl=60)
+    embedder = EmbeddingGenerator(cache=EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len)),
+                                  client=FakeOpenAI(dimensions=1536).client())
+    service = RecipeService(uow_factory, embedder=embedder, recipe_cache=cache)
+    created = await service.create_recipe(RecipeCreate(
+        title="Cached Soup", ingredients=["water"], instructions="Boil.",
+        cooking_time=10, difficulty=Difficulty.easy, cuisine="Test", tags=[],
+    ))
+
+    assert (await service.get_recipe(created.id)).title == "Cached Soup"
+    assert (await service.get_recipe(created.id)).title == "Cached Soup"
+    assert cache.stats()["hits"] == 1
+
+    await service.update_recipe(created.id, RecipeUpdate(title="Fresh Soup"))
+    assert (await service.get_recipe(created.id)).title == "Fresh Soup"
+
+    await service.delete_recipe(created.id)
+    assert await service.get_recipe(created.id) is None
+
+
+@pytest.mark.asyncio
+async def test_worker_embeds_new_and_edited_recipes_only_when_content_changes(uow_factory):
+    fake = FakeOpenAI(dimensions=1536)
+    embedder = EmbeddingGenerator(cache=EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len)), client=fake.client())
+    service = RecipeService(uow_factory, embedder=embedder)
+    worker = EmbeddingWorker(uow_factory, embedder)
+
+    async def drain() -> list[str]:
+        fake.embedding_requests.clear()
+        while await worker.run_once():
+            pass
+        return [text for batch in fake.embedding_requests for text in batch]
+
+    created = await service.create_recipe(RecipeCreate(
+        title="Queued Curry", ingredients=["rice", "curry paste"], instructions="Simmer.",
+        cooking_time=30, difficulty=Difficulty.easy, cuisine="Thai", tags=[],
+    ))
+    assert fake.embedding_requests == []
+    assert "Queued Curry rice, curry paste Simmer." in await drain()
+
+    await service.update_recipe(created.id, RecipeUpdate(cooking_time=45))
+    assert not any("Queued Curry" in text for text in await drain())
+
+    await service.update_recipe(created.id, RecipeUpdate(instructions="Simmer for longer."))
+    assert "Queued Curry rice, curry paste Simmer for longer." in await drain()
+    async with uow_factory as uow:
+        (_, _, _, _, _, stored_hash, has_embedding), = await uow.recipies.embedding_sources([created.id])
+    assert has_embedding and stored_hash is not None
+
+    async with uow_factory as uow:
+        stored_vector = await uow.session.scalar(select(Recipe.embedding).where(Recipe.id == created.id))
+
+    await service.update_recipe(created.id, RecipeUpdate(instructions="simmer for longer."))
+    assert "Queued Curry rice, curry paste simmer for longer." in await drain()
+    async with uow_factory as uow:
+        (_, _, _, _, _, case_only_hash, _), = await uow.recipies.embedding_sources([created.id])
+        case_only_vector = await uow.session.scalar(select(Recipe.embedding).where(Recipe.id == created.id))
+    assert case_only_hash != stored_hash
+    assert list(case_only_vector) != list(stored_vector)
+
+
+class BrokenEmbedder(EmbeddingGenerator):
+    async def generate_many(self, texts, refresh=False):
+        raise RuntimeError("embeddings are down")
+
+
+@pytest.mark.asyncio
+async def test_worker_backs_off_then_gives_up(uow_factory):
+    service = RecipeService(uow_factory, embedder=BrokenEmbedder(client=FakeOpenAI().client()))
+    created = await service.create_recipe(RecipeCreate(
+        title="Unlucky Stew", ingredients=["beef"], instructions="Stew.",
+        cooking_time=90, difficulty=Difficulty.hard, cuisine="Irish", tags=[],
+    ))
+
+    worker = EmbeddingWorker(uow_factory, service.embedder, batch_size=1000, max_attempts=2, backoff=0)
+    await worker.run_once()
+    async with uow_factory as uow:
+        queue = await uow.embedding_jobs.stats()
+    assert queue["retrying"] >= 1
+    assert worker.retried >= 1
+
+    await worker.run_once()
+    async with uow_factory as uow:
+        status = await uow.session.scalar(select(Recipe.embedding_status).where(Recipe.id == created.id))
+    assert status == EmbeddingStatus.failed
+    assert worker.failed >= 1
+
+
+@pytest.mark.asyncio
+async def test_worker_keeps_running_after_an_unexpected_error(monkeypatch):
+    embedder = EmbeddingGenerator(cache=EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len)), client=FakeOpenAI().client())
+    worker = EmbeddingWorker(UnitOfWork(), embedder, backoff=0.01)
+    stop = asyncio.Event()
+    calls = []
+
+    async def run_once():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise ValueError("malformed vector")
+        stop.set()
+        return 0
+
+    monkeypatch.setattr(worker, "run_once", run_once)
+    await asyncio.wait_for(worker.run(poll_interval=0, stop=stop), timeout=1)
+    assert calls == [0, 1]
+
+
+class EditingEmbedder(EmbeddingGenerator):
+    # a recipe is edited while its batch is being embedded, every time
+    def __init__(self, service_factory, **kwargs):
+        super().__init__(**kwargs)
+        self.service_factory = service_factory
+        self.recipe_id = None
+
+    async def generate_many(self, texts, refresh=False):
+        recipe = await self.service_factory().get_recipe(self.recipe_id)
+        await self.service_factory().update_recipe(self.recipe_id, RecipeUpdate(cooking_time=recipe.cooking_time + 1))
+        return await super().generate_many(texts, refresh=refresh)
+
+
+@pytest.mark.asyncio
+async def test_edits_while_embedding_do_not_use_up_attempts(uow_factory):
+    embedder = EditingEmbedder(
+        lambda: RecipeService(uow_factory, embedder=embedder),
+        cache=EmbeddingCache(LRUCache(max_bytes=1024 * 1024, sizeof=len)), client=FakeOpenAI(dimensions=1536).client(),
+    )
+    created = await RecipeService(uow_factory, embedder=embedder).create_recipe(RecipeCreate(
+        title="Busy Broth", ingredients=["bones"], instructions="Simmer all day.",
+        cooking_time=300, difficulty=Difficulty.medium, cuisine="French", tags=[],
+    ))
+    embedder.recipe_id = created.id
+    worker = EmbeddingWorker(uow_factory, embedder, batch_size=1000, max_attempts=2, backoff=0)
+
+    for _ in range(3):
+        await worker.run_once()
+    async with uow_factory as uow:
+        attempts = await uow.session.scalar(select(EmbeddingJob.attempts).where(EmbeddingJob.recipe_id == created.id))
+        status = await uow.session.scalar(select(Recipe.embedding_status).where(Recipe.id == created.id))
+    assert attempts == 0
+    assert status == EmbeddingStatus.pending
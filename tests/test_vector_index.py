@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from app.utils.vector_index import VectorIndex
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> list[int]:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return list(np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:k])
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_search_matches_exact_cosine_ranking(dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 16)).astype(np.float32)
+    query = rng.normal(size=16)
+    index = VectorIndex(dtype=dtype, initial_capacity=8)
+    index.upsert_many(range(500), vectors)
+
+    hits = index.search(query, limit=10)
+
+    assert [recipe_id for recipe_id, _ in hits] == exact_top_k(vectors, query, 10)
+    assert [d for _, d in hits] == sorted(d for _, d in hits)
+
+
+def test_upsert_remove_and_threshold():
+    index = VectorIndex()
+    index.upsert_many([1, 2, 3], [[1, 0], [0, 1], [1, 1]])
+
+    assert index.search([1, 0], limit=3, threshold=0.5) == [(1, pytest.approx(0.0)), (3, pytest.approx(1 - 2 ** -0.5))]
+
+    index.upsert(1, [0, 1])
+    assert index.search([0, 1], limit=1)[0][0] in {1, 2}
+    assert index.search([1, 0], limit=1)[0][0] == 3
+
+    assert index.remove(3)
+    assert not index.remove(3)
+    assert 3 not in index and len(index) == 2
+    assert {recipe_id for recipe_id, _ in index.search([1, 0], limit=5)} == {1, 2}
+
+
+def test_replace_swaps_contents():
+    index = VectorIndex()
+    index.upsert(1, [1, 0])
+    fresh = VectorIndex()
+    fresh.upsert(2, [0, 1])
+
+    index.replace(fresh)
+
+    assert index.loaded
+    assert [recipe_id for recipe_id, _ in index.search([1, 0], limit=5)] == [2]
+
+
+def test_writes_during_a_search_do_not_relabel_its_hits():
+    index = VectorIndex()
+    index.upsert_many([1, 2, 3], [[1, 0], [0, 1], [-1, 0]])
+    scores = index._scores
+
+    def remove_while_scoring(matrix, query):
+        # the last row moves into the freed slot while this search is between snapshot and ranking
+        index.remove(1)
+        index.upsert(2, [-1, 0])
+        return scores(matrix, query)
+
+    index._scores = remove_while_scoring
+    hits = index.search([1, 0], limit=3)
+
+    assert hits == [(1, pytest.approx(0.0)), (2, pytest.approx(1.0)), (3, pytest.approx(2.0))]
+    del index._scores
+    assert [recipe_id for recipe_id, _ in index.search([1, 0], limit=3)] in ([2, 3], [3, 2])